@@ -0,0 +1,112 @@
+"""قياس أعلى استهلاك للذاكرة (RSS) وزمن بناء تصدير جميع التقييمات حسب عدد الموظفين
+
+يُشغل كل قياس في عملية مستقلة لأن أعلى RSS يخص العملية كلها، ويُبنى الملف
+على قاعدة بيانات مؤقتة مملوءة ببيانات مولدة. مع قراءة الموظفين على دفعات
+يجب ألا يزيد استهلاك الذاكرة بنفس نسبة زيادة عدد الموظفين.
+
+    python scripts/benchmark_export_memory.py [--employees 250 1000 4000] [--months 24]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CRITERIA_COUNT = 8
+
+def seed_database(engine, employees, months):
+    """إنشاء الجداول وتعبئتها بإدارة واحدة وتقييمات شهرية كاملة لكل موظف"""
+    from sqlalchemy import insert
+    from src.models.user import db
+    from src.models.migrations import run_migrations
+    from src.models.department import Department, EvaluationCriteria
+    from src.models.employee import Employee
+    from src.models.evaluation import MonthlyEvaluation, EvaluationScore
+    # جداول تحدثها الترحيلات، فيجب تسجيلها قبل create_all
+    from src.models.employee_stats import EmployeeStats  # noqa: F401
+    from src.models.evaluation_rollup import EvaluationRollup  # noqa: F401
+
+    db.metadata.create_all(engine)
+    run_migrations(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Department), [{'id': 1, 'name': 'المبيعات', 'criteria_count': CRITERIA_COUNT}])
+        conn.execute(insert(EvaluationCriteria), [
+            {'id': criteria_id, 'department_id': 1, 'criteria_name': f'معيار {criteria_id}', 'max_score': 5}
+            for criteria_id in range(1, CRITERIA_COUNT + 1)
+        ])
+        conn.execute(insert(Employee), [
+            {'id': employee_id, 'employee_number': f'E{employee_id:06d}', 'full_name': f'موظف {employee_id}',
+             'job_title': 'محاسب', 'department_id': 1}
+            for employee_id in range(1, employees + 1)
+        ])
+        evaluation_id = 0
+        for employee_id in range(1, employees + 1):
+            evaluations, scores = [], []
+            for index in range(months):
+                evaluation_id += 1
+                values = [(employee_id + index + criteria_id) % 5 + 1 for criteria_id in range(1, CRITERIA_COUNT + 1)]
+                evaluations.append({
+                    'id': evaluation_id, 'employee_id': employee_id,
+                    'evaluation_year': 2000 + index // 12, 'evaluation_month': index % 12 + 1,
+                    'total_score': sum(values), 'average_score': sum(values) / CRITERIA_COUNT,
+                    'score_count': CRITERIA_COUNT
+                })
+                scores.extend(
+                    {'evaluation_id': evaluation_id, 'criteria_id': criteria_id, 'score': value}
+                    for criteria_id, value in enumerate(values, 1)
+                )
+            conn.execute(insert(MonthlyEvaluation), evaluations)
+            conn.execute(insert(EvaluationScore), scores)
+
+def measure(employees, months):
+    """بناء التصدير وحفظه في العملية الحالية وإرجاع (RSS قبله، أعلى RSS، الزمن بالثواني)"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from src.services.excel_export import build_export
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'benchmark.db')}")
+        seed_database(engine, employees, months)
+        # الذاكرة قبل التصدير لتمييز ما يستهلكه التصدير عن التعبئة
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        started = time.perf_counter()
+        with Session(engine) as session:
+            wb, _ = build_export('all-evaluations', {}, session=session)
+        wb.save(os.path.join(directory, 'export.xlsx'))
+        elapsed = time.perf_counter() - started
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        engine.dispose()
+    # ru_maxrss بالكيلوبايت على Linux
+    return before / 1024, peak / 1024, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--employees', type=int, nargs='+', default=[250, 1000, 4000])
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        before, peak, elapsed = measure(args.employees[0], args.months)
+        print(f'{before:.1f} {peak:.1f} {elapsed:.2f}')
+        return
+
+    print(f"{'الموظفون':>10} {'الدرجات':>10} {'RSS قبل (MB)':>14} {'أعلى RSS (MB)':>14} {'الزمن (ث)':>10}")
+    for employees in args.employees:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--single',
+             '--employees', str(employees), '--months', str(args.months)],
+            check=True, capture_output=True, text=True
+        ).stdout.split()
+        before, peak, elapsed = (float(value) for value in output)
+        scores = employees * args.months * CRITERIA_COUNT
+        print(f'{employees:>10} {scores:>10} {before:>14.1f} {peak:>14.1f} {elapsed:>10.2f}')
+
+if __name__ == '__main__':
+    main()
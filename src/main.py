@@ -9,15 +9,27 @@ from src.models.user import db
 from src.models.department import Department, EvaluationCriteria
 from src.models.employee import Employee
 from src.models.evaluation import MonthlyEvaluation, EvaluationScore
+from src.models.employee_stats import EmployeeStats
+from src.models.evaluation_rollup import EvaluationRollup
+from src.models.export_job import ExportJob
+from src.models.share_token import ShareToken
+from src.models.data_version import DataVersion, ensure_data_version
+from src.models.migrations import run_migrations
+from src.models.sqlite_tuning import load_sqlite_pragmas, configure_sqlite_engine
 from src.routes.user import user_bp
 from src.routes.department import department_bp
 from src.routes.employee import employee_bp
 from src.routes.evaluation import evaluation_bp
 from src.routes.export import export_bp
+from src.routes.evaluation_import import import_bp
+from src.routes.leaderboard import leaderboard_bp
 from src.routes.share import share_bp
-from src.routes.settings import settings_bp
+from src.routes.settings import settings_bp, load_settings
 from src.routes.manager import manager_bp
 from src.routes.google_sheets import google_sheets_bp
+from src.services.export_jobs import recover_export_jobs
+from src.services.score_cube import build_score_cube
+from src.services.share_tokens import sweep_expired_share_tokens
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -30,6 +42,8 @@ app.register_blueprint(department_bp, url_prefix='/api')
 app.register_blueprint(employee_bp, url_prefix='/api')
 app.register_blueprint(evaluation_bp, url_prefix='/api')
 app.register_blueprint(export_bp, url_prefix='/api')
+app.register_blueprint(import_bp, url_prefix='/api')
+app.register_blueprint(leaderboard_bp, url_prefix='/api')
 app.register_blueprint(share_bp)
 app.register_blueprint(settings_bp)
 app.register_blueprint(manager_bp)
@@ -38,9 +52,32 @@ app.register_blueprint(google_sheets_bp)
 # uncomment if you need to use database
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# إعدادات PRAGMA لاتصالات SQLite (WAL و busy_timeout وغيرها)
+app.config['SQLITE_PRAGMAS'] = load_sqlite_pragmas(load_settings())
+# مكعب الدرجات في الذاكرة لخدمة القراءات دون SQLite (معطل افتراضياً)
+app.config['SCORE_CUBE_ENABLED'] = os.environ.get('SCORE_CUBE_ENABLED', '').lower() in ('1', 'true', 'yes')
 db.init_app(app)
-with app.app_context():
-    db.create_all()
+
+def initialize_database(app):
+    """تهيئة قاعدة البيانات وحالة الخادم عند بدء التشغيل"""
+    with app.app_context():
+        configure_sqlite_engine(db.engine, app.config['SQLITE_PRAGMAS'])
+        db.create_all()
+        # تطبيق ترحيلات المخطط على قواعد البيانات الموجودة مسبقاً
+        run_migrations(db.engine)
+        ensure_data_version()
+        # إنهاء مهام التصدير المنقطعة وحذف الملفات المنتهية صلاحيتها
+        recover_export_jobs()
+        # حذف رموز المشاركة المنتهية صلاحيتها
+        sweep_expired_share_tokens(force=True)
+        if app.config['SCORE_CUBE_ENABLED']:
+            build_score_cube()
+
+# عمليات مجمع تصدير الإدارات (spawn) تعيد تنفيذ هذا الملف باسم __mp_main__ عند
+# التشغيل بـ python src/main.py، ولا يجوز أن تعيد التهيئة فيها لأن
+# recover_export_jobs يُفشل مهام التصدير الجارية في الخادم نفسه
+if __name__ != '__mp_main__':
+    initialize_database(app)
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
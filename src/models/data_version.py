@@ -0,0 +1,38 @@
+from sqlalchemy import update
+from src.models.user import db
+
+class DataVersion(db.Model):
+    """عداد إصدار البيانات - يزداد مع كل كتابة على الموظفين أو الإدارات أو التقييمات"""
+    __tablename__ = 'data_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+def ensure_data_version():
+    """إنشاء صف العداد إذا لم يكن موجوداً"""
+    if db.session.get(DataVersion, 1) is None:
+        db.session.add(DataVersion(id=1, version=1))
+        db.session.commit()
+
+def bump_data_version():
+    """زيادة إصدار البيانات ضمن معاملة الكتابة الحالية"""
+    db.session.execute(
+        update(DataVersion).where(DataVersion.id == 1).values(version=DataVersion.version + 1),
+        execution_options={'synchronize_session': False}
+    )
+
+def begin_write_transaction():
+    """أخذ قفل الكتابة قبل قراءة بيانات ستُعدل بناءً عليها
+
+    pysqlite لا يبدأ المعاملة إلا عند أول أمر كتابة، فالقراءة قبله لا تمنع طلباً
+    متزامناً من قراءة نفس البيانات وحساب فروقاته عليها. هذا التحديث لا يغير
+    الإصدار لكنه يبدأ معاملة الكتابة، فتنتظر الطلبات الأخرى حتى حفظها.
+    """
+    db.session.execute(
+        update(DataVersion).where(DataVersion.id == 1).values(version=DataVersion.version),
+        execution_options={'synchronize_session': False}
+    )
+
+def get_data_version():
+    """الحصول على إصدار البيانات الحالي"""
+    return db.session.query(DataVersion.version).filter(DataVersion.id == 1).scalar() or 0
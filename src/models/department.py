@@ -23,7 +23,7 @@ class EvaluationCriteria(db.Model):
     __tablename__ = 'evaluation_criteria'
     
     id = db.Column(db.Integer, primary_key=True)
-    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=False)
+    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=False, index=True)
     criteria_name = db.Column(db.String(200), nullable=False)
     max_score = db.Column(db.Integer, nullable=False, default=5)
     
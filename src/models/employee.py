@@ -9,7 +9,7 @@ class Employee(db.Model):
     employee_number = db.Column(db.String(50), nullable=False, unique=True)
     full_name = db.Column(db.String(200), nullable=False)
     job_title = db.Column(db.String(200), nullable=False)
-    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=False)
+    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # العلاقات
@@ -0,0 +1,81 @@
+from sqlalchemy import func, select, insert, delete
+from src.models.user import db
+from src.models.employee import Employee
+from src.models.evaluation import MonthlyEvaluation
+from src.models.department import Department
+
+class EmployeeStats(db.Model):
+    """ملخص تقييمات كل موظف (عدد التقييمات ومجموع المتوسطات وآخر شهر مقيم)"""
+    __tablename__ = 'employee_stats'
+
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), primary_key=True)
+    evaluation_count = db.Column(db.Integer, nullable=False, default=0)
+    average_sum = db.Column(db.Float, nullable=False, default=0)
+    # آخر فترة مقيمة بصيغة YYYYMM
+    last_evaluation_period = db.Column(db.Integer)
+
+    @property
+    def overall_average(self):
+        if not self.evaluation_count:
+            return 0
+        return self.average_sum / self.evaluation_count
+
+    @property
+    def last_evaluation_year(self):
+        return self.last_evaluation_period // 100 if self.last_evaluation_period else None
+
+    @property
+    def last_evaluation_month(self):
+        return self.last_evaluation_period % 100 if self.last_evaluation_period else None
+
+    def to_dict(self):
+        return {
+            'employee_id': self.employee_id,
+            'evaluation_count': self.evaluation_count,
+            'overall_average': self.overall_average,
+            'last_evaluation_year': self.last_evaluation_year,
+            'last_evaluation_month': self.last_evaluation_month
+        }
+
+def _stats_aggregate():
+    """استعلام تجميعي يحسب ملخص كل موظف من جدول التقييمات"""
+    period = MonthlyEvaluation.evaluation_year * 100 + MonthlyEvaluation.evaluation_month
+    return select(
+        MonthlyEvaluation.employee_id,
+        func.count(MonthlyEvaluation.id),
+        func.sum(MonthlyEvaluation.average_score),
+        func.max(period)
+    ).group_by(MonthlyEvaluation.employee_id)
+
+def refresh_employee_stats(employee_ids):
+    """إعادة حساب ملخص الموظفين المتأثرين بالكتابة ضمن نفس المعاملة
+
+    يُعاد حساب صفوف الموظفين المعنيين فقط باستعلام تجميعي واحد على فهرس
+    employee_id، فتبقى تكلفة التحديث مرتبطة بتاريخ الموظف لا بحجم الجدول.
+    """
+    employee_ids = list({employee_id for employee_id in employee_ids if employee_id is not None})
+    if not employee_ids:
+        return
+
+    db.session.flush()
+    db.session.execute(
+        delete(EmployeeStats).where(EmployeeStats.employee_id.in_(employee_ids)),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.execute(
+        insert(EmployeeStats).from_select(
+            ['employee_id', 'evaluation_count', 'average_sum', 'last_evaluation_period'],
+            _stats_aggregate().where(MonthlyEvaluation.employee_id.in_(employee_ids))
+        )
+    )
+
+def select_employee_summaries():
+    """أعمدة الموظفين مع اسم الإدارة وملخص التقييمات في استعلام واحد دون كائنات ORM"""
+    return select(
+        Employee.id, Employee.full_name, Employee.employee_number, Employee.job_title,
+        Department.name.label('department_name'),
+        func.coalesce(EmployeeStats.evaluation_count, 0).label('evaluation_count'),
+        EmployeeStats.average_sum
+    ).outerjoin(Department, Department.id == Employee.department_id)\
+        .outerjoin(EmployeeStats, EmployeeStats.employee_id == Employee.id)\
+        .order_by(Employee.id)
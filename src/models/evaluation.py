@@ -1,6 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import func, delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from src.models.user import db
+from src.models.department import EvaluationCriteria
+from src.models.data_version import begin_write_transaction
 
 class MonthlyEvaluation(db.Model):
     __tablename__ = 'monthly_evaluations'
@@ -11,11 +15,21 @@ class MonthlyEvaluation(db.Model):
     evaluation_year = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # قيم محسوبة من جدول الدرجات تُحدّث عند كل كتابة لتجنب تحميل الدرجات عند القراءة
+    total_score = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    average_score = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    score_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # العلاقات
     scores = db.relationship('EvaluationScore', backref='evaluation', lazy=True, cascade='all, delete-orphan')
     
     # فهرس فريد لضمان عدم تكرار التقييم لنفس الموظف في نفس الشهر والسنة
-    __table_args__ = (db.UniqueConstraint('employee_id', 'evaluation_month', 'evaluation_year'),)
+    # وفهارس مركبة للبحث حسب الموظف والفترة وحسب الفترة فقط
+    __table_args__ = (
+        db.UniqueConstraint('employee_id', 'evaluation_month', 'evaluation_year'),
+        db.Index('ix_monthly_evaluations_employee_period', 'employee_id', 'evaluation_year', 'evaluation_month'),
+        db.Index('ix_monthly_evaluations_period', 'evaluation_year', 'evaluation_month'),
+    )
     
     def to_dict(self):
         return {
@@ -24,16 +38,32 @@ class MonthlyEvaluation(db.Model):
             'evaluation_month': self.evaluation_month,
             'evaluation_year': self.evaluation_year,
             'created_at': self.created_at.isoformat() if self.created_at else None,
+            'total_score': self.total_score,
+            'average_score': self.average_score,
+            'score_count': self.score_count,
             'scores': [score.to_dict() for score in self.scores]
         }
     
     def get_total_score(self):
-        return sum(score.score for score in self.scores)
+        return self.total_score or 0
     
     def get_average_score(self):
-        if not self.scores:
-            return 0
-        return self.get_total_score() / len(self.scores)
+        return self.average_score or 0
+    
+    def set_score_totals(self, total, count):
+        """تعيين المجموع وعدد الدرجات وحساب المتوسط"""
+        self.total_score = total or 0
+        self.score_count = count or 0
+        self.average_score = self.total_score / self.score_count if self.score_count else 0
+    
+    def refresh_score_totals(self):
+        """إعادة حساب القيم المخزنة من جدول الدرجات بعد تعديلها"""
+        db.session.flush()
+        total, count = db.session.query(
+            func.coalesce(func.sum(EvaluationScore.score), 0),
+            func.count(EvaluationScore.id)
+        ).filter(EvaluationScore.evaluation_id == self.id).one()
+        self.set_score_totals(total, count)
 
 class EvaluationScore(db.Model):
     __tablename__ = 'evaluation_scores'
@@ -43,6 +73,13 @@ class EvaluationScore(db.Model):
     criteria_id = db.Column(db.Integer, db.ForeignKey('evaluation_criteria.id'), nullable=False)
     score = db.Column(db.Float, nullable=False)
     
+    # مفتاح فريد لدرجة واحدة لكل معيار في التقييم (يُستخدم في ON CONFLICT ويغطي
+    # البحث حسب التقييم ثم المعيار)، وفهرس للبحث حسب المعيار
+    __table_args__ = (
+        db.Index('uq_evaluation_scores_evaluation_criteria', 'evaluation_id', 'criteria_id', unique=True),
+        db.Index('ix_evaluation_scores_criteria_id', 'criteria_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -53,3 +90,98 @@ class EvaluationScore(db.Model):
             'max_score': self.criteria.max_score if self.criteria else 100
         }
 
+def sync_evaluation_scores(evaluation_id, scores):
+    """مطابقة درجات التقييم مع القائمة الجديدة بتنفيذ الفروقات فقط
+
+    تُقارن الدرجات الجديدة بالموجودة، ثم تُنفذ INSERT ... ON CONFLICT DO UPDATE
+    للدرجات الجديدة أو المعدلة وDELETE للمعايير المحذوفة، دون المساس بالدرجات
+    التي لم تتغير. ترجع معرفات المعايير المضافة والمعدلة والمحذوفة.
+    تبدأ معاملة الكتابة قبل قراءة الدرجات الموجودة، حتى لا يحسب طلبان متزامنان
+    فروقاتهما على نفس الدرجات فتُحفظ درجات الطلبين معاً.
+    """
+    begin_write_transaction()
+    new_scores = {score_data['criteria_id']: score_data['score'] for score_data in scores}
+    existing_scores = dict(db.session.query(EvaluationScore.criteria_id, EvaluationScore.score)
+                           .filter(EvaluationScore.evaluation_id == evaluation_id).all())
+    
+    inserted = sorted(criteria_id for criteria_id in new_scores if criteria_id not in existing_scores)
+    updated = sorted(criteria_id for criteria_id, score in new_scores.items()
+                     if criteria_id in existing_scores and existing_scores[criteria_id] != score)
+    deleted = sorted(criteria_id for criteria_id in existing_scores if criteria_id not in new_scores)
+    
+    upserts = [
+        {'evaluation_id': evaluation_id, 'criteria_id': criteria_id, 'score': new_scores[criteria_id]}
+        for criteria_id in inserted + updated
+    ]
+    if upserts:
+        statement = sqlite_insert(EvaluationScore)
+        statement = statement.on_conflict_do_update(
+            index_elements=['evaluation_id', 'criteria_id'],
+            set_={'score': statement.excluded.score}
+        )
+        db.session.execute(statement, upserts)
+    
+    if deleted:
+        db.session.execute(
+            delete(EvaluationScore).where(
+                EvaluationScore.evaluation_id == evaluation_id,
+                EvaluationScore.criteria_id.in_(deleted)
+            ),
+            execution_options={'synchronize_session': False}
+        )
+    
+    return {'inserted': inserted, 'updated': updated, 'deleted': deleted}
+
+# عدد الصفوف المقروءة من المؤشر في كل دفعة عند قراءة سلاسل الرسم البياني
+CHART_SERIES_BATCH_SIZE = 10000
+
+def iter_chart_series(filters):
+    """قراءة تقييمات الرسم البياني باستعلام واحد يربطها بدرجاتها وأسماء معاييرها
+
+    تُقرأ الصفوف على دفعات وتُرجع لكل موظف (معرف الموظف، قائمة (السنة، الشهر،
+    المجموع، المتوسط، [(اسم المعيار، الدرجة)])) مرتبة حسب الفترة ثم المعيار.
+    الدرجات على معايير غير موجودة لا تظهر.
+    """
+    # التنفيذ على اتصال Core مباشرة يتجاوز طبقة تحميل ORM غير اللازمة هنا
+    result = db.session.connection().execute(
+        select(
+            MonthlyEvaluation.employee_id, MonthlyEvaluation.id,
+            MonthlyEvaluation.evaluation_year, MonthlyEvaluation.evaluation_month,
+            MonthlyEvaluation.total_score, MonthlyEvaluation.average_score,
+            EvaluationCriteria.criteria_name, EvaluationScore.score
+        )
+        .outerjoin(EvaluationScore, EvaluationScore.evaluation_id == MonthlyEvaluation.id)
+        .outerjoin(EvaluationCriteria, EvaluationCriteria.id == EvaluationScore.criteria_id)
+        .where(*filters)
+        .order_by(MonthlyEvaluation.employee_id, MonthlyEvaluation.evaluation_year,
+                  MonthlyEvaluation.evaluation_month, EvaluationScore.criteria_id)
+        .execution_options(yield_per=CHART_SERIES_BATCH_SIZE)
+    )
+    
+    # صفوف كل موظف ثم كل تقييم متتالية بسبب الترتيب
+    current_employee_id = current_evaluation_id = None
+    evaluations = None
+    try:
+        for employee_id, evaluation_id, evaluation_year, evaluation_month, total, average, \
+                criteria_name, score in result:
+            if employee_id != current_employee_id:
+                if evaluations is not None:
+                    yield current_employee_id, evaluations
+                current_employee_id = employee_id
+                evaluations = []
+            if evaluation_id != current_evaluation_id:
+                current_evaluation_id = evaluation_id
+                evaluations.append((evaluation_year, evaluation_month, total, average, []))
+            if criteria_name is not None:
+                evaluations[-1][4].append((criteria_name, score))
+        if evaluations is not None:
+            yield current_employee_id, evaluations
+    finally:
+        result.close()
+
+def load_chart_series(filters):
+    """تقييمات الرسم البياني لموظف واحد (filters تتضمن شرط الموظف)"""
+    evaluations = []
+    for employee_id, employee_evaluations in iter_chart_series(filters):
+        evaluations.extend(employee_evaluations)
+    return evaluations
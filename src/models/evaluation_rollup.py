@@ -0,0 +1,151 @@
+from sqlalchemy import func, select, insert, delete, tuple_, literal
+from src.models.user import db
+from src.models.evaluation import MonthlyEvaluation, EvaluationScore
+from src.models.employee import Employee
+from src.models.department import EvaluationCriteria
+
+# درجات الدقة المتاحة للسلاسل الزمنية (الشهرية تُقرأ من التقييمات مباشرة)
+RESOLUTIONS = ('month', 'quarter', 'year')
+# قيمة quarter لصفوف السنة الكاملة وقيمة criteria_id لصفوف متوسط التقييم
+YEAR_ROLLUP = 0
+OVERALL_ROLLUP = 0
+
+class EvaluationRollup(db.Model):
+    """مجاميع تقييمات الموظف لكل ربع سنة وسنة، للتقييم ككل ولكل معيار
+
+    صفوف criteria_id = 0 تحمل مجموع متوسطات التقييمات ومجموع درجاتها الكلية،
+    وبقية الصفوف مجموع درجات المعيار. تُحسب المتوسطات بالقسمة على
+    evaluation_count، ومتوسطات الإدارة بتجميع صفوف موظفيها
+    (load_department_rollup_series).
+    """
+    __tablename__ = 'evaluation_rollups'
+
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    # 1-4 أو 0 لصف السنة الكاملة
+    quarter = db.Column(db.Integer, primary_key=True)
+    criteria_id = db.Column(db.Integer, primary_key=True)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+    total_sum = db.Column(db.Float, nullable=False, default=0)
+    evaluation_count = db.Column(db.Integer, nullable=False, default=0)
+
+def _quarter_aggregates(periods):
+    """استعلامات تجميع الأرباع (للتقييم ككل ولكل معيار) لفترات (الموظف، السنة)"""
+    quarter = (MonthlyEvaluation.evaluation_month + 2) // 3
+    keys = tuple_(MonthlyEvaluation.employee_id, MonthlyEvaluation.evaluation_year).in_(periods)
+    overall = select(
+        MonthlyEvaluation.employee_id, MonthlyEvaluation.evaluation_year, quarter,
+        literal(OVERALL_ROLLUP), func.sum(MonthlyEvaluation.average_score),
+        func.sum(MonthlyEvaluation.total_score), func.count()
+    ).where(keys).group_by(MonthlyEvaluation.employee_id, MonthlyEvaluation.evaluation_year, quarter)
+    criteria = select(
+        MonthlyEvaluation.employee_id, MonthlyEvaluation.evaluation_year, quarter,
+        EvaluationScore.criteria_id, func.sum(EvaluationScore.score), literal(0), func.count()
+    ).join(EvaluationScore, EvaluationScore.evaluation_id == MonthlyEvaluation.id)\
+        .where(keys).group_by(
+            MonthlyEvaluation.employee_id, MonthlyEvaluation.evaluation_year, quarter,
+            EvaluationScore.criteria_id
+        )
+    return overall, criteria
+
+def refresh_evaluation_rollups(periods):
+    """إعادة حساب مجاميع فترات (الموظف، السنة) المتأثرة ضمن نفس المعاملة
+
+    تُحسب الأرباع من تقييمات السنة المعنية فقط، ثم صفوف السنة من صفوف
+    الأرباع، فتبقى تكلفة الكتابة بحجم سنة واحدة للموظف.
+    """
+    periods = list(set(periods))
+    if not periods:
+        return
+
+    columns = ['employee_id', 'year', 'quarter', 'criteria_id', 'score_sum', 'total_sum', 'evaluation_count']
+    db.session.flush()
+    db.session.execute(
+        delete(EvaluationRollup)
+        .where(tuple_(EvaluationRollup.employee_id, EvaluationRollup.year).in_(periods)),
+        execution_options={'synchronize_session': False}
+    )
+    for aggregate in _quarter_aggregates(periods):
+        db.session.execute(insert(EvaluationRollup).from_select(columns, aggregate))
+    db.session.execute(insert(EvaluationRollup).from_select(columns, select(
+        EvaluationRollup.employee_id, EvaluationRollup.year, literal(YEAR_ROLLUP),
+        EvaluationRollup.criteria_id, func.sum(EvaluationRollup.score_sum),
+        func.sum(EvaluationRollup.total_sum), func.sum(EvaluationRollup.evaluation_count)
+    ).where(
+        tuple_(EvaluationRollup.employee_id, EvaluationRollup.year).in_(periods),
+        EvaluationRollup.quarter != YEAR_ROLLUP
+    ).group_by(EvaluationRollup.employee_id, EvaluationRollup.year, EvaluationRollup.criteria_id)))
+
+def _bucket_filters(resolution, start, end):
+    """شروط صفوف الأرباع أو السنوات التي تقع فيها الفترتان (سنة، شهر) الشاملتان"""
+    if resolution == 'year':
+        filters = [EvaluationRollup.quarter == YEAR_ROLLUP]
+        if start:
+            filters.append(EvaluationRollup.year >= start[0])
+        if end:
+            filters.append(EvaluationRollup.year <= end[0])
+    else:
+        bucket = tuple_(EvaluationRollup.year, EvaluationRollup.quarter)
+        filters = [EvaluationRollup.quarter != YEAR_ROLLUP]
+        if start:
+            filters.append(bucket >= (start[0], (start[1] + 2) // 3))
+        if end:
+            filters.append(bucket <= (end[0], (end[1] + 2) // 3))
+    return filters
+
+def _series_from_rows(rows, resolution):
+    """تحويل صفوف (السنة، الربع، المعيار، اسمه، مجموع الدرجات، مجموع المجاميع، العدد)
+    المرتبة حسب الفترة ثم المعيار إلى سلسلة"""
+    # صف المتوسط العام (criteria_id = 0) يأتي أولاً في كل فترة بسبب الترتيب
+    series = []
+    for year, quarter, criteria_id, criteria_name, score_sum, total_sum, count in rows:
+        if criteria_id == OVERALL_ROLLUP:
+            series.append((
+                year, quarter if resolution == 'quarter' else None,
+                total_sum / count, score_sum / count, []
+            ))
+        elif criteria_name is not None and series and series[-1][:2] == \
+                (year, quarter if resolution == 'quarter' else None):
+            series[-1][4].append((criteria_name, score_sum / count))
+    return series
+
+def load_rollup_series(employee_id, resolution, start, end):
+    """قراءة سلسلة الموظف بدقة ربع سنوية أو سنوية بين فترتين (سنة، شهر) شاملتين
+
+    تُرجع الأرباع أو السنوات التي تقع فيها الفترتان كاملة، بصيغة قائمة
+    (السنة، الربع أو None، متوسط المجموع، متوسط المتوسط، [(اسم المعيار، المتوسط)]).
+    """
+    rows = db.session.execute(
+        select(
+            EvaluationRollup.year, EvaluationRollup.quarter, EvaluationRollup.criteria_id,
+            EvaluationCriteria.criteria_name, EvaluationRollup.score_sum,
+            EvaluationRollup.total_sum, EvaluationRollup.evaluation_count
+        )
+        .outerjoin(EvaluationCriteria, EvaluationCriteria.id == EvaluationRollup.criteria_id)
+        .where(EvaluationRollup.employee_id == employee_id, *_bucket_filters(resolution, start, end))
+        .order_by(EvaluationRollup.year, EvaluationRollup.quarter, EvaluationRollup.criteria_id)
+    ).all()
+    return _series_from_rows(rows, resolution)
+
+def load_department_rollup_series(department_id, resolution, start, end):
+    """سلسلة الإدارة بدقة ربع سنوية أو سنوية بتجميع صفوف موظفيها المخزنة
+
+    لا يوجد جدول مجاميع للإدارات: يُجمع GROUP BY على صفوف موظفي الإدارة في
+    evaluation_rollups (صف واحد لكل موظف وفترة ومعيار)، فتكلفته بعدد موظفي
+    الإدارة لا بعدد تقييماتهم. المتوسطات موزونة بعدد التقييمات، أي متوسط جميع
+    تقييمات الإدارة في الفترة، ويُحسب الموظف ضمن إدارته الحالية بكامل تاريخه.
+    نفس صيغة load_rollup_series.
+    """
+    rows = db.session.execute(
+        select(
+            EvaluationRollup.year, EvaluationRollup.quarter, EvaluationRollup.criteria_id,
+            EvaluationCriteria.criteria_name, func.sum(EvaluationRollup.score_sum),
+            func.sum(EvaluationRollup.total_sum), func.sum(EvaluationRollup.evaluation_count)
+        )
+        .join(Employee, Employee.id == EvaluationRollup.employee_id)
+        .outerjoin(EvaluationCriteria, EvaluationCriteria.id == EvaluationRollup.criteria_id)
+        .where(Employee.department_id == department_id, *_bucket_filters(resolution, start, end))
+        .group_by(EvaluationRollup.year, EvaluationRollup.quarter, EvaluationRollup.criteria_id)
+        .order_by(EvaluationRollup.year, EvaluationRollup.quarter, EvaluationRollup.criteria_id)
+    ).all()
+    return _series_from_rows(rows, resolution)
@@ -0,0 +1,39 @@
+from datetime import datetime
+import json
+from src.models.user import db
+
+class ExportJob(db.Model):
+    """مهمة تصدير Excel تعمل في الخلفية"""
+    __tablename__ = 'export_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    export_type = db.Column(db.String(30), nullable=False)  # all-evaluations / employee / department
+    params = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued / running / completed / failed / expired
+    progress = db.Column(db.Float, nullable=False, default=0)
+    filename = db.Column(db.String(300))
+    file_path = db.Column(db.String(500))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, index=True)
+
+    def get_params(self):
+        return json.loads(self.params or '{}')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'export_type': self.export_type,
+            'params': self.get_params(),
+            'status': self.status,
+            'progress': round(self.progress or 0, 3),
+            'filename': self.filename,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'download_url': f'/api/export/jobs/{self.id}/download' if self.status == 'completed' else None
+        }
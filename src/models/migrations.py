@@ -0,0 +1,158 @@
+import logging
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# ترحيلات مخطط قاعدة البيانات
+# db.create_all() ينشئ الجداول الجديدة فقط ولا يعدل الجداول الموجودة،
+# لذلك تُطبق هذه الترحيلات على ملفات app.db القائمة عند بدء التشغيل.
+# يُحفظ رقم آخر ترحيل مطبق في PRAGMA user_version، ويجب أن تكون كل خطوة
+# آمنة للتكرار لأن قاعدة البيانات الجديدة تحصل على المخطط كاملاً من create_all.
+
+
+def _add_lookup_indexes(conn):
+    """إضافة فهارس أعمدة البحث المستخدمة بكثرة"""
+    statements = [
+        'CREATE INDEX IF NOT EXISTS ix_employees_department_id '
+        'ON employees (department_id)',
+        'CREATE INDEX IF NOT EXISTS ix_evaluation_criteria_department_id '
+        'ON evaluation_criteria (department_id)',
+        'CREATE INDEX IF NOT EXISTS ix_monthly_evaluations_employee_period '
+        'ON monthly_evaluations (employee_id, evaluation_year, evaluation_month)',
+        'CREATE INDEX IF NOT EXISTS ix_monthly_evaluations_period '
+        'ON monthly_evaluations (evaluation_year, evaluation_month)',
+        'CREATE INDEX IF NOT EXISTS ix_evaluation_scores_criteria_id '
+        'ON evaluation_scores (criteria_id)',
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def _column_exists(conn, table, column):
+    """التحقق من وجود عمود في جدول"""
+    rows = conn.execute(text(f'PRAGMA table_info({table})')).fetchall()
+    return any(row[1] == column for row in rows)
+
+
+def _add_column(conn, table, column, definition):
+    """إضافة عمود إذا لم يكن موجوداً"""
+    if not _column_exists(conn, table, column):
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {definition}'))
+
+
+def _add_evaluation_totals(conn):
+    """إضافة أعمدة المجموع والمتوسط وعدد الدرجات وتعبئتها للتقييمات الموجودة"""
+    _add_column(conn, 'monthly_evaluations', 'total_score', 'FLOAT NOT NULL DEFAULT 0')
+    _add_column(conn, 'monthly_evaluations', 'average_score', 'FLOAT NOT NULL DEFAULT 0')
+    _add_column(conn, 'monthly_evaluations', 'score_count', 'INTEGER NOT NULL DEFAULT 0')
+    _recompute_evaluation_totals(conn)
+
+
+def _recompute_evaluation_totals(conn):
+    """إعادة حساب المجموع والمتوسط وعدد الدرجات لجميع التقييمات"""
+    conn.execute(text('''
+        UPDATE monthly_evaluations SET
+            total_score = COALESCE((SELECT SUM(score) FROM evaluation_scores
+                                    WHERE evaluation_id = monthly_evaluations.id), 0),
+            score_count = (SELECT COUNT(*) FROM evaluation_scores
+                           WHERE evaluation_id = monthly_evaluations.id)
+    '''))
+    conn.execute(text('''
+        UPDATE monthly_evaluations SET
+            average_score = CASE WHEN score_count > 0
+                                 THEN total_score / score_count ELSE 0 END
+    '''))
+
+
+def _backfill_employee_stats(conn):
+    """تعبئة جدول ملخص الموظفين من التقييمات الموجودة"""
+    conn.execute(text('DELETE FROM employee_stats'))
+    conn.execute(text('''
+        INSERT INTO employee_stats
+            (employee_id, evaluation_count, average_sum, last_evaluation_period)
+        SELECT employee_id, COUNT(id), SUM(average_score),
+               MAX(evaluation_year * 100 + evaluation_month)
+        FROM monthly_evaluations
+        GROUP BY employee_id
+    '''))
+
+
+def _add_unique_score_key(conn):
+    """إزالة الدرجات المكررة لنفس المعيار ثم إضافة المفتاح الفريد (evaluation_id, criteria_id)"""
+    result = conn.execute(text('''
+        DELETE FROM evaluation_scores
+        WHERE id NOT IN (SELECT MAX(id) FROM evaluation_scores
+                         GROUP BY evaluation_id, criteria_id)
+    '''))
+    if result.rowcount:
+        _recompute_evaluation_totals(conn)
+        _backfill_employee_stats(conn)
+    conn.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_evaluation_scores_evaluation_criteria '
+        'ON evaluation_scores (evaluation_id, criteria_id)'
+    ))
+
+
+def _backfill_evaluation_rollups(conn):
+    """تعبئة جدول مجاميع الأرباع والسنوات من التقييمات الموجودة"""
+    conn.execute(text('DELETE FROM evaluation_rollups'))
+    conn.execute(text('''
+        INSERT INTO evaluation_rollups
+            (employee_id, year, quarter, criteria_id, score_sum, total_sum, evaluation_count)
+        SELECT employee_id, evaluation_year, (evaluation_month + 2) / 3, 0,
+               SUM(average_score), SUM(total_score), COUNT(id)
+        FROM monthly_evaluations
+        GROUP BY employee_id, evaluation_year, (evaluation_month + 2) / 3
+    '''))
+    conn.execute(text('''
+        INSERT INTO evaluation_rollups
+            (employee_id, year, quarter, criteria_id, score_sum, total_sum, evaluation_count)
+        SELECT e.employee_id, e.evaluation_year, (e.evaluation_month + 2) / 3, s.criteria_id,
+               SUM(s.score), 0, COUNT(s.id)
+        FROM monthly_evaluations e JOIN evaluation_scores s ON s.evaluation_id = e.id
+        GROUP BY e.employee_id, e.evaluation_year, (e.evaluation_month + 2) / 3, s.criteria_id
+    '''))
+    conn.execute(text('''
+        INSERT INTO evaluation_rollups
+            (employee_id, year, quarter, criteria_id, score_sum, total_sum, evaluation_count)
+        SELECT employee_id, year, 0, criteria_id,
+               SUM(score_sum), SUM(total_sum), SUM(evaluation_count)
+        FROM evaluation_rollups
+        WHERE quarter != 0
+        GROUP BY employee_id, year, criteria_id
+    '''))
+
+
+def _drop_duplicate_score_index(conn):
+    """حذف الفهرس (evaluation_id, criteria_id, score) لأن المفتاح الفريد يغطي نفس البحث"""
+    conn.execute(text('DROP INDEX IF EXISTS ix_evaluation_scores_evaluation_criteria'))
+
+
+# قائمة الترحيلات مرتبة حسب الإصدار - تضاف الترحيلات الجديدة في النهاية فقط
+MIGRATIONS = [
+    (1, 'فهارس أعمدة البحث', _add_lookup_indexes),
+    (2, 'أعمدة مجموع ومتوسط التقييم', _add_evaluation_totals),
+    (3, 'ملخص تقييمات الموظفين', _backfill_employee_stats),
+    (4, 'مفتاح فريد لدرجات التقييم', _add_unique_score_key),
+    (5, 'مجاميع التقييمات الربعية والسنوية', _backfill_evaluation_rollups),
+    (6, 'حذف فهرس الدرجات المكرر', _drop_duplicate_score_index),
+]
+
+
+def get_schema_version(conn):
+    """الحصول على إصدار المخطط الحالي"""
+    return conn.execute(text('PRAGMA user_version')).scalar() or 0
+
+
+def run_migrations(engine):
+    """تطبيق الترحيلات غير المطبقة بالترتيب، كل ترحيل في معاملة مستقلة"""
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        with engine.begin() as conn:
+            if get_schema_version(conn) >= version:
+                continue
+            logger.info(f"تطبيق ترحيل قاعدة البيانات {version}: {description}")
+            migrate(conn)
+            conn.execute(text(f'PRAGMA user_version = {int(version)}'))
+        applied.append(version)
+    return applied
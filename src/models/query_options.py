@@ -0,0 +1,22 @@
+from sqlalchemy.orm import selectinload, joinedload
+from src.models.employee import Employee
+from src.models.evaluation import MonthlyEvaluation, EvaluationScore
+
+# ملفات التحميل المسبق المشتركة بين المسارات
+# تُستخدم مع .options() حتى تكلف أي قائمة تقييمات عدداً ثابتاً من الاستعلامات
+# بدلاً من استعلام لكل تقييم ولكل درجة (مشكلة N+1)
+
+
+def evaluation_scores_options():
+    """تحميل درجات التقييم ومعاييرها دفعة واحدة"""
+    return (
+        selectinload(MonthlyEvaluation.scores).joinedload(EvaluationScore.criteria),
+    )
+
+
+def employee_department_options():
+    """تحميل إدارة الموظف في نفس الاستعلام"""
+    return (
+        joinedload(Employee.department),
+    )
+
@@ -0,0 +1,22 @@
+from datetime import datetime
+from src.models.user import db
+
+class ShareToken(db.Model):
+    """رمز رابط مشاركة (فردي لموظف أو عام) - يُحفظ بصمة الرمز فقط لا الرمز نفسه"""
+    __tablename__ = 'share_tokens'
+
+    id = db.Column(db.Integer, primary_key=True)
+    token_hash = db.Column(db.String(64), nullable=False, unique=True)
+    scope = db.Column(db.String(20), nullable=False)  # employee / public
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'scope': self.scope,
+            'employee_id': self.employee_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
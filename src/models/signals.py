@@ -0,0 +1,14 @@
+from blinker import Namespace
+
+# إشارات تغيير البيانات، تُرسل بعد نجاح commit فقط حتى لا يرى المستمع
+# بيانات معاملة أُلغيت. المرسل هو كائن التطبيق الحالي.
+_signals = Namespace()
+
+# periods: مجموعة (معرف الموظف، السنة) للتقييمات المضافة أو المعدلة أو المحذوفة
+evaluations_changed = _signals.signal('evaluations-changed')
+
+# employee_ids: الموظفون الذين أُضيفوا أو عُدلت بياناتهم أو حُذفوا
+employees_changed = _signals.signal('employees-changed')
+
+# department_ids: الإدارات التي تغير اسمها أو معاييرها أو حُذفت
+departments_changed = _signals.signal('departments-changed')
@@ -0,0 +1,69 @@
+import os
+import re
+from sqlalchemy import event
+
+# إعدادات SQLite للإنتاج
+# WAL يسمح للقراء بالعمل أثناء الكتابة، وbusy_timeout ينتظر تحرير القفل
+# بدلاً من إرجاع "database is locked" فوراً عند تزامن إرسال التقييمات
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,         # بالمللي ثانية
+    'mmap_size': 268435456,       # 256 ميجابايت
+    'cache_size': -65536,         # القيمة السالبة بالكيلوبايت (64 ميجابايت)
+    'temp_store': 'MEMORY',
+}
+
+# أوامر PRAGMA المسموح بضبطها من الإعدادات
+ALLOWED_PRAGMAS = set(DEFAULT_SQLITE_PRAGMAS)
+
+_PRAGMA_VALUE_PATTERN = re.compile(r'^-?[A-Za-z0-9_]+$')
+
+
+def load_sqlite_pragmas(settings=None):
+    """دمج القيم الافتراضية مع قسم sqlite في ملف الإعدادات ومتغيرات البيئة"""
+    pragmas = dict(DEFAULT_SQLITE_PRAGMAS)
+
+    for name, value in ((settings or {}).get('sqlite') or {}).items():
+        if name in ALLOWED_PRAGMAS:
+            pragmas[name] = value
+
+    # متغيرات البيئة لها الأولوية، مثال: SQLITE_BUSY_TIMEOUT=10000
+    for name in ALLOWED_PRAGMAS:
+        env_value = os.environ.get(f'SQLITE_{name.upper()}')
+        if env_value:
+            pragmas[name] = env_value
+
+    for name, value in pragmas.items():
+        if not _PRAGMA_VALUE_PATTERN.match(str(value)):
+            raise ValueError(f'قيمة غير صالحة لإعداد SQLite {name}: {value}')
+
+    return pragmas
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    """تطبيق أوامر PRAGMA على اتصال SQLite جديد"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+
+def configure_sqlite_engine(engine, pragmas):
+    """ربط أوامر PRAGMA بكل اتصال يفتحه المحرك"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+
+def read_sqlite_pragmas(connection):
+    """قراءة القيم الفعلية المطبقة على الاتصال الحالي"""
+    return {
+        name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+        for name in ALLOWED_PRAGMAS
+    }
@@ -1,6 +1,10 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from src.models.user import db
 from src.models.department import Department, EvaluationCriteria
+from src.models.data_version import bump_data_version
+from src.models.signals import departments_changed
+from src.services.department_analytics import compute_department_analytics
+from datetime import datetime
 
 department_bp = Blueprint('department', __name__)
 
@@ -93,7 +97,12 @@ def initialize_departments():
             for criterion in criteria_list:
                 db.session.add(criterion)
         
+        bump_data_version()
         db.session.commit()
+        departments_changed.send(
+            current_app._get_current_object(),
+            department_ids={hr_dept.id, sales_dept.id, tech_dept.id, finance_dept.id}
+        )
         return jsonify({'message': 'تم تهيئة الإدارات ومعايير التقييم بنجاح'})
         
     except Exception as e:
@@ -141,7 +150,9 @@ def create_department():
             )
             db.session.add(criterion)
         
+        bump_data_version()
         db.session.commit()
+        departments_changed.send(current_app._get_current_object(), department_ids={department.id})
         
         return jsonify({
             'message': 'تم إنشاء الإدارة بنجاح',
@@ -193,7 +204,9 @@ def update_department(department_id):
             )
             db.session.add(criterion)
         
+        bump_data_version()
         db.session.commit()
+        departments_changed.send(current_app._get_current_object(), department_ids={department_id})
         
         return jsonify({
             'message': 'تم تحديث الإدارة بنجاح',
@@ -224,7 +237,9 @@ def delete_department(department_id):
         
         # حذف الإدارة
         db.session.delete(department)
+        bump_data_version()
         db.session.commit()
+        departments_changed.send(current_app._get_current_object(), department_ids={department_id})
         
         return jsonify({'message': 'تم حذف الإدارة بنجاح'})
         
@@ -247,3 +262,21 @@ def get_department(department_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
+@department_bp.route('/departments/<int:department_id>/analytics', methods=['GET'])
+def get_department_analytics(department_id):
+    """إحصائيات توزيع درجات الإدارة لكل معيار في شهر أو سنة"""
+    try:
+        department = Department.query.get_or_404(department_id)
+        
+        year = request.args.get('year', datetime.now().year, type=int)
+        month = request.args.get('month', type=int)
+        if 'month' in request.args and (month is None or not 1 <= month <= 12):
+            return jsonify({'error': 'شهر التقييم غير صالح'}), 400
+        
+        result = compute_department_analytics(department_id, year, month)
+        result['department'] = department.to_dict()
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
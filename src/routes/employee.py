@@ -1,7 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from src.models.user import db
 from src.models.employee import Employee
 from src.models.department import Department
+from src.models.data_version import bump_data_version
+from src.models.signals import employees_changed
+from src.models.query_options import employee_department_options
+from src.services.share_tokens import delete_employee_share_tokens
 
 employee_bp = Blueprint('employee', __name__)
 
@@ -9,7 +13,7 @@ employee_bp = Blueprint('employee', __name__)
 def get_employees():
     """الحصول على جميع الموظفين"""
     try:
-        employees = Employee.query.all()
+        employees = Employee.query.options(*employee_department_options()).all()
         return jsonify([emp.to_dict() for emp in employees])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -54,7 +58,9 @@ def create_employee():
         )
         
         db.session.add(employee)
+        bump_data_version()
         db.session.commit()
+        employees_changed.send(current_app._get_current_object(), employee_ids={employee.id})
         
         return jsonify(employee.to_dict()), 201
         
@@ -89,7 +95,9 @@ def update_employee(employee_id):
                 return jsonify({'error': 'الإدارة غير موجودة'}), 400
             employee.department_id = data['department_id']
         
+        bump_data_version()
         db.session.commit()
+        employees_changed.send(current_app._get_current_object(), employee_ids={employee_id})
         return jsonify(employee.to_dict())
         
     except Exception as e:
@@ -101,8 +109,11 @@ def delete_employee(employee_id):
     """حذف موظف"""
     try:
         employee = Employee.query.get_or_404(employee_id)
+        delete_employee_share_tokens([employee_id])
         db.session.delete(employee)
+        bump_data_version()
         db.session.commit()
+        employees_changed.send(current_app._get_current_object(), employee_ids={employee_id})
         return jsonify({'message': 'تم حذف الموظف بنجاح'})
         
     except Exception as e:
@@ -1,8 +1,20 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
+from sqlalchemy import insert, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from src.models.user import db
-from src.models.evaluation import MonthlyEvaluation, EvaluationScore
+from src.models.evaluation import MonthlyEvaluation, EvaluationScore, sync_evaluation_scores, load_chart_series
 from src.models.employee import Employee
-from src.models.department import EvaluationCriteria
+from src.models.department import Department, EvaluationCriteria
+from src.models.employee_stats import refresh_employee_stats
+from src.models.evaluation_rollup import (
+    refresh_evaluation_rollups, load_rollup_series, load_department_rollup_series, RESOLUTIONS
+)
+from src.models.data_version import bump_data_version
+from src.models.signals import evaluations_changed
+from src.models.query_options import evaluation_scores_options, employee_department_options
+from src.services.chart_cache import get_chart_data, store_chart_data, get_chart_cache_stats
+from src.services.score_cube import get_chart_series, get_score_cube_stats, check_score_cube
+from src.services.percentile_index import percentile_rank
 from datetime import datetime
 
 evaluation_bp = Blueprint('evaluation', __name__)
@@ -11,7 +23,7 @@ evaluation_bp = Blueprint('evaluation', __name__)
 def create_evaluation():
     """إضافة تقييم شهري جديد"""
     try:
-        data = request.get_json()
+        data = normalize_evaluation_item(request.get_json())
         
         # التحقق من البيانات المطلوبة
         required_fields = ['employee_id', 'evaluation_month', 'evaluation_year', 'scores']
@@ -19,54 +31,306 @@ def create_evaluation():
             if field not in data:
                 return jsonify({'error': f'الحقل {field} مطلوب'}), 400
         
-        # التحقق من وجود الموظف
-        employee = Employee.query.get(data['employee_id'])
-        if not employee:
-            return jsonify({'error': 'الموظف غير موجود'}), 400
+        if not isinstance(data['scores'], list):
+            return jsonify({'error': 'بيانات الدرجات غير مكتملة'}), 400
+        
+        # التحقق من الموظف والمعايير وانتمائها لإدارة الموظف قبل أي كتابة
+        employee_departments = load_departments_by_id(Employee, [data['employee_id']])
+        criteria_by_id = load_criteria_by_id(
+            score_data.get('criteria_id') for score_data in data['scores'] if isinstance(score_data, dict)
+        )
+        error = validate_evaluation_item(data, employee_departments, criteria_by_id)
+        if error:
+            return jsonify({'error': error}), 400
         
-        # التحقق من عدم وجود تقييم مسبق لنفس الشهر والسنة
-        existing_evaluation = MonthlyEvaluation.query.filter_by(
+        # إنشاء التقييم الشهري بعبارة واحدة تتحقق من التكرار وتكتب معاً
+        # بالاعتماد على القيد الفريد (employee_id, evaluation_month, evaluation_year)
+        # فلا يوجد فاصل بين التحقق والإدراج يمكن أن يتسابق فيه مديران
+        total = sum(score_data['score'] for score_data in data['scores'])
+        count = len(data['scores'])
+        statement = sqlite_insert(MonthlyEvaluation).values(
             employee_id=data['employee_id'],
             evaluation_month=data['evaluation_month'],
-            evaluation_year=data['evaluation_year']
-        ).first()
+            evaluation_year=data['evaluation_year'],
+            created_at=datetime.utcnow(),
+            total_score=total,
+            score_count=count,
+            average_score=total / count if count else 0
+        ).on_conflict_do_nothing(
+            index_elements=['employee_id', 'evaluation_month', 'evaluation_year']
+        ).returning(MonthlyEvaluation.id)
         
-        if existing_evaluation:
+        evaluation_id = db.session.execute(statement).scalar()
+        if evaluation_id is None:
+            db.session.rollback()
             return jsonify({'error': 'يوجد تقييم مسبق لهذا الموظف في نفس الشهر والسنة'}), 400
         
-        # إنشاء التقييم الشهري
-        evaluation = MonthlyEvaluation(
-            employee_id=data['employee_id'],
-            evaluation_month=data['evaluation_month'],
-            evaluation_year=data['evaluation_year']
+        # إضافة درجات التقييم
+        if data['scores']:
+            db.session.execute(insert(EvaluationScore), [
+                {
+                    'evaluation_id': evaluation_id,
+                    'criteria_id': score_data['criteria_id'],
+                    'score': score_data['score']
+                }
+                for score_data in data['scores']
+            ])
+        
+        # تحديث ملخص الموظف ومجاميع سنة التقييم
+        refresh_employee_stats([data['employee_id']])
+        refresh_evaluation_rollups([(data['employee_id'], data['evaluation_year'])])
+        
+        bump_data_version()
+        db.session.commit()
+        evaluations_changed.send(
+            current_app._get_current_object(),
+            periods={(data['employee_id'], data['evaluation_year'])}
         )
         
-        db.session.add(evaluation)
-        db.session.flush()  # للحصول على ID التقييم
+        evaluation = MonthlyEvaluation.query.options(*evaluation_scores_options())\
+            .filter_by(id=evaluation_id).one()
+        return jsonify(evaluation.to_dict()), 201
         
-        # إضافة درجات التقييم
-        for score_data in data['scores']:
-            if 'criteria_id' not in score_data or 'score' not in score_data:
-                return jsonify({'error': 'بيانات الدرجات غير مكتملة'}), 400
-            
-            # التحقق من وجود المعيار
-            criteria = EvaluationCriteria.query.get(score_data['criteria_id'])
-            if not criteria:
-                return jsonify({'error': f'معيار التقييم {score_data["criteria_id"]} غير موجود'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def to_int(value):
+    """تحويل قيمة JSON إلى عدد صحيح أو None (لا تُقبل القيم المنطقية)"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            return None
+    return None
+
+def normalize_evaluation_item(item):
+    """نسخة من التقييم بعد تحويل المعرفات والشهر والسنة إلى أعداد صحيحة
+
+    القيم غير القابلة للتحويل تبقى كما هي ليرفضها validate_evaluation_item،
+    حتى لا تختلف مفاتيح "1" و 1 عند البحث عن الموظف أو التقييم المكرر.
+    """
+    if not isinstance(item, dict):
+        return item
+    item = dict(item)
+    for field in ('employee_id', 'evaluation_month', 'evaluation_year'):
+        if field in item:
+            value = to_int(item[field])
+            if value is not None:
+                item[field] = value
+    if isinstance(item.get('scores'), list):
+        scores = []
+        for score_data in item['scores']:
+            if isinstance(score_data, dict) and 'criteria_id' in score_data:
+                criteria_id = to_int(score_data['criteria_id'])
+                if criteria_id is not None:
+                    score_data = dict(score_data, criteria_id=criteria_id)
+            scores.append(score_data)
+        item['scores'] = scores
+    return item
+
+def validate_evaluation_item(item, employee_departments, criteria_by_id):
+    """التحقق من تقييم واحد مقابل الموظفين والمعايير المحملة مسبقاً
+
+    employee_departments قاموس {معرف الموظف: معرف الإدارة} و criteria_by_id قاموس
+    {معرف المعيار: (معرف الإدارة، الدرجة القصوى)} يُحمّلان باستعلام IN واحد لكل
+    منهما. ترجع رسالة الخطأ أو None.
+    """
+    if not isinstance(item, dict):
+        return 'بيانات التقييم غير صالحة'
+    
+    for field in ['employee_id', 'evaluation_month', 'evaluation_year', 'scores']:
+        if field not in item:
+            return f'الحقل {field} مطلوب'
+    
+    if not isinstance(item['evaluation_month'], int) or isinstance(item['evaluation_month'], bool) \
+            or not 1 <= item['evaluation_month'] <= 12:
+        return 'شهر التقييم غير صالح'
+    
+    if not isinstance(item['evaluation_year'], int) or isinstance(item['evaluation_year'], bool):
+        return 'سنة التقييم غير صالحة'
+    
+    if not isinstance(item['employee_id'], int) or isinstance(item['employee_id'], bool):
+        return 'الموظف غير موجود'
+    
+    department_id = employee_departments.get(item['employee_id'])
+    if department_id is None:
+        return 'الموظف غير موجود'
+    
+    if not isinstance(item['scores'], list):
+        return 'بيانات الدرجات غير مكتملة'
+    
+    seen_criteria = set()
+    for score_data in item['scores']:
+        if not isinstance(score_data, dict) or 'criteria_id' not in score_data or 'score' not in score_data:
+            return 'بيانات الدرجات غير مكتملة'
+        
+        criteria = criteria_by_id.get(score_data['criteria_id'])
+        if criteria is None:
+            return f'معيار التقييم {score_data["criteria_id"]} غير موجود'
+        criteria_department_id, max_score = criteria
+        
+        if criteria_department_id != department_id:
+            return 'معيار التقييم لا ينتمي لإدارة الموظف'
+        
+        # نفس شرط مسار الاستيراد: رقم (لا قيمة منطقية) بين 0 والدرجة القصوى
+        score = score_data['score']
+        if not isinstance(score, (int, float)) or isinstance(score, bool) or not 0 <= score <= max_score:
+            return f'الدرجة يجب أن تكون بين 0 و {max_score}'
+        
+        if score_data['criteria_id'] in seen_criteria:
+            return f'معيار التقييم {score_data["criteria_id"]} مكرر'
+        seen_criteria.add(score_data['criteria_id'])
+    
+    return None
+
+def load_departments_by_id(model, ids):
+    """تحميل {المعرف: معرف الإدارة} لمجموعة معرفات باستعلام IN واحد"""
+    ids = {value for value in ids if isinstance(value, int)}
+    if not ids:
+        return {}
+    rows = db.session.query(model.id, model.department_id).filter(model.id.in_(ids)).all()
+    return dict(rows)
+
+def load_criteria_by_id(ids):
+    """تحميل {معرف المعيار: (معرف الإدارة، الدرجة القصوى)} باستعلام IN واحد"""
+    ids = {value for value in ids if isinstance(value, int)}
+    if not ids:
+        return {}
+    rows = db.session.query(
+        EvaluationCriteria.id, EvaluationCriteria.department_id, EvaluationCriteria.max_score
+    ).filter(EvaluationCriteria.id.in_(ids)).all()
+    return {criteria_id: (department_id, max_score) for criteria_id, department_id, max_score in rows}
+
+@evaluation_bp.route('/evaluations/bulk', methods=['POST'])
+def create_evaluations_bulk():
+    """إضافة عدة تقييمات شهرية دفعة واحدة مع تقرير أخطاء لكل عنصر"""
+    try:
+        data = request.get_json()
+        items = data.get('evaluations') if isinstance(data, dict) else None
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'الحقل evaluations مطلوب'}), 400
+        
+        items = [normalize_evaluation_item(item) for item in items]
+        valid_items = [item for item in items if isinstance(item, dict)]
+        
+        # التحقق من الموظفين والمعايير باستعلام IN واحد لكل منهما
+        employee_departments = load_departments_by_id(
+            Employee, (item.get('employee_id') for item in valid_items)
+        )
+        criteria_by_id = load_criteria_by_id(
+            score_data.get('criteria_id')
+            for item in valid_items
+            if isinstance(item.get('scores'), list)
+            for score_data in item['scores']
+            if isinstance(score_data, dict)
+        )
+        
+        # التقييمات الموجودة مسبقاً لنفس الموظفين والسنوات
+        existing_periods = set()
+        employee_ids = set(employee_departments)
+        years = {
+            item.get('evaluation_year') for item in valid_items
+            if isinstance(item.get('evaluation_year'), int)
+        }
+        if employee_ids:
+            existing_periods = set(db.session.query(
+                MonthlyEvaluation.employee_id,
+                MonthlyEvaluation.evaluation_month,
+                MonthlyEvaluation.evaluation_year
+            ).filter(
+                MonthlyEvaluation.employee_id.in_(employee_ids),
+                MonthlyEvaluation.evaluation_year.in_(years)
+            ).all())
+        
+        errors = []
+        accepted = []
+        for index, item in enumerate(items):
+            error = validate_evaluation_item(item, employee_departments, criteria_by_id)
             
-            # التحقق من أن المعيار ينتمي لنفس إدارة الموظف
-            if criteria.department_id != employee.department_id:
-                return jsonify({'error': 'معيار التقييم لا ينتمي لإدارة الموظف'}), 400
+            if not error:
+                period = (item['employee_id'], item['evaluation_month'], item['evaluation_year'])
+                if period in existing_periods:
+                    error = 'يوجد تقييم مسبق لهذا الموظف في نفس الشهر والسنة'
+                else:
+                    existing_periods.add(period)
             
-            score = EvaluationScore(
-                evaluation_id=evaluation.id,
-                criteria_id=score_data['criteria_id'],
-                score=score_data['score']
-            )
-            db.session.add(score)
+            if error:
+                errors.append({'index': index, 'error': error})
+            else:
+                accepted.append((index, item))
+        
+        if not accepted:
+            return jsonify({'created': 0, 'evaluation_ids': [], 'errors': errors}), 400
+        
+        # إدراج التقييمات بعبارة واحدة متعددة القيم مع المجاميع المحسوبة مسبقاً
+        now = datetime.utcnow()
+        evaluation_rows = []
+        for index, item in accepted:
+            total = sum(score_data['score'] for score_data in item['scores'])
+            count = len(item['scores'])
+            evaluation_rows.append({
+                'employee_id': item['employee_id'],
+                'evaluation_month': item['evaluation_month'],
+                'evaluation_year': item['evaluation_year'],
+                'created_at': now,
+                'total_score': total,
+                'score_count': count,
+                'average_score': total / count if count else 0
+            })
         
+        # RETURNING يعيد معرف كل تقييم مع مفتاحه لربط الدرجات به دون ترتيب مضمون
+        inserted = db.session.execute(
+            insert(MonthlyEvaluation).returning(
+                MonthlyEvaluation.id,
+                MonthlyEvaluation.employee_id,
+                MonthlyEvaluation.evaluation_month,
+                MonthlyEvaluation.evaluation_year
+            ),
+            evaluation_rows
+        ).all()
+        ids_by_period = {
+            (employee_id, month, year): evaluation_id
+            for evaluation_id, employee_id, month, year in inserted
+        }
+        evaluation_ids = [
+            ids_by_period[(item['employee_id'], item['evaluation_month'], item['evaluation_year'])]
+            for index, item in accepted
+        ]
+        
+        score_rows = [
+            {
+                'evaluation_id': evaluation_id,
+                'criteria_id': score_data['criteria_id'],
+                'score': score_data['score']
+            }
+            for evaluation_id, (index, item) in zip(evaluation_ids, accepted)
+            for score_data in item['scores']
+        ]
+        if score_rows:
+            db.session.execute(insert(EvaluationScore), score_rows)
+        
+        refresh_employee_stats(item['employee_id'] for index, item in accepted)
+        refresh_evaluation_rollups((item['employee_id'], item['evaluation_year']) for index, item in accepted)
+        
+        bump_data_version()
         db.session.commit()
-        return jsonify(evaluation.to_dict()), 201
+        evaluations_changed.send(
+            current_app._get_current_object(),
+            periods={(item['employee_id'], item['evaluation_year']) for index, item in accepted}
+        )
+        return jsonify({
+            'created': len(evaluation_ids),
+            'evaluation_ids': evaluation_ids,
+            'errors': errors
+        }), 201
         
     except Exception as e:
         db.session.rollback()
@@ -81,6 +345,7 @@ def get_employee_evaluations(employee_id):
         
         # الحصول على التقييمات مرتبة حسب السنة والشهر
         evaluations = MonthlyEvaluation.query.filter_by(employee_id=employee_id)\
+            .options(*evaluation_scores_options())\
             .order_by(MonthlyEvaluation.evaluation_year.desc(), 
                      MonthlyEvaluation.evaluation_month.desc()).all()
         
@@ -89,25 +354,95 @@ def get_employee_evaluations(employee_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def parse_period(value):
+    """تحويل قيمة بصيغة YYYY-MM إلى (السنة، الشهر) أو رفع ValueError"""
+    try:
+        year, month = (int(part) for part in value.split('-'))
+    except (AttributeError, ValueError):
+        raise ValueError(f'صيغة الفترة غير صالحة: {value} (المطلوب YYYY-MM)')
+    if not 1 <= month <= 12:
+        raise ValueError(f'صيغة الفترة غير صالحة: {value} (المطلوب YYYY-MM)')
+    return year, month
+
+def parse_chart_period_args():
+    """فترة الرسم البياني من الطلب: (السنة، None، None) أو (None، من، إلى)
+
+    from و to بصيغة YYYY-MM لمدى يمتد عبر عدة سنوات ولهما الأولوية على year،
+    وإلا year (السنة الحالية افتراضياً). ترفع ValueError إذا كانت القيم غير
+    صالحة أو كانت بداية المدى بعد نهايته.
+    """
+    if 'from' in request.args or 'to' in request.args:
+        range_start = parse_period(request.args['from']) if 'from' in request.args else None
+        range_end = parse_period(request.args['to']) if 'to' in request.args else None
+        if range_start and range_end and range_start > range_end:
+            raise ValueError('بداية الفترة (from) يجب ألا تكون بعد نهايتها (to)')
+        return None, range_start, range_end
+    return request.args.get('year', datetime.now().year, type=int), None, None
+
+def rollup_period_label(resolution, year, quarter):
+    """(التسمية، رمز الفترة) لنقطة ربع سنوية أو سنوية"""
+    if resolution == 'quarter':
+        return f'الربع {quarter}', f'{year}-Q{quarter}'
+    return str(year), str(year)
+
 @evaluation_bp.route('/employees/<int:employee_id>/evaluations/chart-data', methods=['GET'])
 def get_employee_chart_data(employee_id):
-    """الحصول على بيانات الرسم البياني لموظف معين"""
+    """الحصول على بيانات الرسم البياني لموظف معين
+
+    تُحدد الفترة بـ year (السنة الحالية افتراضياً) أو بـ from و to بصيغة YYYY-MM
+    لمدى يمتد عبر عدة سنوات. البيانات تُقرأ من مكعب الدرجات في الذاكرة إذا كان
+    مفعلاً، وإلا باستعلام واحد يربط التقييمات بدرجاتها وأسماء معاييرها.
+    resolution=quarter أو year يُرجع نقطة لكل ربع أو سنة من جدول المجاميع.
+    """
     try:
-        # التحقق من وجود الموظف
-        employee = Employee.query.get_or_404(employee_id)
+        resolution = request.args.get('resolution', 'month')
+        if resolution not in RESOLUTIONS:
+            return jsonify({'error': 'الدقة يجب أن تكون month أو quarter أو year'}), 400
+        
+        try:
+            year, range_start, range_end = parse_chart_period_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        period = tuple_(MonthlyEvaluation.evaluation_year, MonthlyEvaluation.evaluation_month)
+        filters = [MonthlyEvaluation.employee_id == employee_id]
+        if year is None:
+            if range_start:
+                filters.append(period >= range_start)
+            if range_end:
+                filters.append(period <= range_end)
+            period_key = ('range', range_start, range_end, resolution)
+        else:
+            filters.append(MonthlyEvaluation.evaluation_year == year)
+            period_key = ('year', year, resolution)
         
-        # الحصول على التقييمات للسنة الحالية أو السنة المحددة
-        year = request.args.get('year', datetime.now().year, type=int)
+        # الاستجابة المسلسلة من الذاكرة المؤقتة دون أي استعلام
+        payload, generation = get_chart_data(employee_id, period_key)
+        if payload is not None:
+            return chart_data_response(payload, 'HIT')
         
-        evaluations = MonthlyEvaluation.query.filter_by(
-            employee_id=employee_id,
-            evaluation_year=year
-        ).order_by(MonthlyEvaluation.evaluation_month).all()
+        # من مكعب الدرجات في الذاكرة إذا كان مفعلاً، وإلا من قاعدة البيانات
+        start = range_start if year is None else (year, 1)
+        end = range_end if year is None else (year, 12)
+        series = get_chart_series(employee_id, start, end) if resolution == 'month' else None
+        if series is not None:
+            employee_info, evaluations = series
+        else:
+            # التحقق من وجود الموظف
+            employee = Employee.query.options(*employee_department_options())\
+                .filter_by(id=employee_id).first_or_404()
+            employee_info = employee.to_dict()
+            if resolution == 'month':
+                evaluations = load_chart_series(filters)
+            else:
+                evaluations = load_rollup_series(employee_id, resolution, start, end)
         
         # تحضير البيانات للرسم البياني
         months = []
+        periods = []
         total_scores = []
         average_scores = []
+        percentile_ranks = []
         criteria_scores = {}
         
         # أسماء الأشهر بالعربية
@@ -117,53 +452,181 @@ def get_employee_chart_data(employee_id):
             9: 'سبتمبر', 10: 'أكتوبر', 11: 'نوفمبر', 12: 'ديسمبر'
         }
         
-        for evaluation in evaluations:
-            month_name = month_names[evaluation.evaluation_month]
-            months.append(month_name)
-            total_scores.append(evaluation.get_total_score())
-            average_scores.append(evaluation.get_average_score())
+        for evaluation_year, evaluation_month, total, average, scores in evaluations:
+            if resolution == 'month':
+                months.append(month_names[evaluation_month])
+                periods.append(f'{evaluation_year}-{evaluation_month:02d}')
+                # ترتيب الموظف بين زملاء إدارته في الشهر نفسه
+                percentile_ranks.append(percentile_rank(
+                    employee_info['department_id'], evaluation_year, evaluation_month, employee_id
+                ))
+            else:
+                # الموضع الثاني في سلسلة المجاميع هو رقم الربع
+                label, period_name = rollup_period_label(resolution, evaluation_year, evaluation_month)
+                months.append(label)
+                periods.append(period_name)
+                percentile_ranks.append(None)
+            total_scores.append(total)
+            average_scores.append(average)
             
             # تجميع درجات كل معيار
-            for score in evaluation.scores:
-                criteria_name = score.criteria.criteria_name
-                if criteria_name not in criteria_scores:
-                    criteria_scores[criteria_name] = []
-                criteria_scores[criteria_name].append(score.score)
+            for criteria_name, score in scores:
+                criteria_scores.setdefault(criteria_name, []).append(score)
         
-        return jsonify({
-            'employee': employee.to_dict(),
+        result = {
+            'employee': employee_info,
             'year': year,
+            'resolution': resolution,
             'months': months,
+            'periods': periods,
+            'total_scores': total_scores,
+            'average_scores': average_scores,
+            'percentile_ranks': percentile_ranks,
+            'criteria_scores': criteria_scores
+        }
+        if year is None:
+            result['from'] = f'{range_start[0]}-{range_start[1]:02d}' if range_start else None
+            result['to'] = f'{range_end[0]}-{range_end[1]:02d}' if range_end else None
+        
+        # نفس بايتات jsonify (مضغوطة خارج وضع التصحيح)
+        payload = current_app.json.response(result).get_data()
+        store_chart_data(employee_id, employee_info['department_id'], period_key, payload, generation)
+        return chart_data_response(payload, 'MISS')
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@evaluation_bp.route('/departments/<int:department_id>/evaluations/chart-data', methods=['GET'])
+def get_department_chart_data(department_id):
+    """متوسطات الإدارة لكل ربع أو سنة (resolution=quarter أو year) من جدول المجاميع
+
+    الفترة بنفس معاملات chart-data للموظف، والمتوسطات موزونة بعدد التقييمات
+    لكل الإدارة ولكل معيار (load_department_rollup_series).
+    """
+    try:
+        department = Department.query.get_or_404(department_id)
+        resolution = request.args.get('resolution', 'quarter')
+        if resolution not in ('quarter', 'year'):
+            return jsonify({'error': 'الدقة يجب أن تكون quarter أو year'}), 400
+        try:
+            year, range_start, range_end = parse_chart_period_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        start = range_start if year is None else (year, 1)
+        end = range_end if year is None else (year, 12)
+        labels = []
+        periods = []
+        total_scores = []
+        average_scores = []
+        criteria_scores = {}
+        for evaluation_year, quarter, total, average, scores in \
+                load_department_rollup_series(department_id, resolution, start, end):
+            label, period_name = rollup_period_label(resolution, evaluation_year, quarter)
+            labels.append(label)
+            periods.append(period_name)
+            total_scores.append(total)
+            average_scores.append(average)
+            for criteria_name, score in scores:
+                criteria_scores.setdefault(criteria_name, []).append(score)
+        
+        result = {
+            'department': department.to_dict(),
+            'year': year,
+            'resolution': resolution,
+            'labels': labels,
+            'periods': periods,
             'total_scores': total_scores,
             'average_scores': average_scores,
             'criteria_scores': criteria_scores
-        })
+        }
+        if year is None:
+            result['from'] = f'{range_start[0]}-{range_start[1]:02d}' if range_start else None
+            result['to'] = f'{range_end[0]}-{range_end[1]:02d}' if range_end else None
+        return jsonify(result)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def chart_data_response(payload, cache_status):
+    response = current_app.response_class(payload, mimetype='application/json')
+    response.headers['X-Cache'] = cache_status
+    return response
+
+@evaluation_bp.route('/evaluations/chart-data/cache-stats', methods=['GET'])
+def chart_data_cache_stats():
+    """إحصائيات الذاكرة المؤقتة لبيانات الرسم البياني (إصابة / إخفاق)"""
+    return jsonify(get_chart_cache_stats())
+
+@evaluation_bp.route('/score-cube/stats', methods=['GET'])
+def score_cube_stats():
+    """حجم مكعب الدرجات في الذاكرة واستهلاكه"""
+    try:
+        return jsonify(get_score_cube_stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@evaluation_bp.route('/score-cube/check', methods=['GET'])
+def score_cube_check():
+    """التحقق من تطابق مكعب الدرجات مع قاعدة البيانات"""
+    try:
+        result = check_score_cube()
+        if result is None:
+            return jsonify({'error': 'مكعب الدرجات غير مفعل'}), 404
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @evaluation_bp.route('/evaluations/<int:evaluation_id>', methods=['PUT'])
 def update_evaluation(evaluation_id):
     """تحديث تقييم موجود"""
     try:
         evaluation = MonthlyEvaluation.query.get_or_404(evaluation_id)
         data = request.get_json()
+        changes = {'inserted': [], 'updated': [], 'deleted': []}
         
         if 'scores' in data:
-            # حذف الدرجات القديمة
-            EvaluationScore.query.filter_by(evaluation_id=evaluation_id).delete()
+            if not isinstance(data['scores'], list):
+                return jsonify({'error': 'بيانات الدرجات غير مكتملة'}), 400
+            
+            # التحقق من الدرجات الجديدة مقابل إدارة الموظف
+            item = {
+                'employee_id': evaluation.employee_id,
+                'evaluation_month': evaluation.evaluation_month,
+                'evaluation_year': evaluation.evaluation_year,
+                'scores': data['scores']
+            }
+            item = normalize_evaluation_item(item)
+            employee_departments = load_departments_by_id(Employee, [evaluation.employee_id])
+            criteria_by_id = load_criteria_by_id(
+                score_data.get('criteria_id') for score_data in item['scores'] if isinstance(score_data, dict)
+            )
+            error = validate_evaluation_item(item, employee_departments, criteria_by_id)
+            if error:
+                return jsonify({'error': error}), 400
             
-            # إضافة الدرجات الجديدة
-            for score_data in data['scores']:
-                score = EvaluationScore(
-                    evaluation_id=evaluation_id,
-                    criteria_id=score_data['criteria_id'],
-                    score=score_data['score']
-                )
-                db.session.add(score)
+            # تنفيذ الفروقات فقط بدلاً من حذف جميع الدرجات وإعادة إدراجها
+            changes = sync_evaluation_scores(evaluation_id, item['scores'])
+            
+            if changes['inserted'] or changes['updated'] or changes['deleted']:
+                # تحديث المجموع والمتوسط المخزنين وملخص الموظف
+                evaluation.refresh_score_totals()
+                refresh_employee_stats([evaluation.employee_id])
+                refresh_evaluation_rollups([(evaluation.employee_id, evaluation.evaluation_year)])
+                bump_data_version()
+                db.session.expire(evaluation, ['scores'])
         
+        period = (evaluation.employee_id, evaluation.evaluation_year)
         db.session.commit()
-        return jsonify(evaluation.to_dict())
+        if changes['inserted'] or changes['updated'] or changes['deleted']:
+            evaluations_changed.send(current_app._get_current_object(), periods={period})
+        
+        # إعادة تحميل التقييم مع درجاته ومعاييرها لبناء الاستجابة
+        evaluation = MonthlyEvaluation.query.options(*evaluation_scores_options())\
+            .filter_by(id=evaluation_id).one()
+        result = evaluation.to_dict()
+        result['changed_criteria'] = changes
+        return jsonify(result)
         
     except Exception as e:
         db.session.rollback()
@@ -174,8 +637,13 @@ def delete_evaluation(evaluation_id):
     """حذف تقييم"""
     try:
         evaluation = MonthlyEvaluation.query.get_or_404(evaluation_id)
+        period = (evaluation.employee_id, evaluation.evaluation_year)
         db.session.delete(evaluation)
+        refresh_employee_stats([period[0]])
+        refresh_evaluation_rollups([period])
+        bump_data_version()
         db.session.commit()
+        evaluations_changed.send(current_app._get_current_object(), periods={period})
         return jsonify({'message': 'تم حذف التقييم بنجاح'})
         
     except Exception as e:
@@ -0,0 +1,68 @@
+import click
+from flask import Blueprint, request, jsonify, current_app
+from src.models.user import db
+from src.services.evaluation_import import iter_import_rows, import_evaluations, DEFAULT_IMPORT_BATCH_SIZE
+
+# cli_group=None يضيف أمر الاستيراد مباشرة: flask import-evaluations
+import_bp = Blueprint('evaluation_import', __name__, cli_group=None)
+
+CLI_IMPORT_RESTART_WARNING = (
+    'تنبيه: أعد تشغيل الخادم إذا كان يعمل الآن، فذاكرته المؤقتة لا ترى البيانات '
+    'المستوردة من سطر الأوامر'
+)
+
+@import_bp.route('/import/evaluations', methods=['POST'])
+def import_evaluations_file():
+    """استيراد الموظفين والتقييمات من ملف XLSX أو CSV مع تقرير أخطاء لكل صف"""
+    try:
+        uploaded = request.files.get('file')
+        if not uploaded or not uploaded.filename:
+            return jsonify({'error': 'الملف مطلوب'}), 400
+
+        dry_run = request.values.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        batch_size = current_app.config.get('IMPORT_BATCH_SIZE', DEFAULT_IMPORT_BATCH_SIZE)
+
+        report = import_evaluations(
+            iter_import_rows(uploaded.stream, uploaded.filename),
+            dry_run=dry_run,
+            batch_size=batch_size
+        )
+
+        if dry_run:
+            return jsonify(report)
+        status = 201 if report['evaluations_created'] else 400
+        return jsonify(report), status
+
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@import_bp.cli.command('import-evaluations')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help='التحقق من الملف دون حفظ أي بيانات')
+@click.option('--batch-size', type=int, default=None, help='عدد الصفوف في كل معاملة')
+def import_evaluations_command(path, dry_run, batch_size):
+    """استيراد الموظفين والتقييمات من ملف XLSX أو CSV"""
+    batch_size = batch_size or current_app.config.get('IMPORT_BATCH_SIZE', DEFAULT_IMPORT_BATCH_SIZE)
+    with open(path, 'rb') as f:
+        try:
+            report = import_evaluations(iter_import_rows(f, path), dry_run=dry_run, batch_size=batch_size)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    click.echo(
+        f"الصفوف: {report['rows']}، الدفعات: {report['batches']}، "
+        f"موظفون جدد: {report['employees_created']}، تقييمات: {report['evaluations_created']}، "
+        f"درجات: {report['scores_created']}، أخطاء: {report['error_count']}"
+        + (' (تحقق فقط دون حفظ)' if dry_run else '')
+    )
+    for error in report['errors']:
+        click.echo(f"صف {error['row']}: {error['error']}", err=True)
+
+    # الأمر يكتب من عملية منفصلة فلا تصل إشارات التغيير إلى الخادم، وتبقى
+    # ذواكره المؤقتة (الرسوم البيانية ومكعب الدرجات وترتيب الموظفين) قديمة
+    if not dry_run and (report['employees_created'] or report['evaluations_created']):
+        click.echo(CLI_IMPORT_RESTART_WARNING, err=True)
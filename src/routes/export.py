@@ -1,54 +1,200 @@
-from flask import Blueprint, request, jsonify, send_file
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
+from flask import Blueprint, request, jsonify, send_file, current_app, stream_with_context
+from sqlalchemy import select
 from src.models.user import db
 from src.models.employee import Employee
-from src.models.evaluation import MonthlyEvaluation, EvaluationScore
 from src.models.department import Department, EvaluationCriteria
+from src.models.evaluation import MonthlyEvaluation, EvaluationScore
+from src.models.export_job import ExportJob
+from src.models.data_version import get_data_version
+from src.services.excel_export import build_export
+from src.services.export_cache import export_cache_key, open_cached_export, store_export
+from src.services.export_jobs import EXPORT_JOB_TYPES, submit_export_job, cleanup_expired_export_jobs
+from src.services.export_shards import stream_department_shards
 from datetime import datetime
+import csv
+import io
+import json
 import os
 import tempfile
 
 export_bp = Blueprint('export', __name__)
 
-@export_bp.route('/export/all-evaluations', methods=['GET'])
-def export_all_evaluations():
-    """تصدير جميع تقييمات الموظفين إلى ملف Excel"""
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# الحد الأقصى لحجم الملف في الذاكرة قبل نقله إلى القرص
+DEFAULT_EXPORT_SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+# أعمدة التصدير المسطح (صف لكل درجة)
+FLAT_EXPORT_COLUMNS = [
+    'employee_id', 'employee_number', 'full_name', 'department',
+    'year', 'month', 'criterion', 'score'
+]
+
+# عدد الصفوف المجلوبة من المؤشر في كل دفعة
+DEFAULT_FLAT_EXPORT_BATCH_SIZE = 1000
+
+def send_workbook(wb, filename):
+    """حفظ الملف في ملف مؤقت يُحذف تلقائياً بعد إرساله"""
+    max_size = current_app.config.get('EXPORT_SPOOL_MAX_SIZE', DEFAULT_EXPORT_SPOOL_MAX_SIZE)
+    spool = tempfile.SpooledTemporaryFile(max_size=max_size)
     try:
-        # إنشاء ملف Excel جديد
-        wb = Workbook()
-        
-        # حذف الورقة الافتراضية
-        wb.remove(wb.active)
-        
-        # الحصول على جميع الموظفين
-        employees = Employee.query.all()
-        
-        if not employees:
-            return jsonify({'error': 'لا توجد بيانات موظفين للتصدير'}), 400
-        
-        # إنشاء ورقة عمل لكل موظف
-        for employee in employees:
-            create_employee_sheet(wb, employee)
-        
-        # إنشاء ورقة ملخص عام
-        create_summary_sheet(wb, employees)
-        
-        # حفظ الملف في مجلد مؤقت
-        temp_dir = tempfile.mkdtemp()
-        filename = f"تقييمات_الموظفين_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.xlsx"
-        filepath = os.path.join(temp_dir, filename)
-        
-        wb.save(filepath)
-        
-        return send_file(
-            filepath,
+        wb.save(spool)
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        raise
+    
+    # send_file يغلق الملف بعد انتهاء الاستجابة فيُحذف من القرص
+    return send_file(
+        spool,
+        as_attachment=True,
+        download_name=filename,
+        mimetype=XLSX_MIMETYPE
+    )
+
+def send_cached_export(export_type, params):
+    """إرسال التصدير من الذاكرة المؤقتة على القرص أو بناؤه وتخزينه
+
+    ETag هو مفتاح التخزين نفسه، فإذا أرسل العميل If-None-Match مطابقاً
+    لإصدار البيانات الحالي تُرجع 304 دون قراءة أي بيانات أو بناء أي ملف.
+    """
+    key = export_cache_key(export_type, params, get_data_version())
+    
+    if key in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(key)
+        return response
+    
+    if not current_app.config.get('EXPORT_CACHE_ENABLED', True):
+        wb, filename = build_export(export_type, params)
+        return send_workbook(wb, filename)
+    
+    # يُرسل من مقبض مفتوح لا من المسار، حتى لا يفشل الإرسال إذا أخلى طلب
+    # آخر الملف بين البحث عنه وقراءته
+    cached = open_cached_export(key)
+    if cached:
+        export_file, filename = cached
+    else:
+        wb, filename = build_export(export_type, params)
+        export_file = store_export(key, wb, filename)
+    
+    try:
+        size = os.fstat(export_file.fileno()).st_size
+        response = send_file(
+            export_file,
             as_attachment=True,
             download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            mimetype=XLSX_MIMETYPE,
+            etag=key
+        )
+    except Exception:
+        export_file.close()
+        raise
+    if response.status_code == 200:
+        response.content_length = size
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def get_flat_export_batch_size():
+    """عدد الصفوف في كل دفعة قراءة من المؤشر وفي كل جزء مرسل من الاستجابة"""
+    return current_app.config.get('FLAT_EXPORT_BATCH_SIZE', DEFAULT_FLAT_EXPORT_BATCH_SIZE)
+
+def iter_flat_evaluation_rows(year=None, department_id=None):
+    """قراءة الدرجات صفاً صفاً من مؤشر قاعدة البيانات دون تحميلها كلها في الذاكرة"""
+    query = (
+        select(
+            Employee.id, Employee.employee_number, Employee.full_name, Department.name,
+            MonthlyEvaluation.evaluation_year, MonthlyEvaluation.evaluation_month,
+            EvaluationCriteria.criteria_name, EvaluationScore.score
         )
+        .join(Department, Department.id == Employee.department_id)
+        .join(MonthlyEvaluation, MonthlyEvaluation.employee_id == Employee.id)
+        .join(EvaluationScore, EvaluationScore.evaluation_id == MonthlyEvaluation.id)
+        .join(EvaluationCriteria, EvaluationCriteria.id == EvaluationScore.criteria_id)
+        .order_by(Employee.id, MonthlyEvaluation.evaluation_year,
+                  MonthlyEvaluation.evaluation_month, EvaluationCriteria.id)
+    )
+    if year is not None:
+        query = query.where(MonthlyEvaluation.evaluation_year == year)
+    if department_id is not None:
+        query = query.where(Employee.department_id == department_id)
+    
+    batch_size = get_flat_export_batch_size()
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+def generate_csv(rows):
+    """تحويل الصفوف إلى أسطر CSV على دفعات"""
+    batch_size = get_flat_export_batch_size()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM حتى يتعرف Excel على الترميز العربي
+    buffer.write('\ufeff')
+    writer.writerow(FLAT_EXPORT_COLUMNS)
+    for index, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if index % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def generate_ndjson(rows):
+    """تحويل الصفوف إلى كائنات JSON سطراً لكل درجة"""
+    batch_size = get_flat_export_batch_size()
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(FLAT_EXPORT_COLUMNS, row)), ensure_ascii=False))
+        if len(lines) == batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+FLAT_EXPORT_FORMATS = {
+    'csv': (generate_csv, 'text/csv; charset=utf-8'),
+    'ndjson': (generate_ndjson, 'application/x-ndjson; charset=utf-8'),
+}
+
+@export_bp.route('/export/evaluations.<fmt>', methods=['GET'])
+def export_flat_evaluations(fmt):
+    """تصدير الدرجات صفوفاً مسطحة بصيغة CSV أو NDJSON مع إرسالها أثناء القراءة"""
+    if fmt not in FLAT_EXPORT_FORMATS:
+        return jsonify({'error': f'صيغة التصدير غير مدعومة: {fmt}'}), 404
+    
+    year = request.args.get('year', type=int)
+    department_id = request.args.get('department_id', type=int)
+    if 'year' in request.args and year is None:
+        return jsonify({'error': 'السنة يجب أن تكون رقماً صحيحاً'}), 400
+    if 'department_id' in request.args and department_id is None:
+        return jsonify({'error': 'رقم الإدارة يجب أن يكون رقماً صحيحاً'}), 400
+    
+    generate, mimetype = FLAT_EXPORT_FORMATS[fmt]
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    
+    # stream_with_context يبقي الجلسة مفتوحة حتى انتهاء المولد
+    response = current_app.response_class(
+        stream_with_context(generate(iter_flat_evaluation_rows(year, department_id))),
+        mimetype=mimetype
+    )
+    response.headers.set(
+        'Content-Disposition', 'attachment',
+        filename=f"evaluations_{timestamp}.{fmt}"
+    )
+    return response
+
+@export_bp.route('/export/all-evaluations', methods=['GET'])
+def export_all_evaluations():
+    """تصدير جميع تقييمات الموظفين إلى ملف Excel"""
+    try:
+        return send_cached_export('all-evaluations', {})
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -56,207 +202,102 @@ def export_all_evaluations():
 def export_employee_evaluations(employee_id):
     """تصدير تقييمات موظف محدد إلى ملف Excel"""
     try:
-        employee = Employee.query.get_or_404(employee_id)
+        Employee.query.get_or_404(employee_id)
+        return send_cached_export('employee', {'employee_id': employee_id})
         
-        # إنشاء ملف Excel جديد
-        wb = Workbook()
-        wb.remove(wb.active)
-        
-        # إنشاء ورقة عمل للموظف
-        create_employee_sheet(wb, employee)
-        
-        # حفظ الملف في مجلد مؤقت
-        temp_dir = tempfile.mkdtemp()
-        filename = f"تقييم_{employee.full_name}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.xlsx"
-        filepath = os.path.join(temp_dir, filename)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@export_bp.route('/export/departments.zip', methods=['GET'])
+def export_departments_zip():
+    """تصدير ملف Excel لكل إدارة في أرشيف ZIP يُرسل أثناء بنائه"""
+    try:
+        # الإدارات التي لديها موظفون فقط
+        department_ids = db.session.execute(
+            select(Employee.department_id).distinct().order_by(Employee.department_id)
+        ).scalars().all()
         
-        wb.save(filepath)
+        if not department_ids:
+            return jsonify({'error': 'لا توجد بيانات موظفين للتصدير'}), 400
         
-        return send_file(
-            filepath,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        response = current_app.response_class(
+            stream_department_shards(department_ids),
+            mimetype='application/zip'
+        )
+        response.headers.set(
+            'Content-Disposition', 'attachment',
+            filename=f"تقييمات_الإدارات_{timestamp}.zip"
         )
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def create_employee_sheet(wb, employee):
-    """إنشاء ورقة عمل لموظف محدد"""
-    # إنشاء ورقة جديدة
-    ws = wb.create_sheet(title=employee.full_name[:30])  # تحديد طول الاسم
-    
-    # تنسيق الخلايا
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    center_alignment = Alignment(horizontal="center", vertical="center")
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    
-    # معلومات الموظف
-    ws['A1'] = 'معلومات الموظف'
-    ws['A1'].font = header_font
-    ws['A1'].fill = header_fill
-    ws['A1'].alignment = center_alignment
-    ws.merge_cells('A1:D1')
-    
-    ws['A2'] = 'الاسم الكامل'
-    ws['B2'] = employee.full_name
-    ws['A3'] = 'الرقم الوظيفي'
-    ws['B3'] = employee.employee_number
-    ws['A4'] = 'المسمى الوظيفي'
-    ws['B4'] = employee.job_title
-    ws['A5'] = 'الإدارة'
-    ws['B5'] = employee.department.name
-    
-    # الحصول على معايير التقييم للإدارة
-    criteria = EvaluationCriteria.query.filter_by(department_id=employee.department_id).all()
-    
-    # الحصول على تقييمات الموظف
-    evaluations = MonthlyEvaluation.query.filter_by(employee_id=employee.id).order_by(
-        MonthlyEvaluation.evaluation_year, MonthlyEvaluation.evaluation_month
-    ).all()
-    
-    if not evaluations:
-        ws['A7'] = 'لا توجد تقييمات لهذا الموظف'
-        return
-    
-    # رأس جدول التقييمات
-    row = 7
-    ws[f'A{row}'] = 'التقييمات الشهرية'
-    ws[f'A{row}'].font = header_font
-    ws[f'A{row}'].fill = header_fill
-    ws[f'A{row}'].alignment = center_alignment
-    
-    # تحديد عدد الأعمدة (الشهر + السنة + المعايير + المتوسط)
-    total_cols = 3 + len(criteria)
-    ws.merge_cells(f'A{row}:{get_column_letter(total_cols)}{row}')
-    
-    # رؤوس الأعمدة
-    row += 1
-    ws[f'A{row}'] = 'الشهر'
-    ws[f'B{row}'] = 'السنة'
-    
-    col = 3
-    for criterion in criteria:
-        ws[f'{get_column_letter(col)}{row}'] = criterion.criteria_name
-        col += 1
-    
-    ws[f'{get_column_letter(col)}{row}'] = 'المتوسط'
-    
-    # تطبيق التنسيق على رؤوس الأعمدة
-    for c in range(1, total_cols + 1):
-        cell = ws[f'{get_column_letter(c)}{row}']
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = center_alignment
-        cell.border = border
-    
-    # بيانات التقييمات
-    months_ar = [
-        '', 'يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو',
-        'يوليو', 'أغسطس', 'سبتمبر', 'أكتوبر', 'نوفمبر', 'ديسمبر'
-    ]
-    
-    for evaluation in evaluations:
-        row += 1
-        ws[f'A{row}'] = months_ar[evaluation.evaluation_month]
-        ws[f'B{row}'] = evaluation.evaluation_year
+@export_bp.route('/export/jobs', methods=['POST'])
+def create_export_job():
+    """إضافة مهمة تصدير إلى طابور العمال في الخلفية"""
+    try:
+        data = request.get_json() or {}
+        export_type = data.get('export_type', 'all-evaluations')
         
-        # الدرجات لكل معيار
-        scores_dict = {score.criteria_id: score.score for score in evaluation.scores}
-        col = 3
-        total_score = 0
+        if export_type not in EXPORT_JOB_TYPES:
+            return jsonify({'error': f'نوع التصدير غير معروف: {export_type}'}), 400
         
-        for criterion in criteria:
-            score = scores_dict.get(criterion.id, 0)
-            ws[f'{get_column_letter(col)}{row}'] = score
-            total_score += score
-            col += 1
+        params = {}
+        for field in EXPORT_JOB_TYPES[export_type]:
+            if not isinstance(data.get(field), int):
+                return jsonify({'error': f'الحقل {field} مطلوب'}), 400
+            params[field] = data[field]
         
-        # المتوسط
-        average = total_score / len(criteria) if criteria else 0
-        ws[f'{get_column_letter(col)}{row}'] = round(average, 2)
+        # التحقق من وجود الموظف أو الإدارة قبل إضافة المهمة
+        if export_type == 'employee' and not db.session.get(Employee, params['employee_id']):
+            return jsonify({'error': 'الموظف غير موجود'}), 404
+        if export_type == 'department' and not db.session.get(Department, params['department_id']):
+            return jsonify({'error': 'الإدارة غير موجودة'}), 404
         
-        # تطبيق التنسيق على الصف
-        for c in range(1, total_cols + 1):
-            cell = ws[f'{get_column_letter(c)}{row}']
-            cell.alignment = center_alignment
-            cell.border = border
-    
-    # تعديل عرض الأعمدة
-    for col in range(1, total_cols + 1):
-        ws.column_dimensions[get_column_letter(col)].width = 15
+        job = submit_export_job(export_type, params)
+        return jsonify(job.to_dict()), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
 
-def create_summary_sheet(wb, employees):
-    """إنشاء ورقة ملخص عام لجميع الموظفين"""
-    ws = wb.create_sheet(title="الملخص العام", index=0)
-    
-    # تنسيق الخلايا
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    center_alignment = Alignment(horizontal="center", vertical="center")
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    
-    # العنوان الرئيسي
-    ws['A1'] = 'ملخص تقييمات جميع الموظفين'
-    ws['A1'].font = Font(bold=True, size=16, color="FFFFFF")
-    ws['A1'].fill = header_fill
-    ws['A1'].alignment = center_alignment
-    ws.merge_cells('A1:F1')
-    
-    # رؤوس الأعمدة
-    headers = ['الاسم الكامل', 'الرقم الوظيفي', 'المسمى الوظيفي', 'الإدارة', 'عدد التقييمات', 'المتوسط العام']
-    for col, header in enumerate(headers, 1):
-        cell = ws[f'{get_column_letter(col)}3']
-        cell.value = header
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = center_alignment
-        cell.border = border
-    
-    # بيانات الموظفين
-    row = 4
-    for employee in employees:
-        evaluations = MonthlyEvaluation.query.filter_by(employee_id=employee.id).all()
+@export_bp.route('/export/jobs/<job_id>', methods=['GET'])
+def get_export_job(job_id):
+    """الحصول على حالة مهمة تصدير ونسبة إنجازها"""
+    try:
+        cleanup_expired_export_jobs()
+        job = ExportJob.query.get_or_404(job_id)
+        return jsonify(job.to_dict())
         
-        # حساب المتوسط العام
-        total_average = 0
-        evaluation_count = len(evaluations)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@export_bp.route('/export/jobs/<job_id>/download', methods=['GET'])
+def download_export_job(job_id):
+    """تحميل ملف مهمة تصدير مكتملة"""
+    try:
+        cleanup_expired_export_jobs()
+        job = ExportJob.query.get_or_404(job_id)
         
-        if evaluation_count > 0:
-            for evaluation in evaluations:
-                total_average += evaluation.get_average_score()
-            total_average = total_average / evaluation_count
+        if job.status == 'expired':
+            return jsonify({'error': 'انتهت صلاحية ملف التصدير'}), 410
+        if job.status != 'completed':
+            return jsonify({'error': 'الملف غير جاهز بعد', 'status': job.status}), 409
         
-        # إدخال البيانات
-        ws[f'A{row}'] = employee.full_name
-        ws[f'B{row}'] = employee.employee_number
-        ws[f'C{row}'] = employee.job_title
-        ws[f'D{row}'] = employee.department.name
-        ws[f'E{row}'] = evaluation_count
-        ws[f'F{row}'] = round(total_average, 2) if evaluation_count > 0 else 'لا توجد تقييمات'
+        if (job.expires_at and job.expires_at < datetime.utcnow()) or \
+                not job.file_path or not os.path.exists(job.file_path):
+            return jsonify({'error': 'انتهت صلاحية ملف التصدير'}), 410
         
-        # تطبيق التنسيق
-        for col in range(1, 7):
-            cell = ws[f'{get_column_letter(col)}{row}']
-            cell.alignment = center_alignment
-            cell.border = border
+        return send_file(
+            job.file_path,
+            as_attachment=True,
+            download_name=job.filename,
+            mimetype=XLSX_MIMETYPE
+        )
         
-        row += 1
-    
-    # تعديل عرض الأعمدة
-    column_widths = [20, 15, 20, 15, 15, 15]
-    for col, width in enumerate(column_widths, 1):
-        ws.column_dimensions[get_column_letter(col)].width = width
-
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
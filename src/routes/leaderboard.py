@@ -0,0 +1,43 @@
+from flask import Blueprint, request, jsonify
+from src.services.leaderboard import (
+    compute_leaderboard, LEADERBOARD_SCOPES, DEFAULT_LEADERBOARD_K, MAX_LEADERBOARD_K
+)
+from datetime import datetime
+
+leaderboard_bp = Blueprint('leaderboard', __name__)
+
+@leaderboard_bp.route('/leaderboard', methods=['GET'])
+def get_leaderboard():
+    """لوحة أعلى وأدنى K موظفين حسب المتوسط أو درجة معيار محدد
+
+    المعاملات: scope (department أو all)، year، month (اختياري لترتيب السنة
+    كاملة)، k، department_id لحصر الترتيب في إدارة، criteria_id للترتيب حسب معيار.
+    """
+    try:
+        scope = request.args.get('scope', 'department')
+        if scope not in LEADERBOARD_SCOPES:
+            return jsonify({'error': 'نطاق الترتيب يجب أن يكون department أو all'}), 400
+
+        year = request.args.get('year', type=int) if 'year' in request.args else datetime.now().year
+        if year is None:
+            return jsonify({'error': 'سنة التقييم غير صالحة'}), 400
+        month = request.args.get('month', type=int)
+        if 'month' in request.args and (month is None or not 1 <= month <= 12):
+            return jsonify({'error': 'شهر التقييم غير صالح'}), 400
+
+        k = request.args.get('k', type=int) if 'k' in request.args else DEFAULT_LEADERBOARD_K
+        if k is None or not 1 <= k <= MAX_LEADERBOARD_K:
+            return jsonify({'error': f'k يجب أن يكون بين 1 و {MAX_LEADERBOARD_K}'}), 400
+
+        department_id = request.args.get('department_id', type=int)
+        criteria_id = request.args.get('criteria_id', type=int)
+        if ('department_id' in request.args and department_id is None) or \
+                ('criteria_id' in request.args and criteria_id is None):
+            return jsonify({'error': 'معرف غير صالح'}), 400
+
+        return jsonify(compute_leaderboard(
+            scope, year, month, k, department_id=department_id, criteria_id=criteria_id
+        ))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,4 +1,6 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
+from src.models.user import db
+from src.models.sqlite_tuning import read_sqlite_pragmas
 import json
 import os
 from datetime import datetime
@@ -75,6 +77,25 @@ def save_sheets_settings():
             'error': str(e)
         }), 500
 
+@settings_bp.route('/api/database-settings')
+def get_database_settings():
+    """عرض إعدادات SQLite المطلوبة والمطبقة فعلياً"""
+    try:
+        with db.engine.connect() as connection:
+            applied = read_sqlite_pragmas(connection) if db.engine.dialect.name == 'sqlite' else {}
+        
+        return jsonify({
+            'success': True,
+            'configured': current_app.config.get('SQLITE_PRAGMAS', {}),
+            'applied': applied
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @settings_bp.route('/api/manager-stats')
 def get_manager_stats():
     """الحصول على إحصائيات المدراء"""
@@ -1,73 +1,98 @@
-from flask import Blueprint, request, jsonify, render_template_string
+from flask import Blueprint, request, jsonify, render_template_string, current_app
 from src.models.user import db
 from src.models.employee import Employee
 from src.models.evaluation import MonthlyEvaluation, EvaluationScore
+from src.models.employee_stats import select_employee_summaries
 from src.models.department import Department, EvaluationCriteria
-import hashlib
-import secrets
+from src.models.query_options import (
+    evaluation_scores_options, employee_department_options
+)
+from src.services.percentile_index import percentile_rank
+from src.services.public_share_cache import get_public_share_payload
+from src.services.score_cube import get_employee_summaries
+from src.services.share_tokens import (
+    create_share_token, resolve_share_token, MAX_SHARE_TOKEN_TTL_DAYS
+)
 
 share_bp = Blueprint('share', __name__)
 
-def generate_share_token(employee_id):
-    """إنشاء رمز مشاركة فريد للموظف"""
-    secret = secrets.token_urlsafe(16)
-    data = f"{employee_id}_{secret}"
-    return hashlib.sha256(data.encode()).hexdigest()[:16]
+INVALID_SHARE_LINK_MESSAGE = 'رابط المشاركة غير صالح أو منتهي الصلاحية'
 
-def generate_public_token():
-    """إنشاء رمز مشاركة عام لجميع الموظفين"""
-    secret = secrets.token_urlsafe(16)
-    data = f"public_{secret}"
-    return hashlib.sha256(data.encode()).hexdigest()[:16]
+def get_share_ttl_days():
+    """مدة صلاحية الرابط بالأيام من expires_in_days في الطلب أو الافتراضية
 
+    ترفع ValueError إذا كانت القيمة غير صالحة.
+    """
+    data = request.get_json(silent=True) or {}
+    ttl_days = data.get('expires_in_days')
+    if ttl_days is None:
+        return None
+    if not isinstance(ttl_days, int) or isinstance(ttl_days, bool) or \
+            not 1 <= ttl_days <= MAX_SHARE_TOKEN_TTL_DAYS:
+        raise ValueError(f'مدة الصلاحية يجب أن تكون بين 1 و {MAX_SHARE_TOKEN_TTL_DAYS} يوماً')
+    return ttl_days
+
+# المسار /api/share/... هو ما تستدعيه الواجهة، ويبقى المسار القديم للتوافق
 @share_bp.route('/share/employee/<int:employee_id>', methods=['POST'])
+@share_bp.route('/api/share/employee/<int:employee_id>', methods=['POST'])
 def create_employee_share_link(employee_id):
     """إنشاء رابط مشاركة فردي للموظف"""
     try:
         employee = Employee.query.get_or_404(employee_id)
         
-        # إنشاء رمز المشاركة
-        share_token = generate_share_token(employee_id)
+        try:
+            ttl_days = get_share_ttl_days()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # حفظ رمز المشاركة في قاعدة البيانات (يمكن إضافة جدول منفصل لاحقاً)
-        # للآن سنستخدم نظام بسيط
+        # يُحفظ الرمز مرتبطاً بالموظف فلا يُقبل معرف موظف من الرابط
+        share_token, record = create_share_token('employee', employee.id, ttl_days)
         
         share_url = f"/share/view/{share_token}"
         
         return jsonify({
             'share_url': share_url,
             'share_token': share_token,
-            'employee_name': employee.full_name
+            'employee_name': employee.full_name,
+            'expires_at': record.expires_at.isoformat()
         })
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @share_bp.route('/share/public', methods=['POST'])
+@share_bp.route('/api/share/public', methods=['POST'])
 def create_public_share_link():
     """إنشاء رابط مشاركة عام لجميع الموظفين"""
     try:
+        try:
+            ttl_days = get_share_ttl_days()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # إنشاء رمز المشاركة العام
-        share_token = generate_public_token()
+        share_token, record = create_share_token('public', ttl_days=ttl_days)
         
         share_url = f"/share/public/{share_token}"
         
         return jsonify({
             'share_url': share_url,
-            'share_token': share_token
+            'share_token': share_token,
+            'expires_at': record.expires_at.isoformat()
         })
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @share_bp.route('/share/view/<share_token>')
 def view_employee_share(share_token):
     """عرض تقييم موظف محدد عبر رابط المشاركة"""
     try:
-        # البحث عن الموظف بناءً على رمز المشاركة
-        # هذا تطبيق مبسط - في التطبيق الحقيقي يجب حفظ الرموز في قاعدة البيانات
-        
-        # للآن سنعرض صفحة عامة تطلب من المستخدم إدخال معرف الموظف
+        valid, _ = resolve_share_token(share_token, 'employee')
+        if not valid:
+            return INVALID_SHARE_LINK_MESSAGE, 404
         return render_template_string(EMPLOYEE_SHARE_TEMPLATE, share_token=share_token)
         
     except Exception as e:
@@ -77,19 +102,33 @@ def view_employee_share(share_token):
 def view_public_share(share_token):
     """عرض جميع الموظفين عبر رابط المشاركة العام"""
     try:
+        valid, _ = resolve_share_token(share_token, 'public')
+        if not valid:
+            return INVALID_SHARE_LINK_MESSAGE, 404
         return render_template_string(PUBLIC_SHARE_TEMPLATE, share_token=share_token)
         
     except Exception as e:
         return f"خطأ في تحميل الصفحة: {str(e)}", 500
 
+@share_bp.route('/api/share/employee-data/<share_token>')
 @share_bp.route('/api/share/employee-data/<share_token>/<int:employee_id>')
-def get_employee_share_data(share_token, employee_id):
-    """الحصول على بيانات الموظف للمشاركة"""
+def get_employee_share_data(share_token, employee_id=None):
+    """الحصول على بيانات الموظف للمشاركة
+
+    الموظف يُحدد من الرمز نفسه، ومعرف الموظف في المسار القديم يُقبل فقط إذا طابقه.
+    """
     try:
-        employee = Employee.query.get_or_404(employee_id)
+        valid, token_employee_id = resolve_share_token(share_token, 'employee')
+        if not valid or (employee_id is not None and employee_id != token_employee_id):
+            return jsonify({'error': INVALID_SHARE_LINK_MESSAGE}), 404
+        employee_id = token_employee_id
+        
+        employee = Employee.query.options(*employee_department_options())\
+            .filter_by(id=employee_id).first_or_404()
         
         # الحصول على تقييمات الموظف
-        evaluations = MonthlyEvaluation.query.filter_by(employee_id=employee_id).order_by(
+        evaluations = MonthlyEvaluation.query.filter_by(employee_id=employee_id)\
+            .options(*evaluation_scores_options()).order_by(
             MonthlyEvaluation.evaluation_year, MonthlyEvaluation.evaluation_month
         ).all()
         
@@ -103,6 +142,10 @@ def get_employee_share_data(share_token, employee_id):
         for evaluation in evaluations:
             eval_dict = evaluation.to_dict()
             eval_dict['month_name'] = months_ar[evaluation.evaluation_month]
+            eval_dict['percentile_rank'] = percentile_rank(
+                employee.department_id, evaluation.evaluation_year,
+                evaluation.evaluation_month, employee.id
+            )
             evaluation_data.append(eval_dict)
         
         return jsonify({
@@ -120,38 +163,46 @@ def get_employee_share_data(share_token, employee_id):
 
 @share_bp.route('/api/share/public-data/<share_token>')
 def get_public_share_data(share_token):
-    """الحصول على بيانات جميع الموظفين للمشاركة العامة"""
+    """الحصول على بيانات جميع الموظفين للمشاركة العامة
+
+    الاستجابة المسلسلة تُخدم من الذاكرة المؤقتة وتُبنى عند انتهاء صلاحيتها أو
+    بعد أي كتابة من مكعب الدرجات، أو باستعلام واحد يربط الموظفين بإداراتهم
+    وملخص تقييماتهم إذا لم يكن المكعب مفعلاً.
+    """
     try:
-        employees = Employee.query.all()
-        
-        employees_data = []
-        for employee in employees:
-            evaluations = MonthlyEvaluation.query.filter_by(employee_id=employee.id).all()
-            
-            # حساب المتوسط العام
-            total_average = 0
-            evaluation_count = len(evaluations)
-            
-            if evaluation_count > 0:
-                for evaluation in evaluations:
-                    total_average += evaluation.get_average_score()
-                total_average = total_average / evaluation_count
-            
-            employees_data.append({
-                'id': employee.id,
-                'full_name': employee.full_name,
-                'employee_number': employee.employee_number,
-                'job_title': employee.job_title,
-                'department_name': employee.department.name,
-                'evaluation_count': evaluation_count,
-                'overall_average': round(total_average, 2) if evaluation_count > 0 else 0
-            })
+        valid, _ = resolve_share_token(share_token, 'public')
+        if not valid:
+            return jsonify({'error': INVALID_SHARE_LINK_MESSAGE}), 404
         
-        return jsonify({'employees': employees_data})
+        payload, cache_status = get_public_share_payload(build_public_share_payload)
+        response = current_app.response_class(payload, mimetype='application/json')
+        response.headers['X-Cache'] = cache_status
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def build_public_share_payload():
+    """بناء استجابة المشاركة العامة المسلسلة"""
+    # من مكعب الدرجات إذا كان محملاً، وإلا باستعلام واحد
+    rows = get_employee_summaries()
+    if rows is None:
+        rows = db.session.connection().execute(select_employee_summaries())
+    
+    employees_data = []
+    for employee_id, full_name, employee_number, job_title, department_name, evaluation_count, average_sum in rows:
+        employees_data.append({
+            'id': employee_id,
+            'full_name': full_name,
+            'employee_number': employee_number,
+            'job_title': job_title,
+            'department_name': department_name,
+            'evaluation_count': evaluation_count,
+            'overall_average': round(average_sum / evaluation_count, 2) if evaluation_count > 0 else 0
+        })
+    
+    return current_app.json.response({'employees': employees_data}).get_data()
+
 # قوالب HTML للصفحات المشتركة
 EMPLOYEE_SHARE_TEMPLATE = '''
 <!DOCTYPE html>
@@ -244,11 +295,8 @@ EMPLOYEE_SHARE_TEMPLATE = '''
         // تحميل بيانات الموظف
         async function loadEmployeeData() {
             try {
-                // للتبسيط، سنطلب من المستخدم إدخال معرف الموظف
-                const employeeId = prompt('يرجى إدخال معرف الموظف:');
-                if (!employeeId) return;
-                
-                const response = await fetch(`/api/share/employee-data/{{ share_token }}/${employeeId}`);
+                // الموظف يُحدد من رمز المشاركة
+                const response = await fetch(`/api/share/employee-data/{{ share_token }}`);
                 
                 if (response.ok) {
                     const data = await response.json();
@@ -256,7 +304,8 @@ EMPLOYEE_SHARE_TEMPLATE = '''
                     document.getElementById('loading').style.display = 'none';
                     document.getElementById('content').style.display = 'block';
                 } else {
-                    throw new Error('فشل في تحميل البيانات');
+                    const data = await response.json().catch(() => ({}));
+                    throw new Error(data.error || 'فشل في تحميل البيانات');
                 }
             } catch (error) {
                 document.getElementById('loading').style.display = 'none';
@@ -325,6 +374,7 @@ EMPLOYEE_SHARE_TEMPLATE = '''
                                 <th>الشهر</th>
                                 <th>السنة</th>
                                 <th>المتوسط</th>
+                                <th>الترتيب في الإدارة</th>
                             </tr>
                         </thead>
                         <tbody>
@@ -332,11 +382,13 @@ EMPLOYEE_SHARE_TEMPLATE = '''
             
             evaluations.forEach(eval => {
                 const average = eval.scores.reduce((sum, score) => sum + score.score, 0) / eval.scores.length;
+                const rank = eval.percentile_rank;
                 tableHTML += `
                     <tr>
                         <td>${eval.month_name}</td>
                         <td>${eval.evaluation_year}</td>
                         <td>${average.toFixed(2)}</td>
+                        <td>${rank ? `ضمن أعلى ${rank.top_percent}% (${rank.rank} من ${rank.department_count})` : '-'}</td>
                     </tr>
                 `;
             });
@@ -437,7 +489,8 @@ PUBLIC_SHARE_TEMPLATE = '''
                     document.getElementById('loading').style.display = 'none';
                     document.getElementById('content').style.display = 'block';
                 } else {
-                    throw new Error('فشل في تحميل البيانات');
+                    const data = await response.json().catch(() => ({}));
+                    throw new Error(data.error || 'فشل في تحميل البيانات');
                 }
             } catch (error) {
                 document.getElementById('loading').style.display = 'none';
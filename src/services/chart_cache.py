@@ -0,0 +1,151 @@
+from collections import OrderedDict
+import threading
+from flask import current_app
+from src.models.signals import evaluations_changed, employees_changed, departments_changed
+
+# ذاكرة مؤقتة لاستجابات chart-data المسلسلة
+# المفتاح (معرف الموظف، مفتاح الفترة) حيث مفتاح الفترة ('year', السنة، الدقة) أو
+# ('range', من، إلى، الدقة). تُحذف المدخلات بدقة عند تغير تقييمات الموظف أو بياناته
+# أو معايير إدارته، وتُخلى الأقدم استخداماً عند تجاوز الحد الأقصى.
+DEFAULT_CHART_CACHE_MAX_ENTRIES = 10000
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+# {معرف الموظف: معرف الإدارة} لحذف مدخلات إدارة كاملة عند تغير معاييرها
+_employee_departments = {}
+# رقم جيل لكل موظف يزداد مع كل حذف، حتى لا تُخزن استجابة بُنيت قبل التغيير
+_generations = {}
+# تسلسل تغييرات الإدارات: {(معرف الإدارة، السنة أو None لكل السنوات): رقم آخر تغيير}
+# الموظف الذي لم تُخزن له استجابة بعد لا يظهر في _employee_departments فلا يزداد
+# جيله عند تغير ترتيب زملائه، لذلك تُقارن تغييرات إدارته بالتسلسل عند بدء البناء
+_department_changes = {}
+_sequence = 0
+_counters = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+
+def get_chart_data(employee_id, period_key):
+    """إرجاع (الاستجابة المخزنة أو None، الجيل الحالي) حيث الجيل يُمرر إلى store_chart_data"""
+    with _lock:
+        payload = _entries.get((employee_id, period_key))
+        if payload is None:
+            _counters['misses'] += 1
+        else:
+            _counters['hits'] += 1
+            _entries.move_to_end((employee_id, period_key))
+        return payload, (_generations.get(employee_id, 0), _sequence)
+
+def _department_changed_since(department_id, period_key, sequence):
+    """هل تغيرت الإدارة أو إحدى سنوات الفترة بعد التسلسل المعطى (يُستدعى مع القفل)"""
+    for (changed_department, year), changed in _department_changes.items():
+        if changed_department == department_id and changed > sequence and \
+                (year is None or _covers_year(period_key, year)):
+            return True
+    return False
+
+def store_chart_data(employee_id, department_id, period_key, payload, generation):
+    """تخزين استجابة إذا لم تتغير بيانات الموظف ولا إدارته في سنوات الفترة منذ بدء بنائها"""
+    max_entries = current_app.config.get('CHART_CACHE_MAX_ENTRIES', DEFAULT_CHART_CACHE_MAX_ENTRIES)
+    employee_generation, sequence = generation
+    with _lock:
+        if _generations.get(employee_id, 0) != employee_generation or \
+                _department_changed_since(department_id, period_key, sequence):
+            return False
+        _entries[(employee_id, period_key)] = payload
+        _entries.move_to_end((employee_id, period_key))
+        _employee_departments[employee_id] = department_id
+        while len(_entries) > max_entries:
+            _entries.popitem(last=False)
+            _counters['evictions'] += 1
+        return True
+
+def _invalidate(predicate, employee_ids):
+    """حذف المدخلات المطابقة وزيادة جيل الموظفين المعنيين (يُستدعى مع القفل)"""
+    for employee_id in employee_ids:
+        _generations[employee_id] = _generations.get(employee_id, 0) + 1
+    stale = [key for key in _entries if predicate(key)]
+    for key in stale:
+        del _entries[key]
+    _counters['invalidations'] += len(stale)
+    return len(stale)
+
+def _covers_year(period_key, year):
+    if period_key[0] == 'year':
+        return period_key[1] == year
+    # مدى من/إلى: يكفي أن تقع السنة داخله
+    _, range_start, range_end = period_key[:3]
+    return (range_start is None or range_start[0] <= year) and \
+        (range_end is None or year <= range_end[0])
+
+def invalidate_evaluation_periods(periods):
+    """حذف مدخلات (الموظف، السنة) التي تغيرت تقييماتها فقط"""
+    years_by_employee = {}
+    for employee_id, year in periods:
+        years_by_employee.setdefault(employee_id, set()).add(year)
+
+    def is_stale(key):
+        employee_id, period_key = key
+        return any(_covers_year(period_key, year) for year in years_by_employee.get(employee_id, ()))
+
+    with _lock:
+        return _invalidate(is_stale, years_by_employee)
+
+def invalidate_employees(employee_ids):
+    """حذف جميع مدخلات الموظفين (تتضمن الاستجابة بيانات الموظف وإدارته)"""
+    employee_ids = set(employee_ids)
+    with _lock:
+        for employee_id in employee_ids:
+            _employee_departments.pop(employee_id, None)
+        return _invalidate(lambda key: key[0] in employee_ids, employee_ids)
+
+def _record_department_changes(keys):
+    """تسجيل تغيير (الإدارة، السنة أو None) بتسلسل جديد (يُستدعى مع القفل)"""
+    global _sequence
+    _sequence += 1
+    for key in keys:
+        _department_changes[key] = _sequence
+
+def invalidate_departments(department_ids):
+    """حذف مدخلات موظفي الإدارات التي تغير اسمها أو معاييرها"""
+    department_ids = set(department_ids)
+    with _lock:
+        _record_department_changes((department_id, None) for department_id in department_ids)
+        employee_ids = {
+            employee_id
+            for employee_id, department_id in _employee_departments.items()
+            if department_id in department_ids
+        }
+    return invalidate_employees(employee_ids)
+
+def invalidate_department_years(department_years):
+    """حذف مدخلات موظفي الإدارة التي تغطي السنة (تتضمن ترتيب الموظف بين زملائه)"""
+    department_years = set(department_years)
+    with _lock:
+        _record_department_changes(department_years)
+        periods = [
+            (employee_id, year)
+            for employee_id, department_id in _employee_departments.items()
+            for year_department, year in department_years
+            if year_department == department_id
+        ]
+    return invalidate_evaluation_periods(periods)
+
+def get_chart_cache_stats():
+    """عدادات الإصابة والإخفاق وحجم الذاكرة المؤقتة"""
+    with _lock:
+        lookups = _counters['hits'] + _counters['misses']
+        return dict(
+            _counters,
+            entries=len(_entries),
+            hit_ratio=round(_counters['hits'] / lookups, 4) if lookups else 0
+        )
+
+@evaluations_changed.connect
+def _on_evaluations_changed(sender, periods=(), **extra):
+    invalidate_evaluation_periods(periods)
+
+@employees_changed.connect
+def _on_employees_changed(sender, employee_ids=(), **extra):
+    invalidate_employees(employee_ids)
+
+@departments_changed.connect
+def _on_departments_changed(sender, department_ids=(), **extra):
+    invalidate_departments(department_ids)
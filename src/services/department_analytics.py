@@ -0,0 +1,151 @@
+from itertools import chain
+import numpy as np
+from sqlalchemy import select, tuple_
+from src.models.user import db
+from src.models.employee import Employee
+from src.models.department import EvaluationCriteria
+from src.models.evaluation import MonthlyEvaluation, EvaluationScore
+
+# النسب المئوية المحسوبة لكل توزيع
+PERCENTILES = (10, 50, 90)
+
+def _period_code(year, month):
+    """ترقيم متصل للأشهر عبر السنوات (الشهر التالي لديسمبر هو يناير من السنة التالية)"""
+    return year * 12 + month - 1
+
+def _to_json_values(values):
+    """تحويل مصفوفة NumPy إلى قائمة مع None بدل NaN"""
+    return [None if np.isnan(value) else round(float(value), 4) for value in values]
+
+def _distribution(values, max_score):
+    """إحصائيات توزيع مصفوفة درجات مرتبة تصاعدياً"""
+    if values.size == 0:
+        return {
+            'count': 0, 'mean': None, 'median': None, 'std': None,
+            'p10': None, 'p90': None,
+            'histogram': {'bins': list(range(max_score + 1)), 'counts': [0] * (max_score + 1)}
+        }
+
+    p10, median, p90 = np.percentile(values, PERCENTILES)
+    # فئة لكل درجة صحيحة من 0 إلى الدرجة القصوى
+    counts, _ = np.histogram(values, bins=np.arange(-0.5, max_score + 1.5))
+    return {
+        'count': int(values.size),
+        'mean': round(float(values.mean()), 4),
+        'median': round(float(median), 4),
+        'std': round(float(values.std()), 4),
+        'p10': round(float(p10), 4),
+        'p90': round(float(p90), 4),
+        'histogram': {'bins': list(range(max_score + 1)), 'counts': counts.tolist()}
+    }
+
+def compute_department_analytics(department_id, year, month=None):
+    """إحصائيات توزيع الدرجات لإدارة في شهر أو سنة لكل معيار وللمتوسط العام
+
+    تُجلب جميع درجات الفترة (مع الشهر السابق لها لحساب التغير الشهري) باستعلام
+    واحد إلى مصفوفات NumPy، وتُحسب المتوسطات الشهرية لكل المعايير معاً عبر
+    bincount والنسب المئوية على مقاطع مرتبة دون حلقات على الصفوف.
+    """
+    criteria = db.session.query(
+        EvaluationCriteria.id, EvaluationCriteria.criteria_name, EvaluationCriteria.max_score
+    ).filter(EvaluationCriteria.department_id == department_id)\
+        .order_by(EvaluationCriteria.id).all()
+
+    # نافذة الأشهر: الشهر المطلوب مع سابقه، أو ديسمبر السابق مع أشهر السنة
+    if month:
+        first_period, target_start = _period_code(year, month) - 1, _period_code(year, month)
+    else:
+        first_period, target_start = _period_code(year, 1) - 1, _period_code(year, 1)
+    last_period = _period_code(year, month or 12)
+    period_count = last_period - first_period + 1
+
+    first_year, first_month = divmod(first_period, 12)
+    # التنفيذ على اتصال Core مباشرة يتجاوز طبقة تحميل ORM غير اللازمة هنا
+    rows = db.session.connection().execute(
+        select(
+            MonthlyEvaluation.employee_id, MonthlyEvaluation.evaluation_year,
+            MonthlyEvaluation.evaluation_month, EvaluationScore.criteria_id, EvaluationScore.score
+        )
+        .join(Employee, Employee.id == MonthlyEvaluation.employee_id)
+        .join(EvaluationScore, EvaluationScore.evaluation_id == MonthlyEvaluation.id)
+        .where(
+            Employee.department_id == department_id,
+            tuple_(MonthlyEvaluation.evaluation_year, MonthlyEvaluation.evaluation_month)
+            >= (first_year, first_month + 1),
+            tuple_(MonthlyEvaluation.evaluation_year, MonthlyEvaluation.evaluation_month)
+            <= (year, month or 12)
+        )
+    ).all()
+
+    # تسطيح الصفوف مباشرة في مصفوفة واحدة أسرع بكثير من np.array على كائنات Row
+    data = np.fromiter(chain.from_iterable(rows), dtype=np.float64, count=len(rows) * 5).reshape(-1, 5)
+    employee_ids = data[:, 0].astype(np.int64)
+    periods = (data[:, 1] * 12 + data[:, 2] - 1).astype(np.int64) - first_period
+    scores = data[:, 4]
+
+    # فهرس المعيار لكل صف حسب ترتيب معايير الإدارة (المعايير المحذوفة تُستبعد)
+    criteria_ids = np.array([criterion[0] for criterion in criteria], dtype=np.int64)
+    if criteria_ids.size:
+        positions = np.minimum(np.searchsorted(criteria_ids, data[:, 3]), criteria_ids.size - 1)
+        valid = criteria_ids[positions] == data[:, 3]
+    else:
+        positions = np.zeros(len(scores), dtype=np.int64)
+        valid = np.zeros(len(scores), dtype=bool)
+    employee_ids, periods, scores, positions = \
+        employee_ids[valid], periods[valid], scores[valid], positions[valid]
+
+    in_target = periods >= target_start - first_period
+    criteria_count = len(criteria)
+
+    # المتوسط الشهري لكل معيار: مصفوفة (معيار × شهر) من bincount واحد
+    flat_index = positions * period_count + periods
+    sums = np.bincount(flat_index, weights=scores, minlength=criteria_count * period_count)
+    counts = np.bincount(flat_index, minlength=criteria_count * period_count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        monthly_means = (sums / counts).reshape(criteria_count, period_count)
+    monthly_deltas = np.diff(monthly_means, axis=1)
+
+    # ترتيب الدرجات حسب المعيار ثم القيمة لأخذ مقطع مرتب لكل معيار
+    target_positions = positions[in_target]
+    target_scores = scores[in_target]
+    order = np.lexsort((target_scores, target_positions))
+    sorted_scores = target_scores[order]
+    boundaries = np.searchsorted(target_positions[order], np.arange(criteria_count + 1))
+
+    criteria_results = []
+    for index, (criteria_id, criteria_name, max_score) in enumerate(criteria):
+        result = {'criteria_id': criteria_id, 'criteria_name': criteria_name}
+        result.update(_distribution(sorted_scores[boundaries[index]:boundaries[index + 1]], max_score))
+        result.update(_trend(monthly_means[index], monthly_deltas[index], month))
+        criteria_results.append(result)
+
+    # متوسط كل تقييم (موظف × شهر) ثم توزيع المتوسطات
+    evaluation_keys, evaluation_index = np.unique(employee_ids * period_count + periods, return_inverse=True)
+    evaluation_averages = np.bincount(evaluation_index, weights=scores) / np.bincount(evaluation_index)
+    evaluation_periods = evaluation_keys % period_count
+    evaluation_in_target = evaluation_periods >= target_start - first_period
+
+    period_sums = np.bincount(evaluation_periods, weights=evaluation_averages, minlength=period_count)
+    period_counts = np.bincount(evaluation_periods, minlength=period_count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        overall_means = period_sums / period_counts
+    max_score = max((criterion[2] for criterion in criteria), default=5)
+
+    overall = _distribution(np.sort(evaluation_averages[evaluation_in_target]), max_score)
+    overall.update(_trend(overall_means, np.diff(overall_means), month))
+
+    return {
+        'year': year,
+        'month': month,
+        'employee_count': int(np.unique(evaluation_keys[evaluation_in_target] // period_count).size),
+        'evaluation_count': int(evaluation_in_target.sum()),
+        'overall': overall,
+        'criteria': criteria_results
+    }
+
+def _trend(means, deltas, month):
+    """التغير عن الشهر السابق (قيمة واحدة لشهر، أو 12 قيمة لسنة)"""
+    if month:
+        return {'mom_delta': _to_json_values(deltas)[0]}
+    # العنصر الأول في المتوسطات هو ديسمبر من السنة السابقة
+    return {'monthly_means': _to_json_values(means[1:]), 'mom_deltas': _to_json_values(deltas)}
@@ -0,0 +1,391 @@
+import codecs
+import csv
+import os
+from datetime import datetime
+from openpyxl import load_workbook
+from sqlalchemy import insert
+from flask import current_app
+from src.models.user import db
+from src.models.employee import Employee
+from src.models.department import Department, EvaluationCriteria
+from src.models.evaluation import MonthlyEvaluation, EvaluationScore
+from src.models.employee_stats import refresh_employee_stats
+from src.models.evaluation_rollup import refresh_evaluation_rollups
+from src.models.data_version import bump_data_version
+from src.models.signals import employees_changed, evaluations_changed
+
+# أعمدة ملف الاستيراد (صف لكل درجة، بنفس أعمدة التصدير المسطح)
+IMPORT_COLUMNS = [
+    'employee_number', 'full_name', 'job_title', 'department',
+    'year', 'month', 'criterion', 'score'
+]
+
+IMPORT_FORMATS = ('.xlsx', '.csv')
+
+# عدد الصفوف في كل معاملة كتابة
+DEFAULT_IMPORT_BATCH_SIZE = 5000
+
+# الحد الأقصى لعدد الأخطاء المعادة في التقرير (يُحسب العدد الكلي دائماً)
+MAX_REPORTED_ERRORS = 1000
+
+def iter_import_rows(stream, filename):
+    """قراءة ملف XLSX أو CSV صفاً صفاً وإرجاع (رقم الصف، قاموس الأعمدة)
+
+    ملفات XLSX تُقرأ بوضع القراءة فقط فلا تُحمّل الأوراق في الذاكرة، وملفات
+    CSV تُفك ترميزها تدريجياً من الملف الثنائي. ترفع ValueError إذا كانت
+    الصيغة غير مدعومة أو نقصت أعمدة مطلوبة.
+    """
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.xlsx':
+        wb = load_workbook(stream, read_only=True, data_only=True)
+        try:
+            yield from _iter_mapped_rows(wb.active.iter_rows(values_only=True))
+        finally:
+            wb.close()
+    elif extension == '.csv':
+        yield from _iter_mapped_rows(csv.reader(codecs.iterdecode(stream, 'utf-8-sig')))
+    else:
+        raise ValueError(f'صيغة الملف غير مدعومة، الصيغ المدعومة: {", ".join(IMPORT_FORMATS)}')
+
+def _iter_mapped_rows(rows):
+    header = next(rows, None)
+    if header is None:
+        raise ValueError('الملف فارغ')
+
+    positions = {
+        str(name).strip().lower(): position
+        for position, name in enumerate(header)
+        if name is not None
+    }
+    missing = [column for column in IMPORT_COLUMNS if column not in positions]
+    if missing:
+        raise ValueError(f'أعمدة مطلوبة غير موجودة: {", ".join(missing)}')
+
+    for row_number, row in enumerate(rows, 2):
+        # تجاهل الصفوف الفارغة في نهاية الملف
+        if not any(value not in (None, '') for value in row):
+            continue
+        yield row_number, {
+            column: row[positions[column]] if positions[column] < len(row) else None
+            for column in IMPORT_COLUMNS
+        }
+
+def _to_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def _to_int(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+def _to_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+def _period_key(row):
+    """مفتاح التقييم الذي ينتمي إليه الصف قبل التحقق من القيم"""
+    return _to_text(row['employee_number']), _to_text(row['year']), _to_text(row['month'])
+
+def import_evaluations(rows, dry_run=False, batch_size=None):
+    """استيراد الموظفين والتقييمات من صفوف iter_import_rows على دفعات
+
+    يُنشأ الموظف غير الموجود (حسب الرقم الوظيفي) في الإدارة المذكورة، وتُجمع
+    الصفوف في تقييم لكل (موظف، سنة، شهر). كل دفعة معاملة مستقلة، ولا تُقطع
+    الدفعة في منتصف تقييم إذا كانت صفوفه متتالية. التقييم الذي يحتوي صفاً
+    خاطئاً يُرفض كاملاً. في وضع dry_run يُجرى التحقق كاملاً دون أي كتابة.
+    """
+    batch_size = batch_size or DEFAULT_IMPORT_BATCH_SIZE
+
+    # الإدارات والمعايير تُحمّل مرة واحدة لكل الاستيراد
+    context = {
+        'dry_run': dry_run,
+        'departments': {
+            name: department_id
+            for department_id, name in db.session.query(Department.id, Department.name)
+        },
+        'criteria': {
+            (department_id, name): (criteria_id, max_score)
+            for criteria_id, department_id, name, max_score in db.session.query(
+                EvaluationCriteria.id, EvaluationCriteria.department_id,
+                EvaluationCriteria.criteria_name, EvaluationCriteria.max_score
+            )
+        },
+        # {الرقم الوظيفي: [المعرف، معرف الإدارة]} للموظفين الذين تم التعامل معهم
+        'employees': {},
+        # التقييمات المستوردة في الدفعات السابقة (الرقم الوظيفي، الشهر، السنة)
+        'imported_periods': set(),
+    }
+    report = {
+        'dry_run': dry_run,
+        'rows': 0,
+        'batches': 0,
+        'employees_created': 0,
+        'evaluations_created': 0,
+        'scores_created': 0,
+        'error_count': 0,
+        'errors': []
+    }
+
+    batch = []
+    for row_number, row in rows:
+        report['rows'] += 1
+        if len(batch) >= batch_size and _period_key(row) != _period_key(batch[-1][1]):
+            _import_batch(batch, context, report)
+            batch = []
+        batch.append((row_number, row))
+
+    if batch:
+        _import_batch(batch, context, report)
+
+    report['errors'].sort(key=lambda error: error['row'])
+    return report
+
+def _add_error(report, row_number, error):
+    report['error_count'] += 1
+    if len(report['errors']) < MAX_REPORTED_ERRORS:
+        report['errors'].append({'row': row_number, 'error': error})
+
+def _validate_row(row, context):
+    """التحقق من صف واحد وإرجاع (القيم المحولة، رسالة الخطأ)"""
+    employee_number = _to_text(row['employee_number'])
+    if not employee_number:
+        return None, 'الرقم الوظيفي مطلوب'
+
+    department_id = context['departments'].get(_to_text(row['department']))
+    if department_id is None:
+        return None, f'الإدارة غير موجودة: {_to_text(row["department"])}'
+
+    year = _to_int(row['year'])
+    if year is None:
+        return None, 'سنة التقييم غير صالحة'
+
+    month = _to_int(row['month'])
+    if month is None or not 1 <= month <= 12:
+        return None, 'شهر التقييم غير صالح'
+
+    criteria = context['criteria'].get((department_id, _to_text(row['criterion'])))
+    if criteria is None:
+        return None, f'معيار التقييم غير موجود في الإدارة: {_to_text(row["criterion"])}'
+    criteria_id, max_score = criteria
+
+    score = _to_number(row['score'])
+    if score is None or not 0 <= score <= max_score:
+        return None, f'الدرجة يجب أن تكون بين 0 و {max_score}'
+
+    return {
+        'employee_number': employee_number,
+        'full_name': _to_text(row['full_name']),
+        'job_title': _to_text(row['job_title']),
+        'department_id': department_id,
+        'year': year,
+        'month': month,
+        'criteria_id': criteria_id,
+        'score': score
+    }, None
+
+def _import_batch(batch, context, report):
+    """التحقق من دفعة صفوف وكتابتها في معاملة واحدة"""
+    report['batches'] += 1
+    employees = context['employees']
+
+    # بدء معاملة الكتابة قبل قراءة الموظفين والتقييمات الموجودة، فتنتظر عمليات
+    # الاستيراد المتزامنة بعضها ولا يُدرج موظف أو تقييم أضافه غيرها بعد التحقق
+    if not context['dry_run']:
+        bump_data_version()
+
+    parsed = []
+    # مفاتيح التقييمات التي تحتوي صفاً غير صالح
+    rejected_keys = set()
+    for row_number, row in batch:
+        values, error = _validate_row(row, context)
+        if error:
+            _add_error(report, row_number, error)
+            rejected_keys.add(_period_key(row))
+        else:
+            parsed.append((row_number, _period_key(row), values))
+
+    # الموظفون غير المعروفين في هذه الدفعة باستعلام IN واحد
+    unknown_numbers = {values['employee_number'] for _, _, values in parsed} - set(employees)
+    if unknown_numbers:
+        for employee_id, employee_number, department_id in db.session.query(
+            Employee.id, Employee.employee_number, Employee.department_id
+        ).filter(Employee.employee_number.in_(unknown_numbers)):
+            employees[employee_number] = [employee_id, department_id]
+
+    # التحقق من الموظفين وتجميع الصفوف في تقييمات
+    new_employees = {}
+    evaluations = {}
+    rejected = set()
+    for row_number, key, values in parsed:
+        employee_number = values['employee_number']
+        period = (employee_number, values['month'], values['year'])
+        if key in rejected_keys:
+            rejected.add(period)
+
+        error = None
+        if employee_number in employees:
+            department_id = employees[employee_number][1]
+        elif employee_number in new_employees:
+            department_id = new_employees[employee_number]['department_id']
+        elif not values['full_name'] or not values['job_title']:
+            department_id = values['department_id']
+            error = 'الاسم الكامل والمسمى الوظيفي مطلوبان للموظف الجديد'
+        else:
+            department_id = values['department_id']
+            new_employees[employee_number] = {
+                'employee_number': employee_number,
+                'full_name': values['full_name'],
+                'job_title': values['job_title'],
+                'department_id': department_id
+            }
+
+        if not error and department_id != values['department_id']:
+            error = 'الموظف مسجل في إدارة أخرى'
+
+        evaluation = evaluations.setdefault(period, {'rows': [], 'scores': {}})
+        if not error and values['criteria_id'] in evaluation['scores']:
+            error = 'معيار التقييم مكرر في نفس التقييم'
+
+        if error:
+            _add_error(report, row_number, error)
+            rejected.add(period)
+        else:
+            evaluation['rows'].append(row_number)
+            evaluation['scores'][values['criteria_id']] = values['score']
+
+    # التقييمات الموجودة مسبقاً في قاعدة البيانات أو في دفعة سابقة
+    existing_periods = set(context['imported_periods'])
+    numbers_by_id = {
+        employees[number][0]: number
+        for number, _, _ in evaluations
+        if number in employees and employees[number][0] is not None
+    }
+    if numbers_by_id:
+        years = {year for _, _, year in evaluations}
+        for employee_id, month, year in db.session.query(
+            MonthlyEvaluation.employee_id,
+            MonthlyEvaluation.evaluation_month,
+            MonthlyEvaluation.evaluation_year
+        ).filter(
+            MonthlyEvaluation.employee_id.in_(numbers_by_id),
+            MonthlyEvaluation.evaluation_year.in_(years)
+        ):
+            existing_periods.add((numbers_by_id[employee_id], month, year))
+
+    accepted = {}
+    for period, evaluation in evaluations.items():
+        if period in existing_periods:
+            for row_number in evaluation['rows']:
+                _add_error(report, row_number, 'يوجد تقييم مسبق لهذا الموظف في نفس الشهر والسنة')
+        elif period in rejected:
+            for row_number in evaluation['rows']:
+                _add_error(report, row_number, 'تم رفض التقييم بسبب أخطاء في صفوف أخرى منه')
+        elif evaluation['scores']:
+            accepted[period] = evaluation['scores']
+
+    # الموظفون الجدد الذين لم يُقبل لهم أي تقييم لا يُنشؤون
+    used_numbers = {number for number, _, _ in accepted}
+    new_employees = {
+        number: employee for number, employee in new_employees.items() if number in used_numbers
+    }
+
+    report['employees_created'] += len(new_employees)
+    report['evaluations_created'] += len(accepted)
+    report['scores_created'] += sum(len(scores) for scores in accepted.values())
+    context['imported_periods'].update(accepted)
+
+    if context['dry_run']:
+        for number, employee in new_employees.items():
+            employees[number] = [None, employee['department_id']]
+        return
+
+    try:
+        now = datetime.utcnow()
+        if new_employees:
+            for employee in new_employees.values():
+                employee['created_at'] = now
+            for employee_id, number, department_id in db.session.execute(
+                insert(Employee).returning(Employee.id, Employee.employee_number, Employee.department_id),
+                list(new_employees.values())
+            ):
+                employees[number] = [employee_id, department_id]
+
+        if accepted:
+            evaluation_rows = []
+            for (number, month, year), scores in accepted.items():
+                total = sum(scores.values())
+                evaluation_rows.append({
+                    'employee_id': employees[number][0],
+                    'evaluation_month': month,
+                    'evaluation_year': year,
+                    'created_at': now,
+                    'total_score': total,
+                    'score_count': len(scores),
+                    'average_score': total / len(scores)
+                })
+
+            # RETURNING يعيد مفتاح كل تقييم لربط الدرجات به
+            ids_by_period = {
+                (employee_id, month, year): evaluation_id
+                for evaluation_id, employee_id, month, year in db.session.execute(
+                    insert(MonthlyEvaluation).returning(
+                        MonthlyEvaluation.id,
+                        MonthlyEvaluation.employee_id,
+                        MonthlyEvaluation.evaluation_month,
+                        MonthlyEvaluation.evaluation_year
+                    ),
+                    evaluation_rows
+                )
+            }
+
+            db.session.execute(insert(EvaluationScore), [
+                {
+                    'evaluation_id': ids_by_period[(employees[number][0], month, year)],
+                    'criteria_id': criteria_id,
+                    'score': score
+                }
+                for (number, month, year), scores in accepted.items()
+                for criteria_id, score in scores.items()
+            ])
+
+            refresh_employee_stats(employees[number][0] for number in used_numbers)
+            refresh_evaluation_rollups((employees[number][0], year) for number, month, year in accepted)
+
+        if new_employees or accepted:
+            db.session.commit()
+        else:
+            # لم يُكتب شيء فلا داعي لتغيير إصدار البيانات
+            db.session.rollback()
+
+    except Exception:
+        db.session.rollback()
+        # إزالة الموظفين الجدد من الذاكرة لأن إدراجهم أُلغي
+        for number in new_employees:
+            employees.pop(number, None)
+        raise
+
+    app = current_app._get_current_object()
+    if new_employees:
+        employees_changed.send(app, employee_ids={employees[number][0] for number in new_employees})
+    if accepted:
+        evaluations_changed.send(
+            app,
+            periods={(employees[number][0], year) for number, month, year in accepted}
+        )
@@ -0,0 +1,352 @@
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.cell_range import CellRange
+from sqlalchemy import select, func
+from datetime import datetime
+from itertools import chain
+from src.models.user import db
+from src.models.employee import Employee
+from src.models.evaluation import MonthlyEvaluation, EvaluationScore
+from src.models.department import Department, EvaluationCriteria
+
+# أسماء الأشهر بالعربية
+MONTHS_AR = [
+    '', 'يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو',
+    'يوليو', 'أغسطس', 'سبتمبر', 'أكتوبر', 'نوفمبر', 'ديسمبر'
+]
+
+# عدد الموظفين الذين تُحمل تقييماتهم ودرجاتهم في الذاكرة معاً أثناء التصدير
+DEFAULT_EXPORT_CHUNK_SIZE = 200
+
+def _employee_filters(employee_ids=None, department_id=None):
+    """شروط تحديد الموظفين المطلوب تصديرهم"""
+    filters = []
+    if employee_ids is not None:
+        filters.append(Employee.id.in_(list(employee_ids)))
+    if department_id is not None:
+        filters.append(Employee.department_id == department_id)
+    return filters
+
+def count_export_employees(session=None, employee_ids=None, department_id=None):
+    """عدد الموظفين في التصدير (لحساب نسبة الإنجاز دون تحميلهم)"""
+    session = session or db.session
+    return session.execute(
+        select(func.count()).select_from(Employee)
+        .where(*_employee_filters(employee_ids, department_id))
+    ).scalar()
+
+def _load_chunk_evaluations(session, employee_ids):
+    """تقييمات دفعة من الموظفين ودرجاتها باستعلامين مهما كان عدد الموظفين"""
+    evaluations = {employee_id: [] for employee_id in employee_ids}
+    evaluations_by_id = {}
+    evaluation_rows = session.execute(
+        select(
+            MonthlyEvaluation.id, MonthlyEvaluation.employee_id,
+            MonthlyEvaluation.evaluation_month, MonthlyEvaluation.evaluation_year,
+            MonthlyEvaluation.average_score
+        ).where(MonthlyEvaluation.employee_id.in_(employee_ids))
+        .order_by(MonthlyEvaluation.employee_id, MonthlyEvaluation.evaluation_year,
+                  MonthlyEvaluation.evaluation_month)
+    ).all()
+    for evaluation_id, employee_id, month, year, average_score in evaluation_rows:
+        evaluation = {
+            'evaluation_month': month,
+            'evaluation_year': year,
+            'average_score': average_score,
+            'scores': {}
+        }
+        evaluations[employee_id].append(evaluation)
+        evaluations_by_id[evaluation_id] = evaluation
+
+    if evaluations_by_id:
+        score_rows = session.execute(
+            select(EvaluationScore.evaluation_id, EvaluationScore.criteria_id, EvaluationScore.score)
+            .join(MonthlyEvaluation, MonthlyEvaluation.id == EvaluationScore.evaluation_id)
+            .where(MonthlyEvaluation.employee_id.in_(employee_ids))
+        ).all()
+        for evaluation_id, criteria_id, score in score_rows:
+            evaluations_by_id[evaluation_id]['scores'][criteria_id] = score
+    return evaluations
+
+def iter_export_employees(session=None, employee_ids=None, department_id=None,
+                          chunk_size=DEFAULT_EXPORT_CHUNK_SIZE):
+    """مولد (الموظف، معايير إدارته، تقييماته) لكل موظف بترتيب المعرف
+
+    يُقرأ الموظفون على دفعات بترقيم المفاتيح (id > آخر معرف) وتُجلب تقييمات كل
+    دفعة ودرجاتها باستعلامين، فلا يبقى في الذاكرة إلا دفعة واحدة مهما كان عدد
+    الموظفين. كل دفعة استعلام مستقل لا مؤشر مفتوح، فيمكن للمستدعي حفظ الجلسة
+    بين الموظفين (كتحديث نسبة الإنجاز). البيانات قواميس وقوائم بسيطة.
+    """
+    session = session or db.session
+    filters = _employee_filters(employee_ids, department_id)
+    criteria = {}
+    last_id = None
+
+    while True:
+        query = select(
+            Employee.id, Employee.full_name, Employee.employee_number,
+            Employee.job_title, Employee.department_id, Department.name
+        ).join(Department, Department.id == Employee.department_id)\
+            .where(*filters).order_by(Employee.id).limit(chunk_size)
+        if last_id is not None:
+            query = query.where(Employee.id > last_id)
+        employees = [
+            {
+                'id': row[0],
+                'full_name': row[1],
+                'employee_number': row[2],
+                'job_title': row[3],
+                'department_id': row[4],
+                'department_name': row[5]
+            }
+            for row in session.execute(query).all()
+        ]
+        if not employees:
+            return
+        last_id = employees[-1]['id']
+
+        # معايير الإدارات قليلة فتُحمل مرة واحدة عند أول ظهور لكل إدارة
+        new_departments = {employee['department_id'] for employee in employees} - set(criteria)
+        if new_departments:
+            for department in new_departments:
+                criteria[department] = []
+            criteria_rows = session.execute(
+                select(EvaluationCriteria.id, EvaluationCriteria.department_id, EvaluationCriteria.criteria_name)
+                .where(EvaluationCriteria.department_id.in_(new_departments))
+                .order_by(EvaluationCriteria.id)
+            ).all()
+            for criteria_id, criteria_department_id, criteria_name in criteria_rows:
+                criteria[criteria_department_id].append({'id': criteria_id, 'criteria_name': criteria_name})
+
+        evaluations = _load_chunk_evaluations(session, [employee['id'] for employee in employees])
+        for employee in employees:
+            yield employee, criteria[employee['department_id']], evaluations[employee['id']]
+
+# أسماء التنسيقات المسجلة في كل ملف تصدير
+TITLE_STYLE = 'evaluation_title'
+SUMMARY_TITLE_STYLE = 'evaluation_summary_title'
+HEADER_STYLE = 'evaluation_header'
+DATA_STYLE = 'evaluation_data'
+SCORE_STYLE = 'evaluation_score'
+
+def _thin_border():
+    return Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+
+def build_named_styles():
+    """تعريف تنسيقات الخلايا المشتركة (تُنشأ لكل ملف لأن التنسيق يرتبط بملف واحد)"""
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    center_alignment = Alignment(horizontal="center", vertical="center")
+
+    return [
+        NamedStyle(
+            name=TITLE_STYLE,
+            font=Font(bold=True, color="FFFFFF"),
+            fill=header_fill,
+            alignment=center_alignment
+        ),
+        NamedStyle(
+            name=SUMMARY_TITLE_STYLE,
+            font=Font(bold=True, size=16, color="FFFFFF"),
+            fill=header_fill,
+            alignment=center_alignment
+        ),
+        NamedStyle(
+            name=HEADER_STYLE,
+            font=Font(bold=True, color="FFFFFF"),
+            fill=header_fill,
+            alignment=center_alignment,
+            border=_thin_border()
+        ),
+        NamedStyle(
+            name=DATA_STYLE,
+            alignment=center_alignment,
+            border=_thin_border()
+        ),
+        NamedStyle(
+            name=SCORE_STYLE,
+            alignment=center_alignment,
+            border=_thin_border(),
+            number_format='0.00'
+        ),
+    ]
+
+def create_workbook():
+    """إنشاء ملف Excel بوضع الكتابة فقط لتقليل استهلاك الذاكرة
+
+    في هذا الوضع تُكتب الصفوف مباشرة إلى الملف عند إضافتها بدلاً من الاحتفاظ
+    بكائن لكل خلية، لذلك يجب إضافة الصفوف بالترتيب وضبط عرض الأعمدة قبلها.
+    تُسجل التنسيقات مرة واحدة هنا، وتشير إليها الخلايا بالاسم بدلاً من إنشاء
+    كائنات Font و Border لكل خلية وإعادة البحث عنها في جدول التنسيقات.
+    """
+    wb = Workbook(write_only=True)
+    for style in build_named_styles():
+        wb.add_named_style(style)
+    return wb
+
+def build_workbook(employees, total, include_summary=True, progress=None):
+    """بناء ملف Excel من مولد (الموظف، معاييره، تقييماته) أثناء قراءته
+
+    يُكتب صف الملخص مع ورقة كل موظف وتُغلق ورقته، فلا يُحتفظ ببيانات أي موظف
+    بعد كتابته.
+    progress دالة اختيارية تُستدعى بعد كل ورقة موظف بعدد الأوراق المنجزة والإجمالي.
+    """
+    wb = create_workbook()
+
+    # ورقة الملخص أولاً لتكون الورقة الأولى، وتبقى مفتوحة لإضافة صف لكل موظف
+    summary = create_summary_sheet(wb) if include_summary else None
+
+    # إنشاء ورقة عمل لكل موظف
+    for index, (employee, criteria, evaluations) in enumerate(employees, 1):
+        # إغلاق الورقة فور كتابتها يحرر حالة كاتب XML الخاصة بها، وإلا بقيت
+        # كل الأوراق مفتوحة في الذاكرة حتى حفظ الملف
+        create_employee_sheet(wb, employee, criteria, evaluations).close()
+        if summary is not None:
+            append_summary_row(summary, employee, evaluations)
+        if progress:
+            progress(index, total)
+
+    return wb
+
+def build_export(export_type, params, session=None, progress=None):
+    """بناء ملف التصدير حسب نوعه وإرجاع الملف واسمه المقترح
+
+    الأنواع: all-evaluations (جميع الموظفين مع الملخص)، employee (موظف واحد)،
+    department (موظفو إدارة مع ملخصهم). ترفع ValueError إذا لم توجد بيانات.
+    """
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+
+    if export_type == 'all-evaluations':
+        selection = {}
+        include_summary = True
+    elif export_type == 'employee':
+        selection = {'employee_ids': [params['employee_id']]}
+        include_summary = False
+    elif export_type == 'department':
+        selection = {'department_id': params['department_id']}
+        include_summary = True
+    else:
+        raise ValueError(f'نوع التصدير غير معروف: {export_type}')
+
+    employees = iter_export_employees(session, **selection)
+    # أول موظف يحدد اسم الملف، ثم يُعاد إلى بداية المولد
+    first = next(employees, None)
+    if first is None:
+        raise ValueError('لا توجد بيانات موظفين للتصدير')
+    employee = first[0]
+
+    if export_type == 'all-evaluations':
+        filename = f"تقييمات_الموظفين_{timestamp}.xlsx"
+    elif export_type == 'employee':
+        filename = f"تقييم_{employee['full_name']}_{timestamp}.xlsx"
+    else:
+        filename = f"تقييمات_{employee['department_name']}_{timestamp}.xlsx"
+
+    total = count_export_employees(session, **selection) if progress else None
+    return build_workbook(chain([first], employees), total, include_summary, progress), filename
+
+def styled_cell(ws, value, style):
+    """إنشاء خلية للكتابة فقط بتنسيق مسجل"""
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+def create_employee_sheet(wb, employee, criteria, evaluations):
+    """إنشاء ورقة عمل لموظف محدد وإرجاعها"""
+    # إنشاء ورقة جديدة
+    ws = wb.create_sheet(title=employee['full_name'][:30])  # تحديد طول الاسم
+
+    # تحديد عدد الأعمدة (الشهر + السنة + المعايير + المتوسط)
+    total_cols = 3 + len(criteria)
+
+    # تعديل عرض الأعمدة (يجب ضبطه قبل كتابة الصفوف)
+    for col in range(1, max(total_cols, 4) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 15
+
+    # معلومات الموظف
+    ws.append([styled_cell(ws, 'معلومات الموظف', TITLE_STYLE)])
+    ws.merged_cells.add(CellRange('A1:D1'))
+
+    ws.append(['الاسم الكامل', employee['full_name']])
+    ws.append(['الرقم الوظيفي', employee['employee_number']])
+    ws.append(['المسمى الوظيفي', employee['job_title']])
+    ws.append(['الإدارة', employee['department_name']])
+    ws.append([])
+
+    if not evaluations:
+        ws.append(['لا توجد تقييمات لهذا الموظف'])
+        return ws
+
+    # رأس جدول التقييمات
+    row = 7
+    ws.append([styled_cell(ws, 'التقييمات الشهرية', TITLE_STYLE)])
+    ws.merged_cells.add(CellRange(f'A{row}:{get_column_letter(total_cols)}{row}'))
+
+    # رؤوس الأعمدة
+    headers = ['الشهر', 'السنة'] + [criterion['criteria_name'] for criterion in criteria] + ['المتوسط']
+    ws.append([styled_cell(ws, header, HEADER_STYLE) for header in headers])
+
+    # بيانات التقييمات
+    for evaluation in evaluations:
+        # الدرجات لكل معيار
+        scores = [evaluation['scores'].get(criterion['id'], 0) for criterion in criteria]
+
+        # المتوسط
+        average = sum(scores) / len(criteria) if criteria else 0
+
+        ws.append(
+            [styled_cell(ws, MONTHS_AR[evaluation['evaluation_month']], DATA_STYLE),
+             styled_cell(ws, evaluation['evaluation_year'], DATA_STYLE)]
+            + [styled_cell(ws, score, DATA_STYLE) for score in scores]
+            + [styled_cell(ws, round(average, 2), SCORE_STYLE)]
+        )
+    return ws
+
+def create_summary_sheet(wb):
+    """إنشاء ورقة ملخص عام لجميع الموظفين بالعنوان والرؤوس، وتُضاف صفوفها لاحقاً"""
+    ws = wb.create_sheet(title="الملخص العام", index=0)
+
+    # تعديل عرض الأعمدة (يجب ضبطه قبل كتابة الصفوف)
+    column_widths = [20, 15, 20, 15, 15, 15]
+    for col, width in enumerate(column_widths, 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+
+    # العنوان الرئيسي
+    ws.append([styled_cell(ws, 'ملخص تقييمات جميع الموظفين', SUMMARY_TITLE_STYLE)])
+    ws.merged_cells.add(CellRange('A1:F1'))
+    ws.append([])
+
+    # رؤوس الأعمدة
+    headers = ['الاسم الكامل', 'الرقم الوظيفي', 'المسمى الوظيفي', 'الإدارة', 'عدد التقييمات', 'المتوسط العام']
+    ws.append([styled_cell(ws, header, HEADER_STYLE) for header in headers])
+    return ws
+
+def append_summary_row(ws, employee, evaluations):
+    """إضافة صف موظف إلى ورقة الملخص من نفس البيانات المحملة لورقته"""
+    # حساب المتوسط العام
+    evaluation_count = len(evaluations)
+    total_average = 0
+    if evaluation_count > 0:
+        total_average = sum(evaluation['average_score'] for evaluation in evaluations) / evaluation_count
+
+    values = [
+        employee['full_name'],
+        employee['employee_number'],
+        employee['job_title'],
+        employee['department_name'],
+        evaluation_count
+    ]
+    ws.append(
+        [styled_cell(ws, value, DATA_STYLE) for value in values]
+        + [styled_cell(
+            ws,
+            round(total_average, 2) if evaluation_count > 0 else 'لا توجد تقييمات',
+            SCORE_STYLE
+        )]
+    )
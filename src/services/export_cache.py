@@ -0,0 +1,121 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# ذاكرة تخزين ملفات التصدير على القرص
+# المفتاح بصمة (نوع التصدير، المعاملات، إصدار البيانات)، فأي كتابة تزيد إصدار
+# البيانات تجعل الملفات القديمة غير قابلة للوصول وتُحذف لاحقاً بالإخلاء
+DEFAULT_EXPORT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+_lock = threading.Lock()
+
+def get_cache_dir():
+    """مجلد ملفات التصدير المخزنة"""
+    cache_dir = current_app.config.get('EXPORT_CACHE_DIR') or \
+        os.path.join(current_app.root_path, 'database', 'export_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def export_cache_key(export_type, params, data_version):
+    """بصمة ثابتة لمحتوى التصدير تُستخدم اسماً للملف وقيمةً لـ ETag"""
+    payload = json.dumps(
+        {'type': export_type, 'params': params, 'version': data_version},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _paths(key):
+    cache_dir = get_cache_dir()
+    return os.path.join(cache_dir, f'{key}.xlsx'), os.path.join(cache_dir, f'{key}.json')
+
+def open_cached_export(key):
+    """إرجاع (الملف مفتوحاً للقراءة، اسم التحميل) إذا كان التصدير مخزناً، وإلا None
+
+    يُفتح الملف مع قفل الإخلاء، فإذا حذفه طلب آخر بعد ذلك يبقى المقبض المفتوح
+    صالحاً للقراءة حتى ينتهي الإرسال. يجب على المستدعي إغلاق الملف.
+    """
+    file_path, meta_path = _paths(key)
+    with _lock:
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            export_file = open(file_path, 'rb')
+        except (OSError, ValueError):
+            return None
+        try:
+            # تحديث وقت آخر استخدام لترتيب الإخلاء (LRU)
+            os.utime(file_path)
+            os.utime(meta_path)
+        except OSError:
+            pass
+    return export_file, meta['filename']
+
+def store_export(key, wb, filename):
+    """حفظ ملف Excel في الذاكرة المؤقتة ثم إخلاء الأقدم عند تجاوز الحجم
+
+    يرجع الملف المحفوظ مفتوحاً للقراءة (يُفتح مع قفل الإخلاء كما في
+    open_cached_export)، ويجب على المستدعي إغلاقه.
+    """
+    file_path, meta_path = _paths(key)
+    cache_dir = os.path.dirname(file_path)
+
+    # الكتابة في ملف مؤقت ثم الاستبدال الذري حتى لا يُقرأ ملف ناقص
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    export_file = None
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            wb.save(f)
+        with _lock:
+            os.replace(temp_path, file_path)
+            export_file = open(file_path, 'rb')
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({'filename': filename}, f, ensure_ascii=False)
+    except Exception:
+        if export_file is not None:
+            export_file.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    evict_exports(keep=file_path)
+    return export_file
+
+def evict_exports(max_bytes=None, keep=None):
+    """حذف الملفات الأقل استخداماً حتى يصبح الحجم الكلي ضمن الحد (عدا الملف keep)"""
+    if max_bytes is None:
+        max_bytes = current_app.config.get('EXPORT_CACHE_MAX_BYTES', DEFAULT_EXPORT_CACHE_MAX_BYTES)
+    cache_dir = get_cache_dir()
+
+    with _lock:
+        entries = []
+        for name in os.listdir(cache_dir):
+            if not name.endswith('.xlsx'):
+                continue
+            path = os.path.join(cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            for stale in (path, path[:-len('.xlsx')] + '.json'):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    logger.warning(f"تعذر حذف ملف التصدير المخزن {stale}")
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,166 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from flask import current_app
+from src.models.user import db
+from src.models.export_job import ExportJob
+from src.services.excel_export import build_export
+
+logger = logging.getLogger(__name__)
+
+# أنواع التصدير المدعومة والمعاملات المطلوبة لكل منها
+EXPORT_JOB_TYPES = {
+    'all-evaluations': [],
+    'employee': ['employee_id'],
+    'department': ['department_id'],
+}
+
+DEFAULT_EXPORT_JOB_WORKERS = 2
+DEFAULT_EXPORT_JOB_TTL_HOURS = 24
+# مدة بقاء سجل المهمة بعد انتهاء صلاحية ملفها (ليرجع التحميل 410 لا 404)
+DEFAULT_EXPORT_JOB_RETENTION_DAYS = 7
+# أقل مدة بالثواني بين عمليتي تنظيف
+DEFAULT_EXPORT_JOB_CLEANUP_INTERVAL = 300
+
+_executor = None
+_executor_lock = threading.Lock()
+_cleanup_lock = threading.Lock()
+_last_cleanup = None
+
+def get_executor():
+    """مجمع العمال المشترك لمهام التصدير (يُنشأ عند أول استخدام)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = current_app.config.get('EXPORT_JOB_WORKERS', DEFAULT_EXPORT_JOB_WORKERS)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export-job')
+        return _executor
+
+def get_jobs_dir():
+    """مجلد ملفات التصدير الجاهزة"""
+    jobs_dir = current_app.config.get('EXPORT_JOBS_DIR') or \
+        os.path.join(current_app.root_path, 'database', 'exports')
+    os.makedirs(jobs_dir, exist_ok=True)
+    return jobs_dir
+
+def submit_export_job(export_type, params):
+    """حفظ مهمة تصدير جديدة ووضعها في طابور العمال"""
+    cleanup_expired_export_jobs()
+
+    job = ExportJob(
+        id=uuid.uuid4().hex,
+        export_type=export_type,
+        params=json.dumps(params, ensure_ascii=False)
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    get_executor().submit(_run_export_job, app, job.id)
+    return job
+
+def _run_export_job(app, job_id):
+    """تنفيذ مهمة تصدير داخل سياق التطبيق في خيط العامل"""
+    with app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        if job is None:
+            return
+
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+
+        # تحديث نسبة الإنجاز في قاعدة البيانات كل 5% تقريباً
+        reported = {'progress': 0.0}
+
+        def report_progress(done, total):
+            progress = done / total if total else 1
+            if progress - reported['progress'] >= 0.05 or done == total:
+                reported['progress'] = progress
+                job.progress = round(progress * 0.95, 3)  # الحفظ في الملف هو آخر 5%
+                db.session.commit()
+
+        try:
+            wb, filename = build_export(job.export_type, job.get_params(), progress=report_progress)
+
+            file_path = os.path.join(get_jobs_dir(), f'{job.id}.xlsx')
+            wb.save(file_path)
+
+            ttl_hours = app.config.get('EXPORT_JOB_TTL_HOURS', DEFAULT_EXPORT_JOB_TTL_HOURS)
+            job.status = 'completed'
+            job.progress = 1
+            job.filename = filename
+            job.file_path = file_path
+            job.finished_at = datetime.utcnow()
+            job.expires_at = job.finished_at + timedelta(hours=ttl_hours)
+            db.session.commit()
+            cleanup_expired_export_jobs()
+
+        except Exception as e:
+            logger.exception(f"فشلت مهمة التصدير {job_id}")
+            db.session.rollback()
+            _remove_file(os.path.join(get_jobs_dir(), f'{job_id}.xlsx'))
+            ttl_hours = app.config.get('EXPORT_JOB_TTL_HOURS', DEFAULT_EXPORT_JOB_TTL_HOURS)
+            job = db.session.get(ExportJob, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            job.expires_at = job.finished_at + timedelta(hours=ttl_hours)
+            db.session.commit()
+
+def _remove_file(file_path):
+    if file_path and os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+        except OSError:
+            logger.warning(f"تعذر حذف ملف التصدير {file_path}")
+
+def cleanup_expired_export_jobs(force=False):
+    """حذف ملفات المهام المنتهية صلاحيتها ثم سجلاتها بعد مدة الاحتفاظ
+
+    يُستدعى عند إضافة مهمة وعند الاستعلام عن حالتها أو تحميلها وبعد اكتمالها،
+    ويُنفذ مرة واحدة على الأكثر كل EXPORT_JOB_CLEANUP_INTERVAL ثانية. المهمة
+    المكتملة المنتهية تصبح expired فيرجع تحميلها 410 حتى يُحذف سجلها.
+    """
+    global _last_cleanup
+    interval = current_app.config.get('EXPORT_JOB_CLEANUP_INTERVAL', DEFAULT_EXPORT_JOB_CLEANUP_INTERVAL)
+    with _cleanup_lock:
+        if not force and _last_cleanup is not None and time.monotonic() - _last_cleanup < interval:
+            return 0
+        _last_cleanup = time.monotonic()
+
+    now = datetime.utcnow()
+    retention_days = current_app.config.get('EXPORT_JOB_RETENTION_DAYS', DEFAULT_EXPORT_JOB_RETENTION_DAYS)
+    expired = ExportJob.query.filter(
+        ExportJob.expires_at < now,
+        (ExportJob.file_path.isnot(None)) | (ExportJob.expires_at < now - timedelta(days=retention_days))
+    ).all()
+    for job in expired:
+        _remove_file(job.file_path)
+        if job.expires_at < now - timedelta(days=retention_days):
+            db.session.delete(job)
+        else:
+            job.file_path = None
+            if job.status == 'completed':
+                job.status = 'expired'
+    if expired:
+        db.session.commit()
+    return len(expired)
+
+def recover_export_jobs():
+    """عند بدء التشغيل: إنهاء المهام التي انقطعت بإعادة التشغيل وتنظيف المنتهية"""
+    interrupted = ExportJob.query.filter(ExportJob.status.in_(['queued', 'running'])).all()
+    ttl_hours = current_app.config.get('EXPORT_JOB_TTL_HOURS', DEFAULT_EXPORT_JOB_TTL_HOURS)
+    for job in interrupted:
+        job.status = 'failed'
+        job.error = 'توقفت المهمة بسبب إعادة تشغيل الخادم'
+        job.finished_at = datetime.utcnow()
+        job.expires_at = job.finished_at + timedelta(hours=ttl_hours)
+    if interrupted:
+        db.session.commit()
+    cleanup_expired_export_jobs(force=True)
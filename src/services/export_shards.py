@@ -0,0 +1,113 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import zipfile
+from flask import current_app
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from src.models.sqlite_tuning import configure_sqlite_engine
+from src.services.excel_export import build_export
+
+logger = logging.getLogger(__name__)
+
+# مجمع عمليات مستقل عن عمال مهام التصدير، لأن بناء ملفات Excel يستهلك المعالج
+# ولا يستفيد من الخيوط بسبب GIL
+_executor = None
+_executor_lock = threading.Lock()
+
+# محركات قاعدة البيانات داخل كل عملية عاملة (محرك واحد لكل رابط)
+_worker_engines = {}
+
+def get_shard_executor():
+    """مجمع العمليات المشترك لتصدير الإدارات (يُنشأ عند أول استخدام)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = current_app.config.get('EXPORT_SHARD_WORKERS') or os.cpu_count() or 1
+            # spawn بدلاً من fork حتى لا ترث العمليات اتصالات قاعدة البيانات وأقفال الخيوط
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _executor
+
+def _get_worker_engine(database_uri, pragmas):
+    engine = _worker_engines.get(database_uri)
+    if engine is None:
+        engine = create_engine(database_uri)
+        configure_sqlite_engine(engine, pragmas)
+        _worker_engines[database_uri] = engine
+    return engine
+
+def build_department_shard(database_uri, pragmas, department_id):
+    """بناء ملف Excel لإدارة واحدة داخل عملية عاملة وإرجاع (اسم الملف، محتواه)
+
+    تعمل خارج سياق Flask باتصال خاص بالعملية، لذلك تُمرر الجلسة صراحة.
+    """
+    engine = _get_worker_engine(database_uri, pragmas)
+    with Session(engine) as session:
+        wb, filename = build_export('department', {'department_id': department_id}, session=session)
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return filename, buffer.getvalue()
+
+class _ZipStream:
+    """مخزن كتابة غير قابل للتنقل يجمع ما يكتبه ZipFile لإرساله على دفعات
+
+    عدم توفير seek و tell يجعل ZipFile يكتب واصفات البيانات بعد كل ملف،
+    فيمكن إرسال كل ملف فور إضافته دون انتظار بقية الأرشيف.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_department_shards(department_ids):
+    """مولد يرسل أرشيف ZIP يضم ملف Excel لكل إدارة بترتيب انتهاء بنائها
+
+    تُبنى الملفات بالتوازي في مجمع العمليات، ويُرسل كل ملف للعميل فور
+    اكتماله فيصل أول جزء من الاستجابة بعد بناء أسرع إدارة.
+    """
+    database_uri = current_app.config['SQLALCHEMY_DATABASE_URI']
+    pragmas = current_app.config.get('SQLITE_PRAGMAS', {})
+    executor = get_shard_executor()
+
+    def generate():
+        futures = [
+            executor.submit(build_department_shard, database_uri, pragmas, department_id)
+            for department_id in department_ids
+        ]
+        stream = _ZipStream()
+        try:
+            # ملفات xlsx مضغوطة أصلاً فلا فائدة من ضغطها مرة أخرى
+            with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+                for future in as_completed(futures):
+                    filename, content = future.result()
+                    archive.writestr(filename, content)
+                    yield stream.pop()
+            yield stream.pop()
+        except Exception:
+            # بدأ إرسال الاستجابة فلا يمكن إرجاع رمز خطأ، ويصل الأرشيف ناقصاً
+            logger.exception("فشل بناء أرشيف تصدير الإدارات")
+            raise
+        finally:
+            # إلغاء الإدارات التي لم تبدأ إذا انقطع الاتصال أو فشل أحد الملفات
+            for future in futures:
+                future.cancel()
+
+    return generate()
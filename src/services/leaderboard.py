@@ -0,0 +1,158 @@
+from collections import namedtuple
+from sqlalchemy import select, func, literal
+from src.models.user import db
+from src.models.employee import Employee
+from src.models.department import Department, EvaluationCriteria
+from src.models.evaluation import MonthlyEvaluation, EvaluationScore
+from src.services.score_cube import get_period_values
+
+LEADERBOARD_SCOPES = ('department', 'all')
+DEFAULT_LEADERBOARD_K = 10
+MAX_LEADERBOARD_K = 100
+
+def _period_values(year, month, criteria_id):
+    """قيمة كل موظف في الفترة: متوسط تقييمه أو درجة معيار محدد
+
+    للسنة الكاملة تُحسب قيمة الموظف كمتوسط قيمه الشهرية في تلك السنة.
+    """
+    if criteria_id is None:
+        value = MonthlyEvaluation.average_score
+        query = select(MonthlyEvaluation.employee_id.label('employee_id'))
+    else:
+        value = EvaluationScore.score
+        query = select(MonthlyEvaluation.employee_id.label('employee_id'))\
+            .join(EvaluationScore, EvaluationScore.evaluation_id == MonthlyEvaluation.id)\
+            .where(EvaluationScore.criteria_id == criteria_id)
+
+    query = query.where(MonthlyEvaluation.evaluation_year == year)
+    if month:
+        return query.add_columns(value.label('value'), literal(1).label('evaluation_count'))\
+            .where(MonthlyEvaluation.evaluation_month == month)
+    return query.add_columns(func.avg(value).label('value'), func.count().label('evaluation_count'))\
+        .group_by(MonthlyEvaluation.employee_id)
+
+# صف مرتب بنفس أعمدة استعلام الترتيب
+RankedRow = namedtuple('RankedRow', (
+    'id', 'full_name', 'employee_number', 'job_title', 'department_id', 'department_name', 'value',
+    'evaluation_count', 'rank', 'top_position', 'bottom_position', 'ranked_count'
+))
+
+def _rank_in_database(scope, year, month, k, department_id, criteria_id):
+    """الترتيب في قاعدة البيانات بدوال النوافذ، فلا يعود منها إلا 2K صف لكل لوحة"""
+    values = _period_values(year, month, criteria_id).subquery()
+    partition = [Employee.department_id] if scope == 'department' else []
+
+    ranked = select(
+        Employee.id, Employee.full_name, Employee.employee_number, Employee.job_title,
+        Employee.department_id, Department.name.label('department_name'),
+        values.c.value, values.c.evaluation_count,
+        # ترتيب مع التعادل للعرض، وترقيم صارم من الطرفين لاختيار K من كل طرف
+        func.rank().over(partition_by=partition, order_by=values.c.value.desc()).label('rank'),
+        func.row_number().over(
+            partition_by=partition, order_by=(values.c.value.desc(), Employee.id)
+        ).label('top_position'),
+        func.row_number().over(
+            partition_by=partition, order_by=(values.c.value.asc(), Employee.id)
+        ).label('bottom_position'),
+        func.count().over(partition_by=partition).label('ranked_count')
+    ).join(values, values.c.employee_id == Employee.id)\
+        .outerjoin(Department, Department.id == Employee.department_id)
+    if department_id is not None:
+        ranked = ranked.where(Employee.department_id == department_id)
+    ranked = ranked.subquery()
+
+    # ترتيب الصفوف حسب اللوحة ثم الموقع من الأعلى
+    order = [ranked.c.department_id, ranked.c.top_position] if scope == 'department' else [ranked.c.top_position]
+    return db.session.connection().execute(
+        select(ranked).where((ranked.c.top_position <= k) | (ranked.c.bottom_position <= k))
+        .order_by(*order)
+    ).all()
+
+def _rank_values(scope, k, department_id, values):
+    """نفس ترتيب _rank_in_database على قيم (بيانات الموظف، القيمة، العدد) من المكعب"""
+    partitions = {}
+    for info, value, count in values:
+        if department_id is not None and info['department_id'] != department_id:
+            continue
+        key = info['department_id'] if scope == 'department' else None
+        partitions.setdefault(key, []).append((info, value, count))
+
+    rows = []
+    for entries in partitions.values():
+        top = sorted(entries, key=lambda entry: (-entry[1], entry[0]['id']))
+        bottom_positions = {
+            entry[0]['id']: position
+            for position, entry in enumerate(sorted(entries, key=lambda entry: (entry[1], entry[0]['id'])), 1)
+        }
+        rank = 0
+        for position, (info, value, count) in enumerate(top, 1):
+            if position == 1 or value != top[position - 2][1]:
+                rank = position
+            bottom_position = bottom_positions[info['id']]
+            if position <= k or bottom_position <= k:
+                rows.append(RankedRow(
+                    info['id'], info['full_name'], info['employee_number'], info['job_title'],
+                    info['department_id'], info['department_name'], value, count, rank, position, bottom_position, len(entries)
+                ))
+    rows.sort(key=lambda row: (row.department_id if scope == 'department' else 0, row.top_position))
+    return rows
+
+def compute_leaderboard(scope, year, month=None, k=DEFAULT_LEADERBOARD_K,
+                        department_id=None, criteria_id=None):
+    """أعلى وأدنى K موظفين حسب المتوسط أو درجة معيار في شهر أو سنة
+
+    إذا كان مكعب الدرجات محملاً تُرتب قيم الموظفين المحسوبة منه دون قاعدة
+    البيانات، وإلا يتم الترتيب في قاعدة البيانات دون تحميل أي كائنات ORM.
+    النطاق department يعطي لوحة لكل إدارة (أو للإدارة المحددة)، والنطاق all
+    لوحة واحدة للجميع.
+    """
+    values = get_period_values(year, month, criteria_id)
+    if values is not None:
+        rows = _rank_values(scope, k, department_id, values)
+    else:
+        rows = _rank_in_database(scope, year, month, k, department_id, criteria_id)
+
+    boards = {}
+    for row in rows:
+        key = row.department_id if scope == 'department' else None
+        board = boards.setdefault(key, {
+            'department_id': key,
+            'department_name': row.department_name if scope == 'department' else None,
+            'ranked_count': row.ranked_count,
+            'top': [],
+            'bottom': []
+        })
+        entry = {
+            'rank': row.rank,
+            'employee_id': row.id,
+            'full_name': row.full_name,
+            'employee_number': row.employee_number,
+            'job_title': row.job_title,
+            'department_id': row.department_id,
+            'department_name': row.department_name,
+            'value': round(row.value, 4),
+            'evaluation_count': row.evaluation_count
+        }
+        if row.top_position <= k:
+            board['top'].append(entry)
+        if row.bottom_position <= k:
+            board['bottom'].append((row.bottom_position, entry))
+
+    for board in boards.values():
+        # الأدنى أولاً في قائمة الأدنى
+        board['bottom'] = [entry for _, entry in sorted(board['bottom'], key=lambda item: item[0])]
+
+    criteria = None
+    if criteria_id is not None:
+        criterion = db.session.get(EvaluationCriteria, criteria_id)
+        criteria = criterion.to_dict() if criterion else None
+
+    return {
+        'scope': scope,
+        'year': year,
+        'month': month,
+        'k': k,
+        'metric': 'average' if criteria_id is None else 'criteria',
+        'criteria': criteria,
+        'leaderboards': list(boards.values())
+    }
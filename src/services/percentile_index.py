@@ -0,0 +1,128 @@
+from bisect import bisect_left, bisect_right, insort
+import threading
+from sqlalchemy import select
+from src.models.user import db
+from src.models.employee import Employee
+from src.models.evaluation import MonthlyEvaluation
+from src.models.signals import evaluations_changed, employees_changed
+from src.services.chart_cache import invalidate_department_years
+
+# فهرس ترتيب المتوسطات لكل (إدارة، سنة، شهر)
+#
+# لكل مفتاح قائمة مرتبة بمتوسطات تقييمات موظفي الإدارة في ذلك الشهر، مع قاموس
+# {معرف الموظف: متوسطه}. موقع الموظف بين زملائه يُحسب بـ bisect على القائمة
+# المرتبة بدلاً من جلب تقييمات الإدارة وترتيبها في كل طلب. يُبنى الفهرس عند
+# أول استخدام، ثم تُحدث متوسطات الموظفين المتأثرين فقط بعد كل كتابة.
+
+_lock = threading.RLock()
+_index = None
+
+def _load_entries():
+    """قراءة جميع المتوسطات بترتيب تصاعدي لكل (إدارة، سنة، شهر)"""
+    query = select(
+        Employee.department_id, MonthlyEvaluation.evaluation_year, MonthlyEvaluation.evaluation_month,
+        MonthlyEvaluation.employee_id, MonthlyEvaluation.average_score
+    ).join(Employee, Employee.id == MonthlyEvaluation.employee_id)\
+        .order_by(MonthlyEvaluation.average_score)
+
+    entries = {}
+    for department_id, year, month, employee_id, average in db.session.execute(query):
+        averages, by_employee = entries.setdefault((department_id, year, month), ([], {}))
+        averages.append(average)
+        by_employee[employee_id] = average
+    return entries
+
+def _get_index():
+    global _index
+    with _lock:
+        if _index is None:
+            _index = _load_entries()
+        return _index
+
+def _remove(entry, employee_id):
+    """حذف متوسط موظف من قائمة مرتبة"""
+    averages, by_employee = entry
+    value = by_employee.pop(employee_id)
+    del averages[bisect_left(averages, value)]
+
+def _update_employees(employee_ids, years=None):
+    """استبدال متوسطات الموظفين في الفهرس (في السنوات المعطاة أو جميعها)
+
+    تُحذف القيم القديمة من القوائم المرتبة وتُدرج الحالية بـ insort، فتكلفة
+    الكتابة تتناسب مع عدد تقييمات الموظف لا مع حجم إدارته. ويشمل الحذف جميع
+    الإدارات حتى يُنقل ترتيب الموظف المنقول إلى إدارته الجديدة. القراءة والتطبيق
+    يتمان مع القفل، فلا تُطبق قراءة أقدم بعد قراءة أحدث منها ولا يرى
+    percentile_rank قائمة نصف محدثة.
+    """
+    employee_ids = set(employee_ids)
+    if not employee_ids:
+        return
+    query = select(
+        Employee.department_id, MonthlyEvaluation.evaluation_year, MonthlyEvaluation.evaluation_month,
+        MonthlyEvaluation.employee_id, MonthlyEvaluation.average_score
+    ).join(Employee, Employee.id == MonthlyEvaluation.employee_id)\
+        .where(MonthlyEvaluation.employee_id.in_(employee_ids))
+    if years is not None:
+        query = query.where(MonthlyEvaluation.evaluation_year.in_(years))
+
+    affected = set()
+    with _lock:
+        if _index is None:
+            return
+        rows = db.session.execute(query).all()
+        for key, entry in _index.items():
+            if years is not None and key[1] not in years:
+                continue
+            for employee_id in [employee_id for employee_id in employee_ids if employee_id in entry[1]]:
+                _remove(entry, employee_id)
+                affected.add(key[:2])
+        for department_id, year, month, employee_id, average in rows:
+            averages, by_employee = _index.setdefault((department_id, year, month), ([], {}))
+            insort(averages, average)
+            by_employee[employee_id] = average
+            affected.add((department_id, year))
+        for key in [key for key, entry in _index.items() if not entry[0]]:
+            del _index[key]
+    # استجابات الرسم البياني المخزنة لزملاء الإدارة تحتوي ترتيباً قديماً
+    invalidate_department_years(affected)
+
+def percentile_rank(department_id, year, month, employee_id):
+    """موقع متوسط الموظف بين زملاء إدارته في شهر محدد أو None
+
+    percentile نسبة الزملاء الأقل منه (مع نصف المتساوين معه)، و top_percent
+    نسبة من هم مثله أو أعلى منه (مثلاً 15 تعني ضمن أعلى 15%). يُحسب مع القفل
+    لأن التحديث يعدل القائمة والقاموس في مكانهما.
+    """
+    with _lock:
+        entry = _get_index().get((department_id, year, month))
+        if entry is None or employee_id not in entry[1]:
+            return None
+
+        averages, by_employee = entry
+        value = by_employee[employee_id]
+        count = len(averages)
+        below = bisect_left(averages, value)
+        above = count - bisect_right(averages, value)
+    return {
+        'percentile': round((below + (count - below - above) / 2) / count * 100, 1),
+        'top_percent': round((count - below) / count * 100, 1),
+        'rank': above + 1,
+        'department_count': count
+    }
+
+@evaluations_changed.connect
+def _on_evaluations_changed(sender, periods=(), **extra):
+    years_by_employee = {}
+    for employee_id, year in periods:
+        years_by_employee.setdefault(employee_id, set()).add(year)
+    # التجميع حسب مجموعة السنوات يجعل الاستيراد الكبير بضعة استعلامات فقط
+    employees_by_years = {}
+    for employee_id, years in years_by_employee.items():
+        employees_by_years.setdefault(frozenset(years), set()).add(employee_id)
+    for years, employee_ids in employees_by_years.items():
+        _update_employees(employee_ids, years)
+
+@employees_changed.connect
+def _on_employees_changed(sender, employee_ids=(), **extra):
+    """عند نقل موظف أو حذفه يُنقل ترتيبه أو يُحذف من جميع السنوات"""
+    _update_employees(employee_ids)
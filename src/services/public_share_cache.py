@@ -0,0 +1,65 @@
+import threading
+import time
+from flask import current_app
+from src.models.signals import evaluations_changed, employees_changed, departments_changed
+
+# ذاكرة مؤقتة لاستجابة بيانات المشاركة العامة المسلسلة
+# الرابط العام يُفتح دون تسجيل دخول وقد يصله عدد كبير من الطلبات معاً، لذلك
+# تُخزن الاستجابة مدة محددة وتُحذف فور أي كتابة على الموظفين أو الإدارات أو
+# التقييمات. عند انتهاء المدة يبني طلب واحد فقط الاستجابة وتنتظره بقية الطلبات.
+DEFAULT_PUBLIC_SHARE_CACHE_TTL = 60
+
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+# (الاستجابة المسلسلة، وقت انتهاء الصلاحية) أو None
+_entry = None
+# يزداد مع كل حذف حتى لا تُخزن استجابة بُنيت قبل الكتابة
+_generation = 0
+
+def _get_valid_entry():
+    """الاستجابة المخزنة إذا لم تنته صلاحيتها (يُستدعى مع القفل)"""
+    if _entry is not None and _entry[1] > time.monotonic():
+        return _entry[0]
+    return None
+
+def get_public_share_payload(build):
+    """إرجاع (الاستجابة المسلسلة، 'HIT' أو 'MISS') مع بنائها بـ build عند الحاجة"""
+    global _entry
+    with _lock:
+        payload = _get_valid_entry()
+    if payload is not None:
+        return payload, 'HIT'
+
+    with _build_lock:
+        # ربما بناها طلب آخر أثناء الانتظار
+        with _lock:
+            payload = _get_valid_entry()
+            generation = _generation
+        if payload is not None:
+            return payload, 'HIT'
+
+        payload = build()
+        ttl = current_app.config.get('PUBLIC_SHARE_CACHE_TTL', DEFAULT_PUBLIC_SHARE_CACHE_TTL)
+        with _lock:
+            if generation == _generation and ttl > 0:
+                _entry = (payload, time.monotonic() + ttl)
+        return payload, 'MISS'
+
+def invalidate_public_share():
+    """حذف الاستجابة المخزنة"""
+    global _entry, _generation
+    with _lock:
+        _entry = None
+        _generation += 1
+
+@evaluations_changed.connect
+def _on_evaluations_changed(sender, **extra):
+    invalidate_public_share()
+
+@employees_changed.connect
+def _on_employees_changed(sender, **extra):
+    invalidate_public_share()
+
+@departments_changed.connect
+def _on_departments_changed(sender, **extra):
+    invalidate_public_share()
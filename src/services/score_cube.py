@@ -0,0 +1,395 @@
+from datetime import datetime
+from itertools import chain
+import math
+import threading
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+from src.models.user import db
+from src.models.employee import Employee
+from src.models.department import EvaluationCriteria
+from src.models.evaluation import MonthlyEvaluation, EvaluationScore, iter_chart_series
+from src.models.query_options import employee_department_options
+from src.models.signals import evaluations_changed, employees_changed, departments_changed
+from src.services import chart_cache, public_share_cache
+
+# مكعب الدرجات في الذاكرة (موظف × شهر × معيار) - اختياري عبر SCORE_CUBE_ENABLED
+#
+# لكل موظف شريحة مصفوفات خاصة به: أرقام الأشهر المرتبة، والمجموع والمتوسط
+# المخزنين لكل شهر، ومعرفات المعايير التي قُيّم بها فعلاً، ومصفوفة درجات
+# (شهر × معيار) بنفس ترتيب تلك المعرفات و NaN للدرجة غير الموجودة. أعمدة
+# الشريحة معايير الموظف نفسه لا معايير إدارته الحالية، فالموظف المنقول تبقى
+# درجاته القديمة تحت أسماء معاييرها الأصلية كما في قراءة قاعدة البيانات.
+#
+# تُبنى الشرائح عند بدء التشغيل، ثم تُعاد قراءة شرائح الموظفين المتأثرين فقط
+# من قاعدة البيانات بعد كل كتابة عبر إشارات تغيير البيانات. يخدم المكعب بيانات
+# الرسم البياني وملخصات المشاركة العامة ولوحة الترتيب. أما فهرس الترتيب المئوي
+# فيُبنى ويُحدّث من قاعدة البيانات لأن تحديثاته مرتبة بقراءتها تحت قفله، وملفات
+# التصدير تُخزن بإصدار البيانات الذي يتغير داخل معاملة الكتابة قبل تحديث المكعب.
+
+_lock = threading.Lock()
+# تسلسل عمليات إعادة القراءة حتى لا تُطبق قراءة أقدم بعد قراءة أحدث منها
+_refresh_lock = threading.RLock()
+_cube = None
+
+def _period_code(year, month):
+    return year * 12 + month - 1
+
+class EmployeeSlice:
+    """درجات موظف واحد في مصفوفات NumPy"""
+
+    __slots__ = ('info', 'department_id', 'periods', 'totals', 'averages', 'criteria_ids', 'scores')
+
+    def __init__(self, info, department_id, periods, totals, averages, criteria_ids, scores):
+        self.info = info
+        self.department_id = department_id
+        self.periods = periods
+        self.totals = totals
+        self.averages = averages
+        self.criteria_ids = criteria_ids
+        self.scores = scores
+
+    @property
+    def nbytes(self):
+        return (self.periods.nbytes + self.totals.nbytes + self.averages.nbytes
+                + self.criteria_ids.nbytes + self.scores.nbytes)
+
+class ScoreCube:
+    """شرائح الموظفين مع أسماء المعايير"""
+
+    def __init__(self):
+        # {معرف المعيار: اسمه} - يُستبدل القاموس كاملاً عند تغييره ولا يُعدل
+        self.criteria = {}
+        self.employees = {}
+        self.built_at = None
+        self.refreshes = 0
+
+def _load_criteria():
+    """{معرف المعيار: اسمه} لجميع المعايير"""
+    return dict(db.session.execute(select(EvaluationCriteria.id, EvaluationCriteria.criteria_name)).all())
+
+def _fetch_array(query, width):
+    """تنفيذ استعلام على مؤشر DBAPI مباشرة وتحويل نتائجه إلى مصفوفة أعداد
+
+    قراءة ملايين الدرجات عبر كائنات Row تستغرق أضعاف وقت SQLite نفسه وتحجز
+    ذاكرة لكل صف، بينما يمرر المؤشر صفوفه إلى np.fromiter دون تجميعها في قائمة.
+    """
+    compiled = query.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    if compiled.positional:
+        parameters = [compiled.params[name] for name in compiled.positiontup]
+    else:
+        parameters = compiled.params
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.execute(str(compiled), parameters)
+        data = np.fromiter(chain.from_iterable(cursor), dtype=np.float64)
+    finally:
+        cursor.close()
+    return data.reshape(-1, width)
+
+def _load_slices(employee_ids=None):
+    """قراءة شرائح الموظفين من قاعدة البيانات بثلاثة استعلامات مهما كان عددهم
+
+    تُملأ الدرجات كلها في مخزن واحد بعمليات NumPy دون حلقة على الدرجات، حيث
+    لكل موظف كتلة (تقييم × معيار قُيّم به) متتالية فيه، وشريحته نافذة (view)
+    على كتلته.
+    """
+    employee_query = Employee.query.options(*employee_department_options())
+    evaluation_filters = []
+    if employee_ids is not None:
+        employee_query = employee_query.filter(Employee.id.in_(employee_ids))
+        evaluation_filters.append(MonthlyEvaluation.employee_id.in_(employee_ids))
+
+    employees = {employee.id: employee for employee in employee_query}
+
+    # المجاميع المخزنة لكل تقييم مرتبة حسب الموظف ثم الشهر
+    evaluations = _fetch_array(
+        select(
+            MonthlyEvaluation.id, MonthlyEvaluation.employee_id,
+            MonthlyEvaluation.evaluation_year * 12 + MonthlyEvaluation.evaluation_month - 1,
+            MonthlyEvaluation.total_score, MonthlyEvaluation.average_score
+        ).where(*evaluation_filters)
+        .order_by(MonthlyEvaluation.employee_id, MonthlyEvaluation.evaluation_year,
+                  MonthlyEvaluation.evaluation_month),
+        5
+    )
+    scores = _fetch_array(
+        select(EvaluationScore.evaluation_id, EvaluationScore.criteria_id, EvaluationScore.score)
+        .join(MonthlyEvaluation, MonthlyEvaluation.id == EvaluationScore.evaluation_id)
+        .where(*evaluation_filters),
+        3
+    )
+    evaluation_ids = evaluations[:, 0].astype(np.int64)
+    evaluation_employees = evaluations[:, 1].astype(np.int64)
+
+    # حدود صفوف كل موظف في مصفوفة التقييمات المرتبة حسب الموظف
+    employee_order = np.array(sorted(employees), dtype=np.int64)
+    starts = np.searchsorted(evaluation_employees, employee_order, side='left')
+    ends = np.searchsorted(evaluation_employees, employee_order, side='right')
+
+    # صف كل درجة = موقع تقييمها في المصفوفة المرتبة، وموظفها من ذلك الصف
+    order = np.argsort(evaluation_ids)
+    rows = order[np.searchsorted(evaluation_ids, scores[:, 0].astype(np.int64), sorter=order)]
+    score_employees = evaluation_employees[rows]
+    score_criteria = scores[:, 1].astype(np.int64)
+    positions = np.searchsorted(employee_order, score_employees)
+    known = positions < employee_order.size
+    known[known] = employee_order[positions[known]] == score_employees[known]
+    rows, positions, score_criteria = rows[known], positions[known], score_criteria[known]
+    score_values = scores[known, 2]
+
+    # معايير كل موظف = الأزواج (موظف، معيار) المختلفة مرتبة حسب الموظف ثم المعيار
+    stride = int(score_criteria.max()) + 1 if score_criteria.size else 1
+    pairs, pair_index = np.unique(positions * stride + score_criteria, return_inverse=True)
+    pair_starts = np.searchsorted(pairs // stride, np.arange(employee_order.size), side='left')
+    pair_ends = np.searchsorted(pairs // stride, np.arange(employee_order.size), side='right')
+    pair_criteria = pairs % stride
+
+    # موقع كتلة كل موظف في المخزن (عدد تقييماته × عدد معاييره)
+    heights = ends - starts
+    widths = pair_ends - pair_starts
+    offsets = np.concatenate(([0], np.cumsum(heights * widths)))
+    buffer = np.full(int(offsets[-1]), np.nan, dtype=np.float64)
+    buffer[
+        offsets[positions]
+        + (rows - starts[positions]) * widths[positions]
+        + (pair_index - pair_starts[positions])
+    ] = score_values
+
+    slices = {}
+    for position, employee_id in enumerate(employee_order.tolist()):
+        employee = employees[employee_id]
+        start, end = int(starts[position]), int(ends[position])
+        slices[employee_id] = EmployeeSlice(
+            info=employee.to_dict(),
+            department_id=employee.department_id,
+            periods=evaluations[start:end, 2].astype(np.int32),
+            totals=evaluations[start:end, 3],
+            averages=evaluations[start:end, 4],
+            criteria_ids=pair_criteria[pair_starts[position]:pair_ends[position]],
+            scores=buffer[offsets[position]:offsets[position + 1]].reshape(end - start, int(widths[position]))
+        )
+    return slices
+
+def build_score_cube():
+    """بناء المكعب كاملاً من قاعدة البيانات (عند بدء التشغيل)"""
+    global _cube
+    cube = ScoreCube()
+    cube.criteria = _load_criteria()
+    cube.employees = _load_slices()
+    cube.built_at = datetime.utcnow()
+    with _lock:
+        _cube = cube
+    return cube
+
+def refresh_employees(employee_ids):
+    """إعادة قراءة شرائح موظفين محددين واستبدالها (يحذف الموظفين غير الموجودين)"""
+    cube = _cube
+    if cube is None or not employee_ids:
+        return
+    employee_ids = set(employee_ids)
+    with _refresh_lock:
+        slices = _load_slices(employee_ids)
+        with _lock:
+            for employee_id in employee_ids:
+                if employee_id in slices:
+                    cube.employees[employee_id] = slices[employee_id]
+                else:
+                    cube.employees.pop(employee_id, None)
+            cube.refreshes += 1
+
+def refresh_departments(department_ids):
+    """إعادة قراءة أسماء المعايير وشرائح موظفي الإدارات بعد تغيير اسمها أو معاييرها"""
+    cube = _cube
+    if cube is None or not department_ids:
+        return
+    with _refresh_lock:
+        criteria = _load_criteria()
+        with _lock:
+            cube.criteria = criteria
+            employee_ids = {
+                employee_id
+                for employee_id, employee_slice in cube.employees.items()
+                if employee_slice.department_id in department_ids
+            }
+        refresh_employees(employee_ids)
+
+def get_chart_series(employee_id, start=None, end=None):
+    """بيانات الرسم البياني لموظف من المكعب أو None إذا لم يكن محملاً
+
+    start و end تمثل (السنة، الشهر) وتُرجع (بيانات الموظف، قائمة
+    (السنة، الشهر، المجموع، المتوسط، [(اسم المعيار، الدرجة)])).
+    """
+    cube = _cube
+    if cube is None:
+        return None
+    with _lock:
+        employee_slice = cube.employees.get(employee_id)
+        if employee_slice is None:
+            return None
+        names = cube.criteria
+
+    periods = employee_slice.periods
+    low = np.searchsorted(periods, _period_code(*start)) if start else 0
+    high = np.searchsorted(periods, _period_code(*end), side='right') if end else periods.size
+
+    criteria_ids = employee_slice.criteria_ids.tolist()
+    series = []
+    for row in range(low, high):
+        year, month_index = divmod(int(periods[row]), 12)
+        scores = employee_slice.scores[row]
+        # المعايير المحذوفة لا تظهر، كما في قراءة قاعدة البيانات
+        series.append((
+            year, month_index + 1,
+            float(employee_slice.totals[row]), float(employee_slice.averages[row]),
+            [
+                (names[criteria_ids[column]], float(scores[column]))
+                for column in np.flatnonzero(~np.isnan(scores)).tolist()
+                if criteria_ids[column] in names
+            ]
+        ))
+    return employee_slice.info, series
+
+def get_employee_summaries():
+    """ملخص تقييمات الموظفين من المكعب أو None إذا لم يكن محملاً
+
+    صفوف بنفس أعمدة select_employee_summaries وترتيبها: (المعرف، الاسم، الرقم،
+    المسمى، اسم الإدارة، عدد التقييمات، مجموع المتوسطات أو None).
+    """
+    cube = _cube
+    if cube is None:
+        return None
+    with _lock:
+        slices = sorted(cube.employees.items())
+
+    rows = []
+    for employee_id, employee_slice in slices:
+        info = employee_slice.info
+        count = employee_slice.averages.size
+        rows.append((
+            employee_id, info['full_name'], info['employee_number'], info['job_title'],
+            info['department_name'], count,
+            math.fsum(employee_slice.averages.tolist()) if count else None
+        ))
+    return rows
+
+def get_period_values(year, month=None, criteria_id=None):
+    """قيمة كل موظف في شهر أو سنة من المكعب أو None إذا لم يكن محملاً
+
+    القيمة متوسط التقييم أو درجة المعيار المحدد، وللسنة الكاملة متوسط قيمها
+    الشهرية. تُرجع قائمة (بيانات الموظف، القيمة، عدد التقييمات) للموظفين الذين
+    لهم قيمة فقط، كما في _period_values في خدمة الترتيب.
+    """
+    cube = _cube
+    if cube is None:
+        return None
+    with _lock:
+        slices = list(cube.employees.values())
+
+    low_code = _period_code(year, month or 1)
+    high_code = _period_code(year, month or 12)
+    values = []
+    for employee_slice in slices:
+        periods = employee_slice.periods
+        low = np.searchsorted(periods, low_code)
+        high = np.searchsorted(periods, high_code, side='right')
+        if low == high:
+            continue
+        if criteria_id is None:
+            period_values = employee_slice.averages[low:high]
+        else:
+            column = np.searchsorted(employee_slice.criteria_ids, criteria_id)
+            if column == employee_slice.criteria_ids.size or employee_slice.criteria_ids[column] != criteria_id:
+                continue
+            period_values = employee_slice.scores[low:high, column]
+            period_values = period_values[~np.isnan(period_values)]
+            if not period_values.size:
+                continue
+        count = period_values.size
+        values.append((employee_slice.info, math.fsum(period_values.tolist()) / count, count))
+    return values
+
+def get_score_cube_stats():
+    """حجم المكعب واستهلاكه للذاكرة"""
+    cube = _cube
+    if cube is None:
+        return {'enabled': bool(current_app.config.get('SCORE_CUBE_ENABLED')), 'ready': False}
+    with _lock:
+        slices = list(cube.employees.values())
+        refreshes = cube.refreshes
+    cells = sum(employee_slice.scores.size for employee_slice in slices)
+    return {
+        'enabled': True,
+        'ready': True,
+        'built_at': cube.built_at.isoformat(),
+        'refreshes': refreshes,
+        'employees': len(slices),
+        'evaluations': sum(employee_slice.periods.size for employee_slice in slices),
+        'cells': cells,
+        'filled_cells': sum(int(np.count_nonzero(~np.isnan(employee_slice.scores))) for employee_slice in slices),
+        'array_bytes': sum(employee_slice.nbytes for employee_slice in slices)
+    }
+
+def check_score_cube():
+    """مقارنة بيانات الرسم البياني من المكعب بقراءتها من قاعدة البيانات
+
+    القراءة من قاعدة البيانات بنفس دالة مسار chart-data عند تعطيل المكعب،
+    وتُرجع الموظفين الذين تختلف بياناتهم أو سلسلة تقييماتهم.
+    """
+    cube = _cube
+    if cube is None:
+        return None
+    expected = {
+        employee.id: employee.to_dict()
+        for employee in Employee.query.options(*employee_department_options())
+    }
+    mismatched = set()
+
+    def compare(employee_id, evaluations):
+        if get_chart_series(employee_id) != (expected[employee_id], evaluations):
+            mismatched.add(employee_id)
+
+    unchecked = set(expected)
+    for employee_id, evaluations in iter_chart_series([]):
+        if employee_id in expected:
+            compare(employee_id, evaluations)
+            unchecked.discard(employee_id)
+    for employee_id in unchecked:
+        compare(employee_id, [])
+
+    with _lock:
+        mismatched.update(employee_id for employee_id in cube.employees if employee_id not in expected)
+
+    mismatched = sorted(mismatched)
+    return {
+        'consistent': not mismatched,
+        'checked': len(expected),
+        'mismatched_employee_ids': mismatched[:100],
+        'mismatched_count': len(mismatched)
+    }
+
+# ذاكرتا chart-data والمشاركة العامة تحذفان مدخلاتهما عند نفس الإشارات، وقد
+# يبني طلب متزامن استجابة من الشريحة القديمة قبل استبدالها ويخزنها بالجيل
+# الجديد. لذلك يُعاد الحذف (وزيادة الجيل) بعد تحديث المكعب فتُرفض أو تُحذف أي
+# استجابة بُنيت قبله.
+
+@evaluations_changed.connect
+def _on_evaluations_changed(sender, periods=(), **extra):
+    if _cube is not None:
+        refresh_employees({employee_id for employee_id, _ in periods})
+        chart_cache.invalidate_evaluation_periods(periods)
+        public_share_cache.invalidate_public_share()
+
+@employees_changed.connect
+def _on_employees_changed(sender, employee_ids=(), **extra):
+    if _cube is not None:
+        refresh_employees(employee_ids)
+        chart_cache.invalidate_employees(employee_ids)
+        public_share_cache.invalidate_public_share()
+
+@departments_changed.connect
+def _on_departments_changed(sender, department_ids=(), **extra):
+    if _cube is not None:
+        refresh_departments(set(department_ids))
+        chart_cache.invalidate_departments(department_ids)
+        public_share_cache.invalidate_public_share()
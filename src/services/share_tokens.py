@@ -0,0 +1,116 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import hashlib
+import secrets
+import threading
+import time
+from flask import current_app
+from sqlalchemy import delete
+from src.models.user import db
+from src.models.share_token import ShareToken
+from src.models.signals import employees_changed
+
+# رموز روابط المشاركة
+# يُعطى الرمز للمستخدم مرة واحدة ويُحفظ في قاعدة البيانات بصمته (SHA-256) فقط.
+# الرموز المستخدمة بكثرة تُحفظ في ذاكرة LRU داخل العملية فيُحل الرمز دون
+# استعلام، وتُحذف الرموز المنتهية من الجدول بتنظيف دوري عند الإنشاء والحل.
+SHARE_SCOPES = ('employee', 'public')
+DEFAULT_SHARE_TOKEN_TTL_DAYS = 30
+MAX_SHARE_TOKEN_TTL_DAYS = 365
+DEFAULT_SHARE_TOKEN_CACHE_MAX_ENTRIES = 10000
+# أقل مدة بالثواني بين عمليتي تنظيف
+DEFAULT_SHARE_TOKEN_SWEEP_INTERVAL = 3600
+
+_lock = threading.Lock()
+# {بصمة الرمز: (النطاق، معرف الموظف، وقت انتهاء الصلاحية)}
+_entries = OrderedDict()
+_last_sweep = None
+
+def hash_share_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def create_share_token(scope, employee_id=None, ttl_days=None):
+    """إنشاء رمز مشاركة وحفظ بصمته، وإرجاع (الرمز، سجل الرمز)"""
+    if ttl_days is None:
+        ttl_days = current_app.config.get('SHARE_TOKEN_TTL_DAYS', DEFAULT_SHARE_TOKEN_TTL_DAYS)
+    token = secrets.token_urlsafe(24)
+    share_token = ShareToken(
+        token_hash=hash_share_token(token),
+        scope=scope,
+        employee_id=employee_id,
+        expires_at=datetime.utcnow() + timedelta(days=ttl_days)
+    )
+    db.session.add(share_token)
+    db.session.commit()
+    sweep_expired_share_tokens()
+    return token, share_token
+
+def resolve_share_token(token, scope):
+    """حل الرمز إلى (صالح، معرف الموظف) حيث معرف الموظف None للرمز العام
+
+    يُرفض الرمز غير المعروف أو المنتهي أو الخاص بنطاق آخر.
+    """
+    key = hash_share_token(token)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+
+    if entry is None:
+        sweep_expired_share_tokens()
+        row = db.session.query(ShareToken.scope, ShareToken.employee_id, ShareToken.expires_at)\
+            .filter(ShareToken.token_hash == key).first()
+        if row is None:
+            return False, None
+        entry = tuple(row)
+        max_entries = current_app.config.get(
+            'SHARE_TOKEN_CACHE_MAX_ENTRIES', DEFAULT_SHARE_TOKEN_CACHE_MAX_ENTRIES
+        )
+        with _lock:
+            _entries[key] = entry
+            while len(_entries) > max_entries:
+                _entries.popitem(last=False)
+
+    entry_scope, employee_id, expires_at = entry
+    if expires_at <= datetime.utcnow():
+        with _lock:
+            _entries.pop(key, None)
+        return False, None
+    if entry_scope != scope:
+        return False, None
+    return True, employee_id
+
+def sweep_expired_share_tokens(force=False):
+    """حذف الرموز المنتهية من الجدول والذاكرة إذا مضت مدة التنظيف منذ آخر مرة"""
+    global _last_sweep
+    interval = current_app.config.get('SHARE_TOKEN_SWEEP_INTERVAL', DEFAULT_SHARE_TOKEN_SWEEP_INTERVAL)
+    with _lock:
+        if not force and _last_sweep is not None and time.monotonic() - _last_sweep < interval:
+            return 0
+        _last_sweep = time.monotonic()
+
+    now = datetime.utcnow()
+    result = db.session.execute(
+        delete(ShareToken).where(ShareToken.expires_at <= now),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    with _lock:
+        for key in [key for key, entry in _entries.items() if entry[2] <= now]:
+            del _entries[key]
+    return result.rowcount
+
+def delete_employee_share_tokens(employee_ids):
+    """حذف رموز الموظفين ضمن معاملة الكتابة الحالية (عند حذف الموظف)"""
+    db.session.execute(
+        delete(ShareToken).where(ShareToken.employee_id.in_(list(employee_ids))),
+        execution_options={'synchronize_session': False}
+    )
+
+@employees_changed.connect
+def _on_employees_changed(sender, employee_ids=(), **extra):
+    """إسقاط رموز الموظفين من الذاكرة لتُقرأ من الجدول (تُحذف مع حذف الموظف)"""
+    employee_ids = set(employee_ids)
+    with _lock:
+        for key in [key for key, entry in _entries.items() if entry[1] in employee_ids]:
+            del _entries[key]
@@ -0,0 +1,96 @@
+import pytest
+from flask import Flask
+from src.models.user import db
+from src.models.data_version import ensure_data_version
+from src.models.migrations import run_migrations
+from src.models.sqlite_tuning import load_sqlite_pragmas, configure_sqlite_engine
+from src.routes.department import department_bp
+from src.routes.employee import employee_bp
+from src.routes.evaluation import evaluation_bp
+from src.routes.export import export_bp
+from src.routes.evaluation_import import import_bp
+from src.routes.leaderboard import leaderboard_bp
+from src.routes.share import share_bp
+from src.routes.settings import settings_bp
+from src.services import (
+    chart_cache, percentile_index, score_cube, public_share_cache, share_tokens, export_jobs
+)
+
+def create_test_app(database_uri, data_dir, **config):
+    """تطبيق بنفس تسجيل المسارات وتهيئة قاعدة البيانات في main.py"""
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=database_uri,
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        SQLITE_PRAGMAS=load_sqlite_pragmas(),
+        EXPORT_CACHE_DIR=str(data_dir / 'export_cache'),
+        EXPORT_JOBS_DIR=str(data_dir / 'exports'),
+    )
+    app.config.update(config)
+
+    app.register_blueprint(department_bp, url_prefix='/api')
+    app.register_blueprint(employee_bp, url_prefix='/api')
+    app.register_blueprint(evaluation_bp, url_prefix='/api')
+    app.register_blueprint(export_bp, url_prefix='/api')
+    app.register_blueprint(import_bp, url_prefix='/api')
+    app.register_blueprint(leaderboard_bp, url_prefix='/api')
+    app.register_blueprint(share_bp)
+    app.register_blueprint(settings_bp)
+
+    db.init_app(app)
+    with app.app_context():
+        configure_sqlite_engine(db.engine, app.config['SQLITE_PRAGMAS'])
+        db.create_all()
+        run_migrations(db.engine)
+        ensure_data_version()
+    return app
+
+def reset_in_memory_caches():
+    """تفريغ الذواكر المؤقتة على مستوى الوحدات حتى لا تنتقل بين الاختبارات"""
+    with chart_cache._lock:
+        chart_cache._entries.clear()
+        chart_cache._employee_departments.clear()
+        chart_cache._generations.clear()
+        chart_cache._department_changes.clear()
+        chart_cache._sequence = 0
+        for name in chart_cache._counters:
+            chart_cache._counters[name] = 0
+    with percentile_index._lock:
+        percentile_index._index = None
+    with score_cube._lock:
+        score_cube._cube = None
+    public_share_cache.invalidate_public_share()
+    with share_tokens._lock:
+        share_tokens._entries.clear()
+        share_tokens._last_sweep = None
+    with export_jobs._cleanup_lock:
+        export_jobs._last_cleanup = None
+
+@pytest.fixture(autouse=True)
+def _reset_caches():
+    reset_in_memory_caches()
+    yield
+    reset_in_memory_caches()
+
+@pytest.fixture
+def app(tmp_path):
+    """تطبيق على قاعدة SQLite في الذاكرة"""
+    app = create_test_app('sqlite://', tmp_path)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def file_app(tmp_path):
+    """تطبيق على ملف SQLite بإعدادات WAL الافتراضية لاختبارات التزامن"""
+    app = create_test_app(f"sqlite:///{tmp_path / 'app.db'}", tmp_path)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
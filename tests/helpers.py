@@ -0,0 +1,72 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from src.models.user import db
+
+# إدارة المبيعات في الإدارات الافتراضية (8 معايير)
+SALES_DEPARTMENT_ID = 2
+
+def init_departments(client):
+    """تهيئة الإدارات الافتراضية وإرجاع {معرف الإدارة: قائمة معاييرها}"""
+    response = client.post('/api/init-departments')
+    assert response.status_code in (200, 201), response.get_json()
+    return {
+        department['id']: client.get(f"/api/departments/{department['id']}/criteria").get_json()
+        for department in client.get('/api/departments').get_json()
+    }
+
+def create_employee(client, number, department_id=SALES_DEPARTMENT_ID):
+    response = client.post('/api/employees', json={
+        'employee_number': number,
+        'full_name': f'موظف {number}',
+        'job_title': 'محاسب',
+        'department_id': department_id
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['id']
+
+def evaluation_item(employee_id, year, month, criteria, score=None):
+    """عنصر تقييم بدرجة ثابتة أو درجات متغيرة حسب الموظف والشهر والمعيار"""
+    return {
+        'employee_id': employee_id,
+        'evaluation_year': year,
+        'evaluation_month': month,
+        'scores': [
+            {
+                'criteria_id': criterion['id'],
+                'score': score if score is not None else (employee_id + month + criterion['id']) % 5 + 1
+            }
+            for criterion in criteria
+        ]
+    }
+
+def create_evaluations(client, employee_ids, criteria, years=(2024,), months=range(1, 13)):
+    """إنشاء تقييمات الموظفين عبر مسار الإدخال المجمع"""
+    items = [
+        evaluation_item(employee_id, year, month, criteria)
+        for employee_id in employee_ids
+        for year in years
+        for month in months
+    ]
+    response = client.post('/api/evaluations/bulk', json={'evaluations': items})
+    assert response.status_code == 201, response.get_json()
+    assert not response.get_json()['errors']
+    return response.get_json()['evaluation_ids']
+
+@contextmanager
+def count_queries(app):
+    """تسجيل جمل SQL المنفذة داخل الكتلة"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+def select_count(statements):
+    return sum(1 for statement in statements if statement.lstrip().upper().startswith('SELECT'))
@@ -0,0 +1,84 @@
+import pytest
+from tests.helpers import (
+    SALES_DEPARTMENT_ID, init_departments, create_employee, evaluation_item, count_queries
+)
+
+def _insert_count(statements, table):
+    return sum(
+        1 for statement in statements
+        if statement.lstrip().upper().startswith(f'INSERT INTO {table.upper()}')
+    )
+
+@pytest.fixture
+def sales(client):
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    employee_ids = [create_employee(client, f'B{number:03d}') for number in range(20)]
+    return criteria, employee_ids
+
+@pytest.mark.parametrize('score', [None, '5', True, 6, -1, [3]])
+def test_create_rejects_invalid_score(client, sales, score):
+    criteria, employee_ids = sales
+    item = evaluation_item(employee_ids[0], 2024, 1, criteria)
+    item['scores'][0]['score'] = score
+
+    response = client.post('/api/evaluations', json=item)
+    assert response.status_code == 400
+    assert 'الدرجة' in response.get_json()['error']
+
+    response = client.post('/api/evaluations/bulk', json={'evaluations': [item]})
+    assert response.status_code == 400
+    assert response.get_json()['errors'][0]['index'] == 0
+
+def test_create_accepts_numeric_strings_for_keys(client, sales):
+    criteria, employee_ids = sales
+    item = evaluation_item(employee_ids[0], 2024, 1, criteria)
+    item.update(
+        employee_id=str(employee_ids[0]), evaluation_month='1', evaluation_year='2024'
+    )
+
+    response = client.post('/api/evaluations', json=item)
+    assert response.status_code == 201, response.get_json()
+    body = response.get_json()
+    assert (body['employee_id'], body['evaluation_month'], body['evaluation_year']) == \
+        (employee_ids[0], 1, 2024)
+
+    response = client.post('/api/evaluations', json=item)
+    assert response.status_code == 400
+
+def test_bulk_reports_string_key_duplicates_per_item(client, sales):
+    criteria, employee_ids = sales
+    response = client.post('/api/evaluations', json=evaluation_item(employee_ids[0], 2024, 1, criteria))
+    assert response.status_code == 201
+
+    duplicate = evaluation_item(employee_ids[0], 2024, 1, criteria)
+    duplicate.update(employee_id=str(employee_ids[0]), evaluation_month='1', evaluation_year='2024')
+    items = [
+        duplicate,
+        evaluation_item(employee_ids[0], 2024, 2, criteria),
+        dict(evaluation_item(employee_ids[1], 2024, 2, criteria), evaluation_month='شهر'),
+    ]
+
+    response = client.post('/api/evaluations/bulk', json={'evaluations': items})
+    assert response.status_code == 201, response.get_json()
+    body = response.get_json()
+    assert body['created'] == 1
+    assert [error['index'] for error in body['errors']] == [0, 2]
+
+def test_bulk_inserts_all_items_in_one_statement_per_table(app, client, sales):
+    criteria, employee_ids = sales
+    items = [evaluation_item(employee_id, 2024, 1, criteria) for employee_id in employee_ids]
+
+    with count_queries(app) as statements:
+        response = client.post('/api/evaluations/bulk', json={'evaluations': items})
+    assert response.status_code == 201, response.get_json()
+    assert response.get_json()['created'] == len(items)
+    assert _insert_count(statements, 'monthly_evaluations') == 1
+    assert _insert_count(statements, 'evaluation_scores') == 1
+
+    # المسار الفردي يحتاج عبارتي إدراج لكل تقييم
+    with count_queries(app) as statements:
+        for employee_id in employee_ids:
+            response = client.post('/api/evaluations', json=evaluation_item(employee_id, 2024, 2, criteria))
+            assert response.status_code == 201
+    assert _insert_count(statements, 'monthly_evaluations') == len(employee_ids)
+    assert _insert_count(statements, 'evaluation_scores') == len(employee_ids)
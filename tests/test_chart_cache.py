@@ -0,0 +1,234 @@
+import threading
+import pytest
+from src.routes import evaluation as evaluation_routes
+from src.services import percentile_index
+from tests.helpers import SALES_DEPARTMENT_ID, init_departments, create_employee, create_evaluations
+
+HR_DEPARTMENT_ID = 1
+
+@pytest.fixture
+def cached(client):
+    """موظفان في المبيعات وموظف في الموارد البشرية بتقييمات 2023 و 2024"""
+    departments = init_departments(client)
+    sales = [create_employee(client, f'H{number:03d}') for number in range(2)]
+    hr = create_employee(client, 'H100', HR_DEPARTMENT_ID)
+    evaluation_ids = create_evaluations(client, sales, departments[SALES_DEPARTMENT_ID], years=(2023, 2024), months=(1, 2))
+    create_evaluations(client, [hr], departments[HR_DEPARTMENT_ID], years=(2023, 2024), months=(1, 2))
+    return client, departments, sales, hr, evaluation_ids
+
+def _get(client, employee_id, **params):
+    response = client.get(f'/api/employees/{employee_id}/evaluations/chart-data', query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.headers['X-Cache'], response.get_json()
+
+def _statuses(client, requests):
+    return [_get(client, employee_id, **params)[0] for employee_id, params in requests]
+
+def _stats(client):
+    response = client.get('/api/evaluations/chart-data/cache-stats')
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_peer_rank_change_invalidates_only_same_department_and_year(cached):
+    client, departments, (employee_id, peer_id), hr_id, evaluation_ids = cached
+    requests = [
+        (employee_id, {'year': 2024}),
+        (employee_id, {'year': 2023}),
+        (employee_id, {'from': '2023-06', 'to': '2024-03'}),
+        (employee_id, {'from': '2022-01', 'to': '2023-12'}),
+        (hr_id, {'year': 2024}),
+    ]
+    assert _statuses(client, requests) == ['MISS'] * 5
+    assert _statuses(client, requests) == ['HIT'] * 5
+    _, before = _get(client, employee_id, year=2024)
+
+    # تقييم الزميل في يناير 2024 (ترتيبه ضمن [0, 4] حسب الإدارة)
+    peer_evaluation_id = evaluation_ids[6]
+    response = client.put(f'/api/evaluations/{peer_evaluation_id}', json={
+        'scores': [{'criteria_id': criterion['id'], 'score': 5} for criterion in departments[SALES_DEPARTMENT_ID]]
+    })
+    assert response.status_code == 200
+    assert response.get_json()['evaluation_year'] == 2024
+
+    assert _statuses(client, requests) == ['MISS', 'HIT', 'MISS', 'HIT', 'HIT']
+    _, after = _get(client, employee_id, year=2024)
+    assert after['average_scores'] == before['average_scores']
+    assert after['percentile_ranks'][0]['rank'] == 2
+
+def test_moving_employee_invalidates_employee_and_new_peers(client, cached):
+    client, departments, (employee_id, peer_id), hr_id, _ = cached
+    requests = [(employee_id, {'year': 2024}), (peer_id, {'year': 2024}), (hr_id, {'year': 2024})]
+    assert _statuses(client, requests) == ['MISS'] * 3
+    _, hr_before = _get(client, hr_id, year=2024)
+    assert hr_before['percentile_ranks'][0]['department_count'] == 1
+
+    response = client.put(f'/api/employees/{employee_id}', json={'department_id': HR_DEPARTMENT_ID})
+    assert response.status_code == 200
+    assert _statuses(client, requests) == ['MISS'] * 3
+
+    _, moved = _get(client, employee_id, year=2024)
+    assert moved['employee']['department_id'] == HR_DEPARTMENT_ID
+    _, hr_after = _get(client, hr_id, year=2024)
+    assert hr_after['percentile_ranks'][0]['department_count'] == 2
+    _, peer_after = _get(client, peer_id, year=2024)
+    assert peer_after['percentile_ranks'][0]['department_count'] == 1
+
+def test_renaming_department_or_criteria_invalidates(client, cached):
+    client, departments, (employee_id, _), hr_id, _ = cached
+    requests = [(employee_id, {'year': 2024}), (hr_id, {'year': 2024})]
+    assert _statuses(client, requests) == ['MISS'] * 2
+    _, before = _get(client, employee_id, year=2024)
+
+    criteria = [{'name': criterion['criteria_name']} for criterion in departments[SALES_DEPARTMENT_ID]]
+    response = client.put(f'/api/departments/{SALES_DEPARTMENT_ID}', json={'name': 'المبيعات', 'criteria': criteria})
+    assert response.status_code == 200
+    assert _statuses(client, requests) == ['MISS', 'HIT']
+    _, renamed = _get(client, employee_id, year=2024)
+    assert renamed['employee']['department_name'] == 'المبيعات'
+
+    # استبدال المعايير بأسماء جديدة
+    criteria[0] = {'name': 'معيار جديد'}
+    response = client.put(f'/api/departments/{SALES_DEPARTMENT_ID}', json={'name': 'المبيعات', 'criteria': criteria})
+    assert response.status_code == 200
+    assert _statuses(client, requests) == ['MISS', 'HIT']
+    _, after = _get(client, employee_id, year=2024)
+    assert after['criteria_scores'] != before['criteria_scores']
+
+def test_stats_count_hits_misses_invalidations_and_evictions(app, cached):
+    client, departments, (employee_id, peer_id), hr_id, evaluation_ids = cached
+    app.config.update(CHART_CACHE_MAX_ENTRIES=2)
+    assert _stats(client) == {
+        'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0, 'entries': 0, 'hit_ratio': 0
+    }
+
+    _statuses(client, [(employee_id, {'year': 2024}), (employee_id, {'year': 2023})])
+    _statuses(client, [(employee_id, {'year': 2024})] * 3)
+    assert _stats(client) == {
+        'hits': 3, 'misses': 2, 'invalidations': 0, 'evictions': 0, 'entries': 2, 'hit_ratio': 0.6
+    }
+
+    # مدخل ثالث يُخلي الأقدم استخداماً (2023)
+    assert _statuses(client, [(hr_id, {'year': 2024}), (employee_id, {'year': 2024}),
+                              (employee_id, {'year': 2023})]) == ['MISS', 'HIT', 'MISS']
+    stats = _stats(client)
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['entries']) == (4, 4, 2, 2)
+
+    # تعديل تقييم الموظف في 2023 يحذف مدخله فقط
+    response = client.put(f'/api/evaluations/{evaluation_ids[0]}', json={
+        'scores': [{'criteria_id': criterion['id'], 'score': 1} for criterion in departments[SALES_DEPARTMENT_ID]]
+    })
+    assert response.status_code == 200
+    stats = _stats(client)
+    assert (stats['invalidations'], stats['entries']) == (1, 1)
+
+def test_first_request_for_peer_rejects_rank_read_before_index_update(file_app, monkeypatch):
+    client = file_app.test_client()
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    employee_id = create_employee(client, 'W001')
+    peer_id = create_employee(client, 'W002')
+    evaluation_ids = create_evaluations(client, [employee_id], criteria, months=(1,))
+    client.put(f'/api/evaluations/{evaluation_ids[0]}', json={
+        'scores': [{'criteria_id': criterion['id'], 'score': 5} for criterion in criteria]
+    })
+    response = client.post('/api/evaluations', json={
+        'employee_id': peer_id, 'evaluation_year': 2024, 'evaluation_month': 1,
+        'scores': [{'criteria_id': criterion['id'], 'score': 3} for criterion in criteria]
+    })
+    assert response.status_code == 201
+    # يبني فهرس الترتيب، ولم يُطلب الزميل بعد فلا تعرف الذاكرة إدارته
+    assert _get(client, employee_id, year=2024)[0] == 'MISS'
+
+    # أول طلب للزميل يقرأ ترتيبه بعد الكتابة وقبل تحديث فهرس الترتيب، ويخزن بعده
+    rank_read = threading.Event()
+    index_updated = threading.Event()
+    peer_responses = []
+    route_percentile_rank = evaluation_routes.percentile_rank
+    def percentile_rank_then_wait(*args):
+        rank = route_percentile_rank(*args)
+        if threading.current_thread().name == 'peer':
+            rank_read.set()
+            index_updated.wait(5)
+        return rank
+    monkeypatch.setattr(evaluation_routes, 'percentile_rank', percentile_rank_then_wait)
+
+    update_employees = percentile_index._update_employees
+    def update_during_peer_request(employee_ids, years=None):
+        peer = threading.Thread(
+            target=lambda: peer_responses.append(_get(file_app.test_client(), peer_id, year=2024)), name='peer'
+        )
+        peer.start()
+        rank_read.wait(5)
+        update_employees(employee_ids, years)
+        index_updated.set()
+        peer.join(5)
+    monkeypatch.setattr(percentile_index, '_update_employees', update_during_peer_request)
+
+    response = client.put(f'/api/evaluations/{evaluation_ids[0]}', json={
+        'scores': [{'criteria_id': criterion['id'], 'score': 1} for criterion in criteria]
+    })
+    assert response.status_code == 200
+    assert [(status, payload['percentile_ranks'][0]['rank']) for status, payload in peer_responses] == [('MISS', 2)]
+
+    status, payload = _get(client, peer_id, year=2024)
+    assert (status, payload['percentile_ranks'][0]['rank']) == ('MISS', 1)
+    assert _get(client, peer_id, year=2024)[0] == 'HIT'
+
+def test_range_spanning_years(cached):
+    client, departments, (employee_id, _), _, _ = cached
+    _, year_2023 = _get(client, employee_id, year=2023)
+    _, year_2024 = _get(client, employee_id, year=2024)
+
+    _, spanning = _get(client, employee_id, **{'from': '2023-02', 'to': '2024-01'})
+    assert spanning['year'] is None
+    assert (spanning['from'], spanning['to']) == ('2023-02', '2024-01')
+    assert spanning['periods'] == ['2023-02', '2024-01']
+    assert spanning['average_scores'] == [year_2023['average_scores'][1], year_2024['average_scores'][0]]
+    assert spanning['percentile_ranks'] == [year_2023['percentile_ranks'][1], year_2024['percentile_ranks'][0]]
+
+    # مدى مفتوح من أحد طرفيه، ومدى بشهر واحد
+    _, open_end = _get(client, employee_id, **{'from': '2023-02'})
+    assert (open_end['periods'], open_end['to']) == (['2023-02', '2024-01', '2024-02'], None)
+    _, open_start = _get(client, employee_id, to='2023-01')
+    assert (open_start['periods'], open_start['from']) == (['2023-01'], None)
+    _, single = _get(client, employee_id, **{'from': '2024-02', 'to': '2024-02'})
+    assert single['periods'] == ['2024-02']
+
+    _, quarters = _get(client, employee_id, resolution='quarter', **{'from': '2023-01', 'to': '2024-12'})
+    assert quarters['periods'] == ['2023-Q1', '2024-Q1']
+
+def test_range_takes_precedence_over_year(cached):
+    client, departments, (employee_id, _), _, _ = cached
+    _, by_year = _get(client, employee_id, year=2023)
+    _, by_range = _get(client, employee_id, year=2023, **{'from': '2024-01', 'to': '2024-02'})
+    assert by_year['periods'] == ['2023-01', '2023-02']
+    assert by_range['year'] is None
+    assert by_range['periods'] == ['2024-01', '2024-02']
+    # يُخزن كل منهما تحت مفتاحه فلا يعيد أحدهما استجابة الآخر
+    assert _get(client, employee_id, year=2023) == ('HIT', by_year)
+    assert _get(client, employee_id, **{'from': '2024-01', 'to': '2024-02'}) == ('HIT', by_range)
+
+@pytest.mark.parametrize('params', [
+    {'from': '2024'},
+    {'from': '2024-13'},
+    {'from': '2024-00'},
+    {'to': 'abc'},
+    {'to': ''},
+    {'from': '2024-01-01'},
+    {'from': '2024-01', 'to': '2024'},
+    {'year': 2024, 'to': '2024/02'},
+])
+def test_malformed_range_is_rejected(cached, params):
+    client, _, (employee_id, _), _, _ = cached
+    response = client.get(f'/api/employees/{employee_id}/evaluations/chart-data', query_string=params)
+    assert response.status_code == 400
+    assert 'YYYY-MM' in response.get_json()['error']
+
+def test_range_start_after_end_is_rejected(cached):
+    client, _, (employee_id, _), _, _ = cached
+    for url in (f'/api/employees/{employee_id}/evaluations/chart-data',
+                f'/api/departments/{SALES_DEPARTMENT_ID}/evaluations/chart-data'):
+        for params in ({'from': '2024-02', 'to': '2024-01'}, {'from': '2024-01', 'to': '2023-12'}):
+            response = client.get(url, query_string=params)
+            assert response.status_code == 400
+            assert 'from' in response.get_json()['error']
+    assert _stats(client)['entries'] == 0
@@ -0,0 +1,61 @@
+import threading
+from collections import Counter
+from src.models.user import db
+from src.models.evaluation import MonthlyEvaluation
+from tests.helpers import SALES_DEPARTMENT_ID, init_departments, create_employee, evaluation_item
+
+THREADS = 8
+
+def test_concurrent_creates_and_updates_keep_one_evaluation_per_period(file_app):
+    client = file_app.test_client()
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    employee_ids = [create_employee(client, f'S{number:03d}') for number in range(4)]
+    periods = [(employee_id, month) for employee_id in employee_ids for month in (1, 2, 3)]
+
+    barrier = threading.Barrier(THREADS)
+    lock = threading.Lock()
+    results = []
+
+    def submit(worker):
+        worker_client = file_app.test_client()
+        barrier.wait()
+        # كل خيط يرسل نفس الفترات بترتيب مختلف ثم يعدل ما أنشأه
+        for employee_id, month in periods[worker:] + periods[:worker]:
+            response = worker_client.post(
+                '/api/evaluations', json=evaluation_item(employee_id, 2024, month, criteria)
+            )
+            body = response.get_json()
+            with lock:
+                results.append(('create', (employee_id, month), response.status_code, body))
+            if response.status_code == 201:
+                response = worker_client.put(f"/api/evaluations/{body['id']}", json={
+                    'scores': [{'criteria_id': criterion['id'], 'score': 4} for criterion in criteria]
+                })
+                with lock:
+                    results.append(('update', (employee_id, month), response.status_code, response.get_json()))
+
+    threads = [threading.Thread(target=submit, args=(worker,)) for worker in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    assert not any(thread.is_alive() for thread in threads)
+
+    failures = [result for result in results if result[2] >= 500]
+    assert not failures, failures[:3]
+    assert not any('locked' in str(result[3]) for result in results)
+
+    created = Counter(period for kind, period, status, body in results if kind == 'create' and status == 201)
+    assert created == Counter({period: 1 for period in periods})
+    rejected = [result for result in results if result[0] == 'create' and result[2] != 201]
+    assert len(rejected) == len(periods) * (THREADS - 1)
+    assert all(status == 400 for kind, period, status, body in rejected)
+    assert all(result[2] == 200 for result in results if result[0] == 'update')
+
+    with file_app.app_context():
+        rows = db.session.query(
+            MonthlyEvaluation.employee_id, MonthlyEvaluation.evaluation_month, MonthlyEvaluation.average_score
+        ).all()
+    assert Counter((employee_id, month) for employee_id, month, average in rows) == \
+        Counter({period: 1 for period in periods})
+    assert all(average == 4 for employee_id, month, average in rows)
@@ -0,0 +1,127 @@
+import statistics
+import threading
+from collections import Counter
+import pytest
+from src.models.user import db
+from src.models.employee import Employee
+from src.models.evaluation import MonthlyEvaluation, EvaluationScore
+from tests.helpers import SALES_DEPARTMENT_ID, init_departments, create_employee, create_evaluations
+
+def _reference(values, max_score):
+    """إحصائيات التوزيع بمكتبة statistics للمقارنة"""
+    deciles = statistics.quantiles(values, n=10, method='inclusive')
+    counts = Counter(round(value) for value in values)
+    return {
+        'count': len(values),
+        'mean': pytest.approx(statistics.fmean(values), abs=1e-4),
+        'median': pytest.approx(statistics.median(values), abs=1e-4),
+        'std': pytest.approx(statistics.pstdev(values), abs=1e-4),
+        'p10': pytest.approx(deciles[0], abs=1e-4),
+        'p90': pytest.approx(deciles[8], abs=1e-4),
+        'histogram': {'bins': list(range(max_score + 1)), 'counts': [counts[score] for score in range(max_score + 1)]}
+    }
+
+def _load_scores(app, department_id):
+    """{(السنة، الشهر): [(معرف الموظف، معرف المعيار، الدرجة)]} من قاعدة البيانات"""
+    with app.app_context():
+        rows = db.session.query(
+            MonthlyEvaluation.evaluation_year, MonthlyEvaluation.evaluation_month,
+            MonthlyEvaluation.employee_id, EvaluationScore.criteria_id, EvaluationScore.score
+        ).join(Employee, Employee.id == MonthlyEvaluation.employee_id)\
+            .join(EvaluationScore, EvaluationScore.evaluation_id == MonthlyEvaluation.id)\
+            .filter(Employee.department_id == department_id).all()
+    scores = {}
+    for year, month, employee_id, criteria_id, score in rows:
+        scores.setdefault((year, month), []).append((employee_id, criteria_id, score))
+    return scores
+
+def _evaluation_averages(rows):
+    by_employee = {}
+    for employee_id, criteria_id, score in rows:
+        by_employee.setdefault(employee_id, []).append(score)
+    return [statistics.fmean(values) for values in by_employee.values()]
+
+@pytest.fixture
+def seeded(file_app):
+    client = file_app.test_client()
+    departments = init_departments(client)
+    criteria = departments[SALES_DEPARTMENT_ID]
+    employee_ids = [create_employee(client, f'A{number:03d}') for number in range(9)]
+    create_evaluations(client, employee_ids, criteria, years=(2023,), months=(12,))
+    create_evaluations(client, employee_ids, criteria, months=range(1, 7))
+    # إدارة أخرى لا يجب أن تدخل في الإحصائيات
+    other_department = next(department_id for department_id in departments if department_id != SALES_DEPARTMENT_ID)
+    other_ids = [create_employee(client, f'O{number:03d}', other_department) for number in range(3)]
+    create_evaluations(client, other_ids, departments[other_department], months=range(1, 7))
+    return criteria, employee_ids
+
+def _fetch_concurrently(app, urls):
+    lock = threading.Lock()
+    results = {}
+    barrier = threading.Barrier(len(urls))
+
+    def fetch(index, url):
+        worker_client = app.test_client()
+        barrier.wait()
+        response = worker_client.get(url)
+        with lock:
+            results[index] = (response.status_code, response.get_json())
+
+    workers = [threading.Thread(target=fetch, args=item) for item in enumerate(urls)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+    return [results[index] for index in range(len(urls))]
+
+def test_month_analytics_match_reference_under_concurrency(file_app, seeded):
+    criteria, employee_ids = seeded
+    scores = _load_scores(file_app, SALES_DEPARTMENT_ID)
+    urls = [f'/api/departments/{SALES_DEPARTMENT_ID}/analytics?year=2024&month={month}' for month in (1, 3)] * 4
+
+    for status, body in _fetch_concurrently(file_app, urls):
+        assert status == 200, body
+        month = body['month']
+        current, previous = scores[(2024, month)], scores[(2024, month - 1) if month > 1 else (2023, 12)]
+        assert body['employee_count'] == len(employee_ids)
+        assert body['evaluation_count'] == len(employee_ids)
+
+        for result, criterion in zip(body['criteria'], criteria):
+            assert result['criteria_id'] == criterion['id']
+            values = [score for _, criteria_id, score in current if criteria_id == criterion['id']]
+            previous_values = [score for _, criteria_id, score in previous if criteria_id == criterion['id']]
+            assert {key: result[key] for key in _reference(values, 5)} == _reference(values, 5)
+            assert result['mom_delta'] == pytest.approx(
+                statistics.fmean(values) - statistics.fmean(previous_values), abs=1e-4
+            )
+
+        averages = _evaluation_averages(current)
+        assert {key: body['overall'][key] for key in _reference(averages, 5)} == _reference(averages, 5)
+
+def test_year_analytics_match_reference(file_app, seeded):
+    criteria, employee_ids = seeded
+    scores = _load_scores(file_app, SALES_DEPARTMENT_ID)
+    urls = [f'/api/departments/{SALES_DEPARTMENT_ID}/analytics?year=2024'] * 4
+    responses = _fetch_concurrently(file_app, urls)
+    assert all(response == responses[0] for response in responses)
+
+    status, body = responses[0]
+    assert status == 200, body
+    months = range(1, 7)
+    assert body['evaluation_count'] == len(employee_ids) * len(months)
+
+    averages = [average for month in months for average in _evaluation_averages(scores[(2024, month)])]
+    assert {key: body['overall'][key] for key in _reference(averages, 5)} == _reference(averages, 5)
+
+    monthly_means = [statistics.fmean(_evaluation_averages(scores[(2024, month)])) for month in months]
+    assert body['overall']['monthly_means'][:6] == pytest.approx(monthly_means, abs=1e-4)
+    assert body['overall']['monthly_means'][6:] == [None] * 6
+    december = statistics.fmean(_evaluation_averages(scores[(2023, 12)]))
+    assert body['overall']['mom_deltas'][0] == pytest.approx(monthly_means[0] - december, abs=1e-4)
+
+    for result, criterion in zip(body['criteria'], criteria):
+        values = [
+            score for month in months
+            for _, criteria_id, score in scores[(2024, month)] if criteria_id == criterion['id']
+        ]
+        assert {key: result[key] for key in _reference(values, 5)} == _reference(values, 5)
@@ -0,0 +1,89 @@
+import csv
+import io
+import threading
+from src.models.user import db
+from src.models.employee import Employee
+from src.models.evaluation import MonthlyEvaluation
+from tests.helpers import SALES_DEPARTMENT_ID, init_departments
+
+def _import_csv(department, criteria, numbers, months=range(1, 4)):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['employee_number', 'full_name', 'job_title', 'department', 'year', 'month', 'criterion', 'score'])
+    for number in numbers:
+        for month in months:
+            for criterion in criteria:
+                writer.writerow([number, f'موظف {number}', 'محاسب', department, 2024, month, criterion['criteria_name'], 4])
+    return buffer.getvalue().encode('utf-8')
+
+def _sales(client):
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    department = next(
+        department['name'] for department in client.get('/api/departments').get_json()
+        if department['id'] == SALES_DEPARTMENT_ID
+    )
+    return department, criteria
+
+def test_concurrent_imports_create_each_evaluation_once(file_app):
+    file_app.config.update(IMPORT_BATCH_SIZE=24)
+    client = file_app.test_client()
+    department, criteria = _sales(client)
+    files = [
+        _import_csv(department, criteria, [f'I{number:03d}' for number in range(0, 10)]),
+        _import_csv(department, criteria, [f'I{number:03d}' for number in range(5, 15)]),
+    ]
+
+    barrier = threading.Barrier(len(files) * 2)
+    lock = threading.Lock()
+    reports = []
+
+    def upload(content):
+        worker_client = file_app.test_client()
+        barrier.wait()
+        response = worker_client.post(
+            '/api/import/evaluations',
+            data={'file': (io.BytesIO(content), 'evaluations.csv')},
+            content_type='multipart/form-data'
+        )
+        with lock:
+            reports.append((response.status_code, response.get_json()))
+
+    workers = [threading.Thread(target=upload, args=(content,)) for content in files * 2]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+
+    assert all(status in (201, 400) for status, report in reports), reports
+    assert sum(report['employees_created'] for status, report in reports) == 15
+    assert sum(report['evaluations_created'] for status, report in reports) == 15 * 3
+    # كل تقييم رُفض لأنه موجود مسبقاً يظهر في تقرير أحد الطلبات
+    duplicate_rows = sum(
+        1 for status, report in reports for error in report['errors']
+        if error['error'] == 'يوجد تقييم مسبق لهذا الموظف في نفس الشهر والسنة'
+    )
+    assert duplicate_rows == (40 * 3 - 15 * 3) * len(criteria)
+
+    with file_app.app_context():
+        assert db.session.query(Employee).count() == 15
+        assert db.session.query(MonthlyEvaluation).count() == 15 * 3
+
+def test_cli_import_warns_that_the_server_must_restart(app, client, tmp_path):
+    from src.routes.evaluation_import import CLI_IMPORT_RESTART_WARNING
+    department, criteria = _sales(client)
+    path = tmp_path / 'evaluations.csv'
+    path.write_bytes(_import_csv(department, criteria, ['C001', 'C002']))
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['import-evaluations', str(path), '--dry-run'])
+    assert result.exit_code == 0, result.output
+    assert CLI_IMPORT_RESTART_WARNING not in result.output
+
+    result = runner.invoke(args=['import-evaluations', str(path)])
+    assert result.exit_code == 0, result.output
+    assert 'تقييمات: 6' in result.output
+    assert CLI_IMPORT_RESTART_WARNING in result.output
+
+    # لا شيء جديد في الاستيراد الثاني فلا حاجة للتنبيه
+    result = runner.invoke(args=['import-evaluations', str(path)])
+    assert CLI_IMPORT_RESTART_WARNING not in result.output
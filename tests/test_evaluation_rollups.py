@@ -0,0 +1,166 @@
+import pytest
+from sqlalchemy import select
+from src.models.user import db
+from src.models.evaluation_rollup import EvaluationRollup
+from src.models.migrations import _backfill_evaluation_rollups
+from tests.helpers import SALES_DEPARTMENT_ID, init_departments, create_employee, create_evaluations, evaluation_item
+
+def expected_series(evaluations, resolution):
+    """السلسلة المتوقعة محسوبة من التقييمات الشهرية ودرجاتها كما يرجعها المسار الشهري
+
+    المتوسطات موزونة بعدد التقييمات (متوسط جميع التقييمات في الربع أو السنة).
+    """
+    buckets = {}
+    for evaluation in evaluations:
+        year, month = evaluation['evaluation_year'], evaluation['evaluation_month']
+        key = (year, (month + 2) // 3) if resolution == 'quarter' else (year,)
+        bucket = buckets.setdefault(key, {'totals': [], 'averages': [], 'criteria': {}})
+        bucket['totals'].append(evaluation['total_score'])
+        bucket['averages'].append(evaluation['average_score'])
+        for score in evaluation['scores']:
+            bucket['criteria'].setdefault(score['criteria_name'], []).append(score['score'])
+
+    mean = lambda values: sum(values) / len(values)
+    result = {'periods': [], 'total_scores': [], 'average_scores': [], 'criteria_scores': {}}
+    for key in sorted(buckets):
+        bucket = buckets[key]
+        result['periods'].append(f'{key[0]}-Q{key[1]}' if resolution == 'quarter' else str(key[0]))
+        result['total_scores'].append(mean(bucket['totals']))
+        result['average_scores'].append(mean(bucket['averages']))
+        for name, scores in bucket['criteria'].items():
+            result['criteria_scores'].setdefault(name, []).append(mean(scores))
+    return result
+
+def assert_series_equal(actual, expected):
+    assert actual['periods'] == expected['periods']
+    assert actual['total_scores'] == pytest.approx(expected['total_scores'])
+    assert actual['average_scores'] == pytest.approx(expected['average_scores'])
+    assert set(actual['criteria_scores']) == set(expected['criteria_scores'])
+    for name, scores in expected['criteria_scores'].items():
+        assert actual['criteria_scores'][name] == pytest.approx(scores)
+
+def monthly_evaluations(client, employee_ids, year=None):
+    """تقييمات الموظفين الشهرية بدرجاتها (في سنة محددة أو جميعها)"""
+    evaluations = []
+    for employee_id in employee_ids:
+        response = client.get(f'/api/employees/{employee_id}/evaluations')
+        assert response.status_code == 200
+        evaluations.extend(evaluation for evaluation in response.get_json()
+                           if year is None or evaluation['evaluation_year'] == year)
+    return evaluations
+
+def assert_employee_rollups_match(client, employee_id, **params):
+    evaluations = monthly_evaluations(client, [employee_id], params.get('year'))
+    for resolution in ('quarter', 'year'):
+        response = client.get(f'/api/employees/{employee_id}/evaluations/chart-data',
+                              query_string={'resolution': resolution, **params})
+        assert response.status_code == 200, response.get_json()
+        assert_series_equal(response.get_json(), expected_series(evaluations, resolution))
+
+def assert_department_rollups_match(client, department_id, employee_ids, **params):
+    evaluations = monthly_evaluations(client, employee_ids, params.get('year'))
+    for resolution in ('quarter', 'year'):
+        response = client.get(f'/api/departments/{department_id}/evaluations/chart-data',
+                              query_string={'resolution': resolution, **params})
+        assert response.status_code == 200, response.get_json()
+        assert_series_equal(response.get_json(), expected_series(evaluations, resolution))
+
+def rollup_table(conn):
+    rows = conn.execute(select(EvaluationRollup.__table__).order_by(*EvaluationRollup.__table__.primary_key)).all()
+    return [tuple(round(value, 9) if isinstance(value, float) else value for value in row) for row in rows]
+
+def assert_table_matches_backfill(app):
+    """المجاميع المحدثة تدريجياً تساوي إعادة حسابها كاملة بترحيل 5"""
+    with app.app_context(), db.engine.connect() as conn:
+        incremental = rollup_table(conn)
+        _backfill_evaluation_rollups(conn)
+        backfilled = rollup_table(conn)
+        conn.rollback()
+    assert incremental == backfilled
+    return incremental
+
+@pytest.fixture
+def seeded(client):
+    departments = init_departments(client)
+    criteria = departments[SALES_DEPARTMENT_ID]
+    employee_ids = [create_employee(client, f'R{number:03d}') for number in range(3)]
+    create_evaluations(client, employee_ids[:2], criteria, years=(2023, 2024), months=(1, 2, 4, 7, 11, 12))
+    create_evaluations(client, employee_ids[2:], criteria, years=(2024,), months=(3, 5))
+    return client, criteria, employee_ids
+
+def test_employee_rollups_match_monthly_data(app, seeded):
+    client, criteria, employee_ids = seeded
+    for employee_id in employee_ids:
+        assert_employee_rollups_match(client, employee_id, **{'from': '2023-01', 'to': '2024-12'})
+    assert_table_matches_backfill(app)
+
+    response = client.get(f'/api/employees/{employee_ids[0]}/evaluations/chart-data',
+                          query_string={'resolution': 'quarter', 'year': 2024})
+    result = response.get_json()
+    assert result['periods'] == ['2024-Q1', '2024-Q2', '2024-Q3', '2024-Q4']
+    assert result['months'] == ['الربع 1', 'الربع 2', 'الربع 3', 'الربع 4']
+    assert result['percentile_ranks'] == [None] * 4
+
+    # الفترة الجزئية ترجع الأرباع التي تقع فيها بالكامل
+    response = client.get(f'/api/employees/{employee_ids[0]}/evaluations/chart-data',
+                          query_string={'resolution': 'quarter', 'from': '2023-12', 'to': '2024-05'})
+    assert response.get_json()['periods'] == ['2023-Q4', '2024-Q1', '2024-Q2']
+    response = client.get(f'/api/employees/{employee_ids[0]}/evaluations/chart-data',
+                          query_string={'resolution': 'year', 'from': '2024-06'})
+    assert response.get_json()['periods'] == ['2024']
+
+def test_department_rollups_aggregate_employee_rows(app, seeded):
+    client, criteria, employee_ids = seeded
+    assert_department_rollups_match(client, SALES_DEPARTMENT_ID, employee_ids, **{'from': '2023-01', 'to': '2024-12'})
+
+    response = client.get(f'/api/departments/{SALES_DEPARTMENT_ID}/evaluations/chart-data',
+                          query_string={'resolution': 'year', 'year': 2024})
+    result = response.get_json()
+    assert result['department']['id'] == SALES_DEPARTMENT_ID
+    assert result['labels'] == ['2024'] and result['periods'] == ['2024']
+    # قسم بلا تقييمات
+    response = client.get('/api/departments/1/evaluations/chart-data', query_string={'year': 2024})
+    assert response.get_json()['periods'] == []
+
+@pytest.mark.parametrize('params', [
+    {'resolution': 'month'},
+    {'resolution': 'week'},
+    {'from': '2024-13'},
+])
+def test_department_rollups_reject_invalid_parameters(client, seeded, params):
+    response = client.get(f'/api/departments/{SALES_DEPARTMENT_ID}/evaluations/chart-data', query_string=params)
+    assert response.status_code == 400
+
+def test_rollups_refresh_on_create_update_and_delete(app, seeded):
+    client, criteria, employee_ids = seeded
+    employee_id = employee_ids[2]
+
+    def check():
+        assert_employee_rollups_match(client, employee_id, year=2024)
+        assert_department_rollups_match(client, SALES_DEPARTMENT_ID, employee_ids, year=2024)
+        assert_table_matches_backfill(app)
+
+    response = client.post('/api/evaluations', json=evaluation_item(employee_id, 2024, 6, criteria, 1))
+    assert response.status_code == 201
+    evaluation_id = response.get_json()['id']
+    check()
+
+    # تعديل درجة وحذف معيار
+    response = client.put(f'/api/evaluations/{evaluation_id}', json={
+        'scores': [{'criteria_id': criterion['id'], 'score': 4.5} for criterion in criteria[1:]]
+    })
+    assert response.status_code == 200
+    check()
+
+    response = client.delete(f'/api/evaluations/{evaluation_id}')
+    assert response.status_code == 200
+    check()
+    response = client.get(f'/api/employees/{employee_id}/evaluations/chart-data',
+                          query_string={'resolution': 'quarter', 'year': 2024})
+    assert response.get_json()['periods'] == ['2024-Q1', '2024-Q2']
+
+    # حذف آخر تقييمات الموظف في السنة يحذف صفوفها
+    for evaluation in monthly_evaluations(client, [employee_id]):
+        assert client.delete(f"/api/evaluations/{evaluation['id']}").status_code == 200
+    rows = assert_table_matches_backfill(app)
+    assert all(row[0] != employee_id for row in rows)
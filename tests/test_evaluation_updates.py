@@ -0,0 +1,121 @@
+import re
+import threading
+from contextlib import contextmanager
+from sqlalchemy import event
+from src.models.user import db
+from src.routes import evaluation as evaluation_routes
+from tests.helpers import SALES_DEPARTMENT_ID, init_departments, create_employee, evaluation_item
+
+SCORE_WRITE_PATTERN = re.compile(r'^\s*(INSERT INTO|UPDATE|DELETE FROM) evaluation_scores\b', re.IGNORECASE)
+
+@contextmanager
+def record_score_writes(app):
+    """تسجيل أوامر الكتابة على جدول الدرجات مع معاملاتها"""
+    writes = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        match = SCORE_WRITE_PATTERN.match(statement)
+        if match:
+            writes.append((match.group(1).split()[0].upper(), parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield writes
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+def _create_evaluation(client, criteria, score=3):
+    employee_id = create_employee(client, 'U001')
+    response = client.post('/api/evaluations', json=evaluation_item(employee_id, 2024, 1, criteria, score=score))
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()
+
+def _put_scores(client, evaluation_id, scores):
+    response = client.put(f'/api/evaluations/{evaluation_id}', json={
+        'scores': [{'criteria_id': criteria_id, 'score': score} for criteria_id, score in scores.items()]
+    })
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+def _score_ids(evaluation):
+    return {score['criteria_id']: score['id'] for score in evaluation['scores']}
+
+def test_unchanged_scores_are_not_rewritten(app, client):
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    evaluation = _create_evaluation(client, criteria)
+
+    with record_score_writes(app) as writes:
+        result = _put_scores(client, evaluation['id'], {criterion['id']: 3 for criterion in criteria})
+    assert writes == []
+    assert result['changed_criteria'] == {'inserted': [], 'updated': [], 'deleted': []}
+    assert _score_ids(result) == _score_ids(evaluation)
+
+def test_update_writes_only_the_diff(app, client):
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    ids = [criterion['id'] for criterion in criteria]
+    evaluation = _create_evaluation(client, criteria[:-1])
+
+    # تعديل معيار وحذف معيارين وإضافة معيار، والبقية بنفس الدرجة
+    scores = {criteria_id: 3 for criteria_id in ids[2:-1]}
+    scores[ids[2]] = 5
+    scores[ids[-1]] = 1
+    with record_score_writes(app) as writes:
+        result = _put_scores(client, evaluation['id'], scores)
+
+    assert result['changed_criteria'] == {'inserted': [ids[-1]], 'updated': [ids[2]], 'deleted': ids[:2]}
+    assert [kind for kind, _ in writes] == ['INSERT', 'DELETE']
+    assert {row[1] for row in writes[0][1]} == {ids[2], ids[-1]}
+    assert sorted(writes[1][1][1:]) == ids[:2]
+
+    assert {score['criteria_id']: score['score'] for score in result['scores']} == scores
+    assert result['total_score'] == sum(scores.values())
+    assert result['score_count'] == len(scores)
+    # الدرجات المعدلة وغير المتغيرة تحتفظ بصفوفها
+    before, after = _score_ids(evaluation), _score_ids(result)
+    assert all(after[criteria_id] == before[criteria_id] for criteria_id in ids[2:-1])
+
+def test_concurrent_updates_diff_against_committed_scores(file_app, monkeypatch):
+    client = file_app.test_client()
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    ids = [criterion['id'] for criterion in criteria]
+    evaluation = _create_evaluation(client, criteria[:1])
+
+    # الطلب الأول يتوقف بعد كتابة فروقاته وقبل الحفظ، ويبدأ الطلب الثاني أثناءه
+    first_wrote = threading.Event()
+    second_started = threading.Event()
+    refresh_employee_stats = evaluation_routes.refresh_employee_stats
+
+    def pause_first_request(employee_ids):
+        if threading.current_thread().name == 'first':
+            first_wrote.set()
+            assert second_started.wait(timeout=10)
+            # مهلة حتى يصل الطلب الثاني إلى قراءة الدرجات أو انتظار القفل
+            threading.Event().wait(0.3)
+        refresh_employee_stats(employee_ids)
+    monkeypatch.setattr(evaluation_routes, 'refresh_employee_stats', pause_first_request)
+
+    results = {}
+
+    def update(name, scores, wait_for=None):
+        if wait_for:
+            assert wait_for.wait(timeout=10)
+            second_started.set()
+        results[name] = _put_scores(file_app.test_client(), evaluation['id'], scores)
+
+    threads = [
+        threading.Thread(target=update, name='first', args=('first', {ids[1]: 4})),
+        threading.Thread(target=update, name='second', args=('second', {ids[2]: 2}, first_wrote)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    assert not any(thread.is_alive() for thread in threads)
+
+    assert results['first']['changed_criteria'] == {'inserted': [ids[1]], 'updated': [], 'deleted': [ids[0]]}
+    # الطلب الثاني يرى درجات الطلب الأول المحفوظة لا الدرجات السابقة لهما
+    assert results['second']['changed_criteria'] == {'inserted': [ids[2]], 'updated': [], 'deleted': [ids[1]]}
+    assert {score['criteria_id']: score['score'] for score in results['second']['scores']} == {ids[2]: 2}
+    assert results['second']['total_score'] == 2
@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta
+import io
+import os
+import threading
+import time
+from urllib.parse import quote
+import pytest
+from openpyxl import load_workbook
+from src.models.user import db
+from src.models.export_job import ExportJob
+from src.services import export_jobs
+from tests.helpers import SALES_DEPARTMENT_ID, init_departments, create_employee, create_evaluations
+
+@pytest.fixture
+def jobs_app(file_app):
+    """العمال يعملون في خيوط منفصلة فتحتاج قاعدة بيانات في ملف"""
+    client = file_app.test_client()
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    employee_ids = [create_employee(client, f'J{number:03d}') for number in range(3)]
+    create_evaluations(client, employee_ids, criteria, months=range(1, 4))
+    file_app.config.update(EXPORT_JOB_CLEANUP_INTERVAL=0)
+    return file_app, client, employee_ids
+
+def _submit(client, **data):
+    response = client.post('/api/export/jobs', json=data)
+    assert response.status_code == 202, response.get_json()
+    return response.get_json()
+
+def _wait(client, job_id, statuses=('completed', 'failed')):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/export/jobs/{job_id}').get_json()
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f'المهمة {job_id} لم تنته: {job}')
+
+def _expire(app, job_id, age):
+    with app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        job.expires_at = datetime.utcnow() - age
+        db.session.commit()
+        return job.file_path
+
+def test_job_completes_and_downloads(jobs_app):
+    app, client, employee_ids = jobs_app
+    job = _submit(client, export_type='employee', employee_id=employee_ids[0])
+    assert job['status'] == 'queued' and job['download_url'] is None
+
+    job = _wait(client, job['id'])
+    assert job['status'] == 'completed'
+    assert job['progress'] == 1
+    assert job['download_url'] == f"/api/export/jobs/{job['id']}/download"
+
+    response = client.get(job['download_url'])
+    assert response.status_code == 200
+    assert quote(job['filename']) in response.headers['Content-Disposition']
+    wb = load_workbook(io.BytesIO(response.get_data()))
+    response.close()
+    assert wb.sheetnames
+
+@pytest.mark.parametrize('data, status', [
+    ({'export_type': 'payroll'}, 400),
+    ({'export_type': 'employee'}, 400),
+    ({'export_type': 'department', 'department_id': '2'}, 400),
+    ({'export_type': 'employee', 'employee_id': 999}, 404),
+    ({'export_type': 'department', 'department_id': 999}, 404),
+])
+def test_invalid_job_is_rejected(jobs_app, data, status):
+    app, client, _ = jobs_app
+    assert client.post('/api/export/jobs', json=data).status_code == status
+    with app.app_context():
+        assert ExportJob.query.count() == 0
+
+def test_running_job_reports_progress_and_is_not_downloadable(jobs_app, monkeypatch):
+    app, client, _ = jobs_app
+    halfway = threading.Event()
+    release = threading.Event()
+    build_export = export_jobs.build_export
+
+    def slow_build(export_type, params, progress=None):
+        progress(1, 2)
+        halfway.set()
+        release.wait(10)
+        return build_export(export_type, params, progress=progress)
+    monkeypatch.setattr(export_jobs, 'build_export', slow_build)
+
+    job = _submit(client, export_type='all-evaluations')
+    try:
+        assert halfway.wait(10)
+        status = client.get(f"/api/export/jobs/{job['id']}").get_json()
+        assert status['status'] == 'running'
+        assert status['progress'] == pytest.approx(0.475)
+        assert status['started_at'] is not None
+
+        response = client.get(f"/api/export/jobs/{job['id']}/download")
+        assert response.status_code == 409
+        assert response.get_json()['status'] == 'running'
+    finally:
+        release.set()
+    assert _wait(client, job['id'])['status'] == 'completed'
+
+def test_failed_job_reports_error(jobs_app, monkeypatch):
+    app, client, _ = jobs_app
+    def failing_build(export_type, params, progress=None):
+        raise RuntimeError('تعذر بناء الملف')
+    monkeypatch.setattr(export_jobs, 'build_export', failing_build)
+
+    job = _wait(client, _submit(client, export_type='all-evaluations')['id'])
+    assert job['status'] == 'failed'
+    assert job['error'] == 'تعذر بناء الملف'
+    assert job['expires_at'] is not None
+    assert client.get(f"/api/export/jobs/{job['id']}/download").status_code == 409
+
+def test_expired_job_file_is_removed_on_status_request(jobs_app):
+    app, client, _ = jobs_app
+    job = _wait(client, _submit(client, export_type='all-evaluations')['id'])
+    file_path = _expire(app, job['id'], timedelta(seconds=1))
+    assert os.path.exists(file_path)
+
+    # لا توجد مهام جديدة: طلب الحالة وحده يحذف الملف
+    status = client.get(f"/api/export/jobs/{job['id']}").get_json()
+    assert status['status'] == 'expired' and status['download_url'] is None
+    assert not os.path.exists(file_path)
+    response = client.get(f"/api/export/jobs/{job['id']}/download")
+    assert response.status_code == 410
+
+def test_download_after_expiry_returns_gone(jobs_app):
+    app, client, _ = jobs_app
+    app.config.update(EXPORT_JOB_TTL_HOURS=0)
+    # الملف ينتهي فور اكتماله فقد يكون تنظيف طلب الحالة قد حذفه
+    job = _wait(client, _submit(client, export_type='all-evaluations')['id'],
+                statuses=('completed', 'failed', 'expired'))
+    assert job['status'] != 'failed'
+    with app.app_context():
+        # مسار الملف يُمسح من السجل عند تنظيفه، فيُحسب من معرف المهمة
+        file_path = os.path.join(export_jobs.get_jobs_dir(), f"{job['id']}.xlsx")
+
+    response = client.get(f"/api/export/jobs/{job['id']}/download")
+    assert response.status_code == 410
+    assert not os.path.exists(file_path)
+
+def test_cleanup_is_rate_limited_and_deletes_old_records(jobs_app):
+    app, client, _ = jobs_app
+    app.config.update(EXPORT_JOB_CLEANUP_INTERVAL=3600)
+    job = _wait(client, _submit(client, export_type='all-evaluations')['id'])
+    file_path = _expire(app, job['id'], timedelta(days=export_jobs.DEFAULT_EXPORT_JOB_RETENTION_DAYS, hours=1))
+
+    with app.app_context():
+        # نُفذ تنظيف عند إضافة المهمة، والتالي بعد انقضاء المدة فقط
+        assert export_jobs.cleanup_expired_export_jobs() == 0
+        assert os.path.exists(file_path)
+        assert export_jobs.cleanup_expired_export_jobs(force=True) == 1
+        assert db.session.get(ExportJob, job['id']) is None
+    assert not os.path.exists(file_path)
+
+def test_recover_fails_interrupted_jobs(app):
+    with app.app_context():
+        for job_id, status in (('queued', 'queued'), ('running', 'running'), ('done', 'completed')):
+            db.session.add(ExportJob(id=job_id, export_type='all-evaluations', status=status))
+        expired = ExportJob(id='old', export_type='all-evaluations', status='failed',
+                            expires_at=datetime.utcnow() - timedelta(days=30))
+        db.session.add(expired)
+        db.session.commit()
+
+        export_jobs.recover_export_jobs()
+        jobs = {job.id: job for job in ExportJob.query}
+    assert set(jobs) == {'queued', 'running', 'done'}
+    for job_id in ('queued', 'running'):
+        assert jobs[job_id].status == 'failed'
+        assert jobs[job_id].error
+        assert jobs[job_id].expires_at > datetime.utcnow()
+    assert jobs['done'].status == 'completed'
@@ -0,0 +1,254 @@
+import io
+import threading
+from openpyxl import load_workbook
+from tests.helpers import SALES_DEPARTMENT_ID, init_departments, create_employee, create_evaluations
+
+THREADS = 6
+
+def _seed(client, count=5):
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    employee_ids = [create_employee(client, f'X{number:03d}') for number in range(count)]
+    create_evaluations(client, employee_ids, criteria, months=range(1, 7))
+    return criteria, employee_ids
+
+def _fetch_concurrently(app, url, threads=THREADS):
+    """إرسال نفس الطلب من عدة خيوط معاً وإرجاع الاستجابات"""
+    barrier = threading.Barrier(threads)
+    responses = []
+    lock = threading.Lock()
+
+    def fetch():
+        worker_client = app.test_client()
+        barrier.wait()
+        response = worker_client.get(url)
+        data = response.get_data()
+        response.close()
+        with lock:
+            responses.append((response.status_code, data, response.headers))
+
+    workers = [threading.Thread(target=fetch) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+    assert not any(worker.is_alive() for worker in workers)
+    return responses
+
+def _assert_all_evaluations_workbook(client, data, employee_ids):
+    wb = load_workbook(io.BytesIO(data))
+    assert wb.sheetnames[0] == 'الملخص العام'
+    assert len(wb.sheetnames) == len(employee_ids) + 1
+
+    summary = list(wb['الملخص العام'].iter_rows(min_row=4, values_only=True))
+    assert len(summary) == len(employee_ids)
+    for row, employee_id in zip(summary, employee_ids):
+        evaluations = client.get(f'/api/employees/{employee_id}/evaluations').get_json()
+        expected = sum(evaluation['average_score'] for evaluation in evaluations) / len(evaluations)
+        assert row[4] == len(evaluations)
+        assert row[5] == round(expected, 2)
+    return wb
+
+def test_concurrent_streamed_exports_are_complete(file_app):
+    file_app.config.update(EXPORT_CACHE_ENABLED=False, EXPORT_SPOOL_MAX_SIZE=1024)
+    client = file_app.test_client()
+    criteria, employee_ids = _seed(client)
+
+    responses = _fetch_concurrently(file_app, '/api/export/all-evaluations')
+
+    assert [status for status, data, headers in responses] == [200] * THREADS
+    for status, data, headers in responses:
+        wb = _assert_all_evaluations_workbook(client, data, employee_ids)
+        employee_rows = list(wb[wb.sheetnames[1]].iter_rows(min_row=9, values_only=True))
+        assert len(employee_rows) == 6
+        assert all(len(row) == len(criteria) + 3 for row in employee_rows)
+
+def test_cached_export_survives_eviction_before_send(app, client, monkeypatch):
+    from src.routes import export as export_routes
+    from src.services.export_cache import evict_exports, open_cached_export
+    criteria, employee_ids = _seed(client, count=3)
+
+    first = client.get('/api/export/all-evaluations')
+    first_data = first.get_data()
+    first.close()
+    assert first.status_code == 200
+
+    # طلب آخر يخلي الذاكرة المؤقتة كلها بين البحث عن الملف وإرساله
+    def open_then_evict(key):
+        cached = open_cached_export(key)
+        assert cached is not None
+        assert evict_exports(max_bytes=0) == 1
+        return cached
+    monkeypatch.setattr(export_routes, 'open_cached_export', open_then_evict)
+
+    second = client.get('/api/export/all-evaluations')
+    second_data = second.get_data()
+    second.close()
+    assert second.status_code == 200
+    assert second_data == first_data
+    assert second.content_length == len(first_data)
+    _assert_all_evaluations_workbook(client, second_data, employee_ids)
+
+def test_concurrent_cached_exports_with_tiny_cache(file_app):
+    # كل تخزين يخلي الملفات الأخرى فتتزامن القراءة مع الحذف
+    file_app.config.update(EXPORT_CACHE_MAX_BYTES=1)
+    client = file_app.test_client()
+    criteria, employee_ids = _seed(client)
+
+    urls = ['/api/export/all-evaluations'] + [f'/api/export/employee/{employee_id}' for employee_id in employee_ids]
+    barrier = threading.Barrier(len(urls) * 2)
+    lock = threading.Lock()
+    results = []
+
+    def fetch(url):
+        worker_client = file_app.test_client()
+        barrier.wait()
+        for _ in range(3):
+            response = worker_client.get(url)
+            data = response.get_data()
+            response.close()
+            with lock:
+                results.append((url, response.status_code, data))
+
+    workers = [threading.Thread(target=fetch, args=(url,)) for url in urls * 2]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+
+    assert [status for url, status, data in results] == [200] * len(results)
+    for url, status, data in results:
+        if url == '/api/export/all-evaluations':
+            _assert_all_evaluations_workbook(client, data, employee_ids)
+        else:
+            assert len(load_workbook(io.BytesIO(data)).sheetnames) == 1
+
+def test_exports_use_shared_named_styles(file_app):
+    from src.services.excel_export import (
+        TITLE_STYLE, SUMMARY_TITLE_STYLE, HEADER_STYLE, DATA_STYLE, SCORE_STYLE
+    )
+    file_app.config.update(EXPORT_CACHE_ENABLED=False)
+    client = file_app.test_client()
+    criteria, employee_ids = _seed(client, count=2)
+
+    response = client.get('/api/export/all-evaluations')
+    small = load_workbook(io.BytesIO(response.get_data()))
+    response.close()
+    for number in range(2, 12):
+        create_employee(client, f'X{number:03d}')
+    responses = _fetch_concurrently(file_app, '/api/export/all-evaluations')
+    assert [status for status, data, headers in responses] == [200] * THREADS
+
+    for status, data, headers in responses:
+        wb = load_workbook(io.BytesIO(data))
+        assert {TITLE_STYLE, SUMMARY_TITLE_STYLE, HEADER_STYLE, DATA_STYLE, SCORE_STYLE} <= set(wb.named_styles)
+        # جدول التنسيقات لا يكبر بعدد الأوراق والخلايا
+        assert len(wb._cell_styles) == len(small._cell_styles)
+
+        summary = wb['الملخص العام']
+        assert summary['A1'].style == SUMMARY_TITLE_STYLE
+        assert {cell.style for cell in summary[3]} == {HEADER_STYLE}
+        assert summary['F4'].style == SCORE_STYLE
+        sheet = wb[wb.sheetnames[1]]
+        assert sheet['A7'].style == TITLE_STYLE
+        assert {cell.style for cell in sheet[9][:-1]} == {DATA_STYLE}
+        assert sheet[9][-1].style == SCORE_STYLE
+
+def test_flat_exports_flush_in_configured_batches(app, client):
+    app.config.update(FLAT_EXPORT_BATCH_SIZE=7)
+    criteria, employee_ids = _seed(client, count=2)
+    total_rows = len(employee_ids) * 6 * len(criteria)
+
+    response = client.get('/api/export/evaluations.ndjson')
+    chunks = [chunk for chunk in response.response if chunk]
+    response.close()
+    assert [chunk.count(b'\n') for chunk in chunks] == \
+        [7] * (total_rows // 7) + ([total_rows % 7] if total_rows % 7 else [])
+
+    response = client.get('/api/export/evaluations.csv')
+    chunks = [chunk for chunk in response.response if chunk]
+    response.close()
+    # الجزء الأول يتضمن سطر رؤوس الأعمدة
+    assert chunks[0].count(b'\n') == 7 + 1
+    assert sum(chunk.count(b'\n') for chunk in chunks) == total_rows + 1
+    assert len(chunks) == -(-total_rows // 7)
+
+def test_departments_zip_has_one_workbook_per_department(file_app):
+    import zipfile
+    # العمليات العاملة تفتح ملف قاعدة البيانات بنفسها فلا ترى قاعدة في الذاكرة
+    file_app.config.update(EXPORT_SHARD_WORKERS=2)
+    client = file_app.test_client()
+    departments = init_departments(client)
+    populated = sorted(departments)[:2]
+    employees = {
+        department_id: [create_employee(client, f'Z{department_id}{number}', department_id)
+                        for number in range(department_id + 1)]
+        for department_id in populated
+    }
+    for department_id, employee_ids in employees.items():
+        create_evaluations(client, employee_ids[1:], departments[department_id], months=range(1, 4))
+
+    response = client.get('/api/export/departments.zip')
+    data = response.get_data()
+    response.close()
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+
+    names = {
+        client.get(f'/api/departments/{department_id}').get_json()['name']: department_id
+        for department_id in populated
+    }
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        filenames = archive.namelist()
+        assert len(filenames) == len(populated)
+        for filename in filenames:
+            department_id = next(department_id for name, department_id in names.items()
+                                 if filename.startswith(f'تقييمات_{name}_'))
+            wb = load_workbook(io.BytesIO(archive.read(filename)))
+            employee_ids = employees[department_id]
+            assert wb.sheetnames[0] == 'الملخص العام'
+            assert len(wb.sheetnames) == len(employee_ids) + 1
+
+            summary = list(wb['الملخص العام'].iter_rows(min_row=4, values_only=True))
+            assert [row[1] for row in summary] == [f'Z{department_id}{number}' for number in range(len(employee_ids))]
+            # الموظف الأول بلا تقييمات وبقية الموظفين بثلاثة أشهر
+            assert [row[4] for row in summary] == [0] + [3] * (len(employee_ids) - 1)
+            for sheet_name in wb.sheetnames[2:]:
+                rows = list(wb[sheet_name].iter_rows(min_row=9, values_only=True))
+                assert len(rows) == 3
+                assert all(len(row) == len(departments[department_id]) + 3 for row in rows)
+
+def _export_iteration_peak(app, employee_ids, chunk_size):
+    """أعلى استهلاك لذاكرة Python أثناء المرور على بيانات التصدير دون الاحتفاظ بها"""
+    import tracemalloc
+    from src.services.excel_export import iter_export_employees
+    with app.app_context():
+        tracemalloc.start()
+        try:
+            count = sum(1 for _ in iter_export_employees(employee_ids=employee_ids, chunk_size=chunk_size))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    assert count == len(employee_ids)
+    return peak
+
+def test_export_dataset_memory_is_bounded_by_chunk_size(app, client):
+    from tests.helpers import count_queries, select_count
+    from src.services.excel_export import iter_export_employees
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    employee_ids = [create_employee(client, f'C{number:03d}') for number in range(120)]
+    create_evaluations(client, employee_ids, criteria, years=(2023, 2024))
+
+    # دفعة من الموظفين وتقييماتهم ودرجاتهم لكل 10 موظفين، والمعايير مرة واحدة
+    with count_queries(app) as statements, app.app_context():
+        employees = list(iter_export_employees(employee_ids=employee_ids, chunk_size=10))
+    assert [employee['id'] for employee, _, _ in employees] == employee_ids
+    assert all(len(evaluations) == 24 for _, _, evaluations in employees)
+    assert select_count(statements) == 12 * 3 + 1 + 1
+
+    # تحميل أول مرة لتهيئة ذاكرة الاستعلامات المترجمة قبل القياس
+    _export_iteration_peak(app, employee_ids[:30], chunk_size=10)
+    small = _export_iteration_peak(app, employee_ids[:30], chunk_size=10)
+    large = _export_iteration_peak(app, employee_ids, chunk_size=10)
+    # أربعة أضعاف الموظفين لا تضاعف الذاكرة، لأن الدفعة المحملة بنفس الحجم
+    assert large < small * 1.5
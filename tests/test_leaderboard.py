@@ -0,0 +1,121 @@
+import pytest
+from src.services import score_cube
+from tests.helpers import SALES_DEPARTMENT_ID, init_departments, create_employee, evaluation_item
+
+HR_DEPARTMENT_ID = 1
+
+# درجة كل موظف في شهري 2024 (جميع المعايير بنفس الدرجة)
+SCORES = {
+    'A': (SALES_DEPARTMENT_ID, 5, 1),
+    'B': (SALES_DEPARTMENT_ID, 4, 4),
+    'C': (SALES_DEPARTMENT_ID, 4, 5),
+    'D': (SALES_DEPARTMENT_ID, 2, 2),
+    'E': (HR_DEPARTMENT_ID, 3, 3),
+    'F': (HR_DEPARTMENT_ID, 5, 5),
+}
+# درجة المعيار الأول لموظفي المبيعات في يناير 2023 (بقية المعايير 3)
+FIRST_CRITERION_SCORES = {'A': 1, 'B': 5, 'C': 3, 'D': 2}
+
+@pytest.fixture(params=['sql', 'cube'])
+def board(request, app, client):
+    """بيانات الترتيب مع مكعب الدرجات أو دونه، وإرجاع (العميل، {الاسم: المعرف}، معايير المبيعات)"""
+    departments = init_departments(client)
+    if request.param == 'cube':
+        with app.app_context():
+            score_cube.build_score_cube()
+
+    employee_ids = {name: create_employee(client, name, department_id)
+                    for name, (department_id, _, _) in SCORES.items()}
+    items = []
+    for name, (department_id, january, february) in SCORES.items():
+        criteria = departments[department_id]
+        items.append(evaluation_item(employee_ids[name], 2024, 1, criteria, january))
+        items.append(evaluation_item(employee_ids[name], 2024, 2, criteria, february))
+    sales_criteria = departments[SALES_DEPARTMENT_ID]
+    for name, score in FIRST_CRITERION_SCORES.items():
+        item = evaluation_item(employee_ids[name], 2023, 1, sales_criteria, 3)
+        item['scores'][0]['score'] = score
+        items.append(item)
+    response = client.post('/api/evaluations/bulk', json={'evaluations': items})
+    assert response.status_code == 201 and not response.get_json()['errors']
+    return client, employee_ids, sales_criteria
+
+def _get(client, **params):
+    response = client.get('/api/leaderboard', query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+def _entries(entries, employee_ids):
+    names = {employee_id: name for name, employee_id in employee_ids.items()}
+    return [(names[entry['employee_id']], entry['rank'], entry['value']) for entry in entries]
+
+def test_department_scope_for_month_with_ties(board):
+    client, employee_ids, _ = board
+    result = _get(client, scope='department', year=2024, month=1, k=50)
+    assert result['metric'] == 'average'
+    boards = {entry['department_id']: entry for entry in result['leaderboards']}
+    assert set(boards) == {HR_DEPARTMENT_ID, SALES_DEPARTMENT_ID}
+
+    sales = boards[SALES_DEPARTMENT_ID]
+    assert sales['ranked_count'] == 4
+    assert sales['department_name'] == 'إدارة المبيعات'
+    # التعادل يعطي نفس الترتيب والرتبة التالية تتخطاه (RANK)
+    assert _entries(sales['top'], employee_ids) == [('A', 1, 5), ('B', 2, 4), ('C', 2, 4), ('D', 4, 2)]
+    assert _entries(sales['bottom'], employee_ids) == [('D', 4, 2), ('B', 2, 4), ('C', 2, 4), ('A', 1, 5)]
+    assert _entries(boards[HR_DEPARTMENT_ID]['top'], employee_ids) == [('F', 1, 5), ('E', 2, 3)]
+
+def test_all_scope_for_year_orders_across_departments(board):
+    client, employee_ids, _ = board
+    result = _get(client, scope='all', year=2024, k=50)
+    assert len(result['leaderboards']) == 1
+    leaderboard = result['leaderboards'][0]
+    assert leaderboard['department_id'] is None and leaderboard['ranked_count'] == 6
+    # قيمة السنة متوسط الشهرين
+    assert _entries(leaderboard['top'], employee_ids) == [
+        ('F', 1, 5), ('C', 2, 4.5), ('B', 3, 4), ('A', 4, 3), ('E', 4, 3), ('D', 6, 2)
+    ]
+    assert [entry['evaluation_count'] for entry in leaderboard['top']] == [2] * 6
+    assert _entries(leaderboard['bottom'], employee_ids)[:3] == [('D', 6, 2), ('A', 4, 3), ('E', 4, 3)]
+
+def test_top_and_bottom_k(board):
+    client, employee_ids, _ = board
+    leaderboard = _get(client, scope='all', year=2024, month=2, k=2)['leaderboards'][0]
+    assert leaderboard['ranked_count'] == 6
+    assert _entries(leaderboard['top'], employee_ids) == [('C', 1, 5), ('F', 1, 5)]
+    assert _entries(leaderboard['bottom'], employee_ids) == [('A', 6, 1), ('D', 5, 2)]
+
+    leaderboard = _get(client, scope='department', year=2024, month=2, k=1,
+                       department_id=HR_DEPARTMENT_ID)['leaderboards']
+    assert len(leaderboard) == 1
+    assert _entries(leaderboard[0]['top'], employee_ids) == [('F', 1, 5)]
+    assert _entries(leaderboard[0]['bottom'], employee_ids) == [('E', 2, 3)]
+
+def test_criteria_filter(board):
+    client, employee_ids, sales_criteria = board
+    result = _get(client, scope='all', year=2023, month=1, criteria_id=sales_criteria[0]['id'])
+    assert result['metric'] == 'criteria'
+    assert result['criteria']['id'] == sales_criteria[0]['id']
+    leaderboard = result['leaderboards'][0]
+    assert leaderboard['ranked_count'] == 4
+    assert _entries(leaderboard['top'], employee_ids) == [('B', 1, 5), ('C', 2, 3), ('D', 3, 2), ('A', 4, 1)]
+
+    # معيار لم يُقيّم به أحد في الفترة
+    assert _get(client, scope='all', year=2024, criteria_id=sales_criteria[0]['id'] + 100)['leaderboards'] == []
+    assert _get(client, scope='all', year=2022)['leaderboards'] == []
+
+@pytest.mark.parametrize('params', [
+    {'scope': 'company'},
+    {'year': 'last'},
+    {'k': 0},
+    {'k': 101},
+    {'k': 'ten'},
+    {'month': 13},
+    {'month': 0},
+    {'month': 'may'},
+    {'year': 2024, 'department_id': 'sales'},
+    {'year': 2024, 'criteria_id': 'x'},
+])
+def test_invalid_parameters_are_rejected(client, params):
+    response = client.get('/api/leaderboard', query_string=params)
+    assert response.status_code == 400
+    assert response.get_json()['error']
@@ -0,0 +1,206 @@
+import pytest
+from sqlalchemy import create_engine, text
+from src.models.user import db
+from src.models.migrations import MIGRATIONS, get_schema_version, run_migrations
+from tests.conftest import create_test_app
+from tests.test_evaluation_rollups import (
+    assert_employee_rollups_match, assert_department_rollups_match, assert_table_matches_backfill
+)
+
+def _score_indexes(conn):
+    return {
+        row[1] for row in conn.execute(text('PRAGMA index_list(evaluation_scores)'))
+    }
+
+def test_fresh_database_has_no_duplicate_score_index(app):
+    with app.app_context(), db.engine.connect() as conn:
+        assert get_schema_version(conn) == MIGRATIONS[-1][0]
+        assert 'ix_evaluation_scores_evaluation_criteria' not in _score_indexes(conn)
+        assert 'uq_evaluation_scores_evaluation_criteria' in _score_indexes(conn)
+
+def test_migration_drops_duplicate_score_index(app):
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                'CREATE INDEX ix_evaluation_scores_evaluation_criteria '
+                'ON evaluation_scores (evaluation_id, criteria_id, score)'
+            ))
+            conn.execute(text('PRAGMA user_version = 5'))
+
+        run_migrations(db.engine)
+
+        with db.engine.connect() as conn:
+            assert get_schema_version(conn) == MIGRATIONS[-1][0]
+            assert 'ix_evaluation_scores_evaluation_criteria' not in _score_indexes(conn)
+
+# مخطط الجداول كما كان قبل أول ترحيل
+BASELINE_SCHEMA = [
+    '''CREATE TABLE departments (
+        id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL UNIQUE, criteria_count INTEGER NOT NULL
+    )''',
+    '''CREATE TABLE evaluation_criteria (
+        id INTEGER PRIMARY KEY, department_id INTEGER NOT NULL REFERENCES departments (id),
+        criteria_name VARCHAR(200) NOT NULL, max_score INTEGER NOT NULL
+    )''',
+    '''CREATE TABLE employees (
+        id INTEGER PRIMARY KEY, employee_number VARCHAR(50) NOT NULL UNIQUE,
+        full_name VARCHAR(200) NOT NULL, job_title VARCHAR(200) NOT NULL,
+        department_id INTEGER NOT NULL REFERENCES departments (id), created_at DATETIME
+    )''',
+    '''CREATE TABLE monthly_evaluations (
+        id INTEGER PRIMARY KEY, employee_id INTEGER NOT NULL REFERENCES employees (id),
+        evaluation_month INTEGER NOT NULL, evaluation_year INTEGER NOT NULL, created_at DATETIME,
+        UNIQUE (employee_id, evaluation_month, evaluation_year)
+    )''',
+    '''CREATE TABLE evaluation_scores (
+        id INTEGER PRIMARY KEY, evaluation_id INTEGER NOT NULL REFERENCES monthly_evaluations (id),
+        criteria_id INTEGER NOT NULL REFERENCES evaluation_criteria (id), score FLOAT NOT NULL
+    )''',
+]
+
+# (الموظف، السنة، الشهر، [(المعيار، الدرجة)])
+BASELINE_EVALUATIONS = [
+    (1, 2023, 11, [(1, 4), (2, 5), (3, 3)]),
+    (1, 2023, 12, [(1, 2), (2, 2.5)]),
+    (1, 2024, 2, [(1, 5), (2, 5), (3, 5)]),
+    (1, 2024, 5, [(1, 1), (3, 4)]),
+    (2, 2024, 1, [(1, 3), (2, 4), (3, 4)]),
+    (2, 2024, 8, []),
+    (3, 2024, 3, [(4, 2), (5, 1)]),
+]
+
+def create_baseline_database(path, duplicate_scores=()):
+    """ملف قاعدة بيانات بمخطط ما قبل الترحيلات وبياناته
+
+    duplicate_scores درجات (التقييم، المعيار، الدرجة) تُضاف بعد الدرجات الأصلية
+    كما كان يحدث قبل المفتاح الفريد.
+    """
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text("INSERT INTO departments VALUES (1, 'المبيعات', 3), (2, 'الموارد البشرية', 2)"))
+        conn.execute(text(
+            "INSERT INTO evaluation_criteria VALUES "
+            "(1, 1, 'أ', 5), (2, 1, 'ب', 5), (3, 1, 'ج', 5), (4, 2, 'د', 5), (5, 2, 'هـ', 5)"
+        ))
+        conn.execute(text(
+            "INSERT INTO employees (id, employee_number, full_name, job_title, department_id) VALUES "
+            "(1, 'B001', 'موظف 1', 'محاسب', 1), (2, 'B002', 'موظف 2', 'محاسب', 1), "
+            "(3, 'B003', 'موظف 3', 'محاسب', 2), (4, 'B004', 'موظف 4', 'محاسب', 2)"
+        ))
+        for evaluation_id, (employee_id, year, month, scores) in enumerate(BASELINE_EVALUATIONS, 1):
+            conn.execute(text('INSERT INTO monthly_evaluations VALUES (:id, :employee_id, :month, :year, NULL)'),
+                         {'id': evaluation_id, 'employee_id': employee_id, 'month': month, 'year': year})
+            for criteria_id, score in scores:
+                conn.execute(text('INSERT INTO evaluation_scores (evaluation_id, criteria_id, score) '
+                                  'VALUES (:evaluation_id, :criteria_id, :score)'),
+                             {'evaluation_id': evaluation_id, 'criteria_id': criteria_id, 'score': score})
+        for evaluation_id, criteria_id, score in duplicate_scores:
+            conn.execute(text('INSERT INTO evaluation_scores (evaluation_id, criteria_id, score) '
+                              'VALUES (:evaluation_id, :criteria_id, :score)'),
+                         {'evaluation_id': evaluation_id, 'criteria_id': criteria_id, 'score': score})
+    engine.dispose()
+
+@pytest.fixture
+def migrated_app(tmp_path, request):
+    """تطبيق على قاعدة بيانات قائمة بمخطط ما قبل الترحيلات بعد تطبيقها عند بدء التشغيل
+
+    تُمرر الدرجات المكررة عبر pytest.mark.parametrize(..., indirect=True).
+    """
+    path = tmp_path / 'baseline.db'
+    create_baseline_database(path, getattr(request, 'param', ()))
+    app = create_test_app(f'sqlite:///{path}', tmp_path)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+def test_baseline_database_is_migrated_to_latest_version(migrated_app):
+    with migrated_app.app_context(), db.engine.connect() as conn:
+        assert get_schema_version(conn) == MIGRATIONS[-1][0]
+
+def test_rollup_backfill_matches_monthly_data(migrated_app):
+    client = migrated_app.test_client()
+    for employee_id in (1, 2, 3, 4):
+        assert_employee_rollups_match(client, employee_id, **{'from': '2023-01', 'to': '2024-12'})
+    assert_department_rollups_match(client, 1, [1, 2], **{'from': '2023-01', 'to': '2024-12'})
+    rows = assert_table_matches_backfill(migrated_app)
+    assert {row[0] for row in rows} == {1, 2, 3}
+    # سنة الموظف الأول 2023: ربع واحد وصف السنة للتقييم ككل ولكل معيار
+    assert [row[1:4] for row in rows if row[:2] == (1, 2023)] == [
+        (2023, 0, 0), (2023, 0, 1), (2023, 0, 2), (2023, 0, 3),
+        (2023, 4, 0), (2023, 4, 1), (2023, 4, 2), (2023, 4, 3),
+    ]
+
+# درجتان مكررتان للمعيار الأول في التقييم الأول (الأخيرة هي المعتمدة)، ودرجة
+# مكررة في التقييم الخامس
+DUPLICATE_SCORES = [(1, 1, 1), (1, 1, 2.5), (5, 3, 1)]
+
+@pytest.mark.parametrize('migrated_app', [DUPLICATE_SCORES], indirect=True)
+def test_migration_keeps_latest_duplicate_score(migrated_app):
+    with migrated_app.app_context(), db.engine.connect() as conn:
+        scores = conn.execute(text(
+            'SELECT evaluation_id, criteria_id, score FROM evaluation_scores ORDER BY evaluation_id, criteria_id'
+        )).all()
+        totals = dict(conn.execute(text(
+            'SELECT id, total_score FROM monthly_evaluations WHERE id IN (1, 5)'
+        )).all())
+        assert 'uq_evaluation_scores_evaluation_criteria' in _score_indexes(conn)
+
+    expected = {
+        (evaluation_id, criteria_id): score
+        for evaluation_id, (_, _, _, evaluation_scores) in enumerate(BASELINE_EVALUATIONS, 1)
+        for criteria_id, score in evaluation_scores
+    }
+    expected.update({(1, 1): 2.5, (5, 3): 1})
+    assert [row[:2] for row in scores] == sorted(expected)
+    assert {row[:2]: row[2] for row in scores} == expected
+    # المجاميع المحسوبة قبل إزالة التكرار تُعاد من الدرجات المتبقية
+    assert totals == {1: 2.5 + 5 + 3, 5: 3 + 4 + 1}
+
+    client = migrated_app.test_client()
+    for employee_id in (1, 2):
+        assert_employee_rollups_match(client, employee_id, **{'from': '2023-01', 'to': '2024-12'})
+
+def _expected_totals():
+    """(التقييم، المجموع، المتوسط، عدد الدرجات) محسوبة من الدرجات مباشرة"""
+    expected = []
+    for evaluation_id, (employee_id, year, month, scores) in enumerate(BASELINE_EVALUATIONS, 1):
+        total = sum(score for _, score in scores)
+        expected.append((evaluation_id, total, total / len(scores) if scores else 0, len(scores)))
+    return expected
+
+def test_evaluation_totals_are_backfilled(migrated_app):
+    with migrated_app.app_context(), db.engine.connect() as conn:
+        totals = conn.execute(text(
+            'SELECT id, total_score, average_score, score_count FROM monthly_evaluations ORDER BY id'
+        )).all()
+    assert totals == [
+        (evaluation_id, total, pytest.approx(average), count)
+        for evaluation_id, total, average, count in _expected_totals()
+    ]
+    # التقييم بلا درجات مجموعه ومتوسطه صفر
+    assert totals[5][1:] == (0, 0, 0)
+
+def test_employee_stats_are_backfilled(migrated_app):
+    with migrated_app.app_context(), db.engine.connect() as conn:
+        stats = conn.execute(text(
+            'SELECT employee_id, evaluation_count, average_sum, last_evaluation_period '
+            'FROM employee_stats ORDER BY employee_id'
+        )).all()
+
+    expected = {}
+    for (employee_id, year, month, _), (_, _, average, _) in zip(BASELINE_EVALUATIONS, _expected_totals()):
+        count, average_sum, last_period = expected.get(employee_id, (0, 0, 0))
+        expected[employee_id] = (count + 1, average_sum + average, max(last_period, year * 100 + month))
+
+    # الموظف الرابع بلا تقييمات فلا صف له
+    assert [row[0] for row in stats] == sorted(expected) == [1, 2, 3]
+    assert stats == [
+        (employee_id, count, pytest.approx(average_sum), last_period)
+        for employee_id, (count, average_sum, last_period) in sorted(expected.items())
+    ]
+    # آخر شهر مقيم يعتمد على السنة قبل الشهر، والتقييم بلا درجات يُحسب بمتوسط صفر
+    assert stats[0][3] == 202405
+    assert stats[1][1:] == (2, pytest.approx(11 / 3), 202408)
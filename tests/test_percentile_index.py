@@ -0,0 +1,74 @@
+import threading
+import time
+from src.models.user import db
+from src.models.evaluation import MonthlyEvaluation
+from src.services import percentile_index
+from tests.helpers import SALES_DEPARTMENT_ID, init_departments, create_employee, create_evaluations
+
+EMPLOYEES = 12
+WRITE_SECONDS = 1.5
+
+def test_ranks_stay_consistent_during_concurrent_updates(file_app):
+    client = file_app.test_client()
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    employee_ids = [create_employee(client, f'P{number:03d}') for number in range(EMPLOYEES)]
+    evaluation_ids = create_evaluations(client, employee_ids, criteria, months=(1,))
+    with file_app.app_context():
+        assert percentile_index.percentile_rank(SALES_DEPARTMENT_ID, 2024, 1, employee_ids[0])
+
+    deadline = time.monotonic() + WRITE_SECONDS
+    lock = threading.Lock()
+    failures = []
+    reads = []
+
+    def writer(worker):
+        writer_client = file_app.test_client()
+        round_number = 0
+        while time.monotonic() < deadline:
+            round_number += 1
+            evaluation_id = evaluation_ids[(worker * 5 + round_number) % len(evaluation_ids)]
+            response = writer_client.put(f'/api/evaluations/{evaluation_id}', json={
+                'scores': [
+                    {'criteria_id': criterion['id'], 'score': (round_number + worker + criterion['id']) % 6}
+                    for criterion in criteria
+                ]
+            })
+            if response.status_code != 200:
+                with lock:
+                    failures.append(response.get_json())
+
+    def reader():
+        with file_app.app_context():
+            while time.monotonic() < deadline:
+                for employee_id in employee_ids:
+                    try:
+                        rank = percentile_index.percentile_rank(SALES_DEPARTMENT_ID, 2024, 1, employee_id)
+                    except Exception as e:
+                        with lock:
+                            failures.append(repr(e))
+                        continue
+                    # كل موظف له تقييم واحد في الشهر طوال الاختبار
+                    if rank is None or rank['department_count'] != EMPLOYEES \
+                            or not 1 <= rank['rank'] <= EMPLOYEES:
+                        with lock:
+                            failures.append(rank)
+                with lock:
+                    reads.append(1)
+
+    threads = [threading.Thread(target=writer, args=(worker,)) for worker in range(3)] + \
+        [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+
+    assert not failures, failures[:3]
+    assert reads
+
+    # الفهرس بعد التحديثات المتزامنة يطابق المتوسطات المخزنة
+    with file_app.app_context():
+        averages = dict(db.session.query(MonthlyEvaluation.employee_id, MonthlyEvaluation.average_score))
+        with percentile_index._lock:
+            sorted_averages, by_employee = percentile_index._index[(SALES_DEPARTMENT_ID, 2024, 1)]
+            assert by_employee == averages
+            assert sorted_averages == sorted(averages.values())
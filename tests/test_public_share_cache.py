@@ -0,0 +1,124 @@
+import threading
+import time
+import pytest
+from src.services import public_share_cache
+from tests.helpers import SALES_DEPARTMENT_ID, init_departments, create_employee, create_evaluations
+
+@pytest.fixture
+def shared(client):
+    departments = init_departments(client)
+    employee_id = create_employee(client, 'C001')
+    evaluation_ids = create_evaluations(client, [employee_id], departments[SALES_DEPARTMENT_ID], months=(1,))
+    token = client.post('/api/share/public').get_json()['share_token']
+    return client, token, employee_id, evaluation_ids[0], departments[SALES_DEPARTMENT_ID]
+
+def _get(client, token):
+    response = client.get(f'/api/share/public-data/{token}')
+    assert response.status_code == 200
+    return response.headers['X-Cache'], response.get_json()
+
+def test_second_request_is_served_from_cache(shared):
+    client, token, *_ = shared
+    status, first = _get(client, token)
+    assert status == 'MISS'
+    assert _get(client, token) == ('HIT', first)
+
+def test_entry_expires_after_ttl(app, shared, monkeypatch):
+    client, token, *_ = shared
+    app.config.update(PUBLIC_SHARE_CACHE_TTL=60)
+    now = [1000.0]
+    monkeypatch.setattr(public_share_cache.time, 'monotonic', lambda: now[0])
+
+    assert _get(client, token)[0] == 'MISS'
+    now[0] += 59
+    assert _get(client, token)[0] == 'HIT'
+    now[0] += 1
+    assert _get(client, token)[0] == 'MISS'
+    assert _get(client, token)[0] == 'HIT'
+
+def test_zero_ttl_disables_cache(app, shared):
+    client, token, *_ = shared
+    app.config.update(PUBLIC_SHARE_CACHE_TTL=0)
+    assert _get(client, token)[0] == 'MISS'
+    assert _get(client, token)[0] == 'MISS'
+
+def test_evaluation_write_invalidates(shared):
+    client, token, employee_id, evaluation_id, criteria = shared
+    _, before = _get(client, token)
+    assert before['employees'][0]['overall_average'] != 1
+
+    response = client.put(f'/api/evaluations/{evaluation_id}', json={
+        'scores': [{'criteria_id': criterion['id'], 'score': 1} for criterion in criteria]
+    })
+    assert response.status_code == 200
+    status, after = _get(client, token)
+    assert status == 'MISS'
+    assert after['employees'][0]['overall_average'] == 1
+
+    assert client.delete(f'/api/evaluations/{evaluation_id}').status_code == 200
+    status, after = _get(client, token)
+    assert status == 'MISS'
+    assert after['employees'][0]['evaluation_count'] == 0
+
+def test_employee_write_invalidates(shared):
+    client, token, employee_id, *_ = shared
+    _get(client, token)
+
+    response = client.put(f'/api/employees/{employee_id}', json={'full_name': 'اسم جديد'})
+    assert response.status_code == 200
+    status, after = _get(client, token)
+    assert status == 'MISS'
+    assert after['employees'][0]['full_name'] == 'اسم جديد'
+
+    create_employee(client, 'C002')
+    status, after = _get(client, token)
+    assert status == 'MISS'
+    assert len(after['employees']) == 2
+
+def test_department_write_invalidates(shared):
+    client, token, *_ = shared
+    _get(client, token)
+
+    response = client.put(f'/api/departments/{SALES_DEPARTMENT_ID}', json={
+        'name': 'المبيعات والتسويق', 'criteria': [{'name': 'تحقيق الأهداف'}]
+    })
+    assert response.status_code == 200, response.get_json()
+    status, after = _get(client, token)
+    assert status == 'MISS'
+    assert after['employees'][0]['department_name'] == 'المبيعات والتسويق'
+
+def test_concurrent_misses_build_once(app):
+    builds = []
+    started = threading.Event()
+
+    def build():
+        builds.append(1)
+        started.set()
+        time.sleep(0.2)
+        return b'payload'
+
+    results = []
+    def fetch():
+        with app.app_context():
+            results.append(public_share_cache.get_public_share_payload(build))
+
+    threads = [threading.Thread(target=fetch) for _ in range(5)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(builds) == 1
+    assert sorted(results) == [(b'payload', 'HIT')] * 4 + [(b'payload', 'MISS')]
+
+def test_write_during_build_is_not_cached(app):
+    def build():
+        # كتابة تصل أثناء بناء الاستجابة
+        public_share_cache.invalidate_public_share()
+        return b'stale'
+
+    with app.app_context():
+        assert public_share_cache.get_public_share_payload(build) == (b'stale', 'MISS')
+        assert public_share_cache.get_public_share_payload(lambda: b'fresh') == (b'fresh', 'MISS')
+        assert public_share_cache.get_public_share_payload(build) == (b'fresh', 'HIT')
@@ -0,0 +1,75 @@
+from tests.helpers import (
+    SALES_DEPARTMENT_ID, init_departments, create_employee, create_evaluations,
+    count_queries, select_count
+)
+
+def test_employee_evaluations_query_count_is_constant(app, client):
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    short_history = create_employee(client, 'E1')
+    long_history = create_employee(client, 'E2')
+    create_evaluations(client, [short_history], criteria, years=(2024,), months=[1])
+    create_evaluations(client, [long_history], criteria, years=(2022, 2023, 2024))
+
+    counts = []
+    for employee_id in (short_history, long_history):
+        with count_queries(app) as statements:
+            response = client.get(f'/api/employees/{employee_id}/evaluations')
+        assert response.status_code == 200
+        assert all(score['criteria_name'] for item in response.get_json() for score in item['scores'])
+        counts.append(select_count(statements))
+
+    assert counts[0] == counts[1]
+    assert len(client.get(f'/api/employees/{long_history}/evaluations').get_json()) == 36
+
+def test_employees_list_query_count_is_constant(app, client):
+    init_departments(client)
+    create_employee(client, 'E1', department_id=1)
+
+    with count_queries(app) as statements:
+        assert client.get('/api/employees').status_code == 200
+    few = select_count(statements)
+
+    for number in range(2, 30):
+        create_employee(client, f'E{number}', department_id=number % 3 + 1)
+    with count_queries(app) as statements:
+        response = client.get('/api/employees')
+    assert len(response.get_json()) == 29
+    assert all(employee['department_name'] for employee in response.get_json())
+    assert select_count(statements) == few
+
+def test_share_employee_data_query_count_is_constant(app, client):
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    short_history = create_employee(client, 'E1')
+    long_history = create_employee(client, 'E2')
+    create_evaluations(client, [short_history], criteria, months=[1])
+    create_evaluations(client, [long_history], criteria, years=(2023, 2024))
+
+    counts = []
+    for employee_id in (short_history, long_history):
+        token = client.post(f'/api/share/employee/{employee_id}').get_json()['share_token']
+        # الطلب الأول يحمّل الرمز وفهرس الترتيب في الذاكرة
+        assert client.get(f'/api/share/employee-data/{token}').status_code == 200
+        with count_queries(app) as statements:
+            response = client.get(f'/api/share/employee-data/{token}')
+        assert response.status_code == 200
+        counts.append(select_count(statements))
+
+    assert counts[0] == counts[1]
+    assert len(response.get_json()['evaluations']) == 24
+
+def test_employee_export_query_count_is_constant(app, client):
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    short_history = create_employee(client, 'E1')
+    long_history = create_employee(client, 'E2')
+    create_evaluations(client, [short_history], criteria, months=[1])
+    create_evaluations(client, [long_history], criteria, years=(2023, 2024))
+
+    counts = []
+    for employee_id in (short_history, long_history):
+        with count_queries(app) as statements:
+            response = client.get(f'/api/export/employee/{employee_id}')
+        assert response.status_code == 200
+        response.close()
+        counts.append(select_count(statements))
+
+    assert counts[0] == counts[1]
@@ -0,0 +1,197 @@
+import pytest
+from src.services import score_cube, percentile_index
+from tests.conftest import reset_in_memory_caches
+from tests.helpers import SALES_DEPARTMENT_ID, init_departments, create_employee, create_evaluations, count_queries
+
+@pytest.fixture
+def cube_client(app, client):
+    app.config.update(SCORE_CUBE_ENABLED=True)
+    departments = init_departments(client)
+    with app.app_context():
+        score_cube.build_score_cube()
+    return client, departments
+
+def _chart_data(client, employee_id, **params):
+    response = client.get(f'/api/employees/{employee_id}/evaluations/chart-data', query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+def _sql_chart_data(app, client, employee_id, **params):
+    """نفس الطلب بعد تعطيل المكعب وتفريغ الذواكر، أي من قاعدة البيانات مباشرة"""
+    cube = score_cube._cube
+    reset_in_memory_caches()
+    try:
+        return _chart_data(client, employee_id, **params)
+    finally:
+        reset_in_memory_caches()
+        score_cube._cube = cube
+
+def test_moved_employee_keeps_original_criteria_names(app, cube_client):
+    client, departments = cube_client
+    other_department = next(department_id for department_id in departments if department_id != SALES_DEPARTMENT_ID)
+    employee_id = create_employee(client, 'M001')
+    create_evaluations(client, [employee_id], departments[SALES_DEPARTMENT_ID], months=range(1, 4))
+
+    response = client.put(f'/api/employees/{employee_id}', json={'department_id': other_department})
+    assert response.status_code == 200
+    create_evaluations(client, [employee_id], departments[other_department], months=range(4, 6))
+
+    from_cube = _chart_data(client, employee_id, year=2024)
+    from_sql = _sql_chart_data(app, client, employee_id, year=2024)
+    assert from_cube == from_sql
+    assert from_cube['employee']['department_id'] == other_department
+
+    sales_names = {criterion['criteria_name'] for criterion in departments[SALES_DEPARTMENT_ID]}
+    other_names = {criterion['criteria_name'] for criterion in departments[other_department]}
+    assert set(from_cube['criteria_scores']) == sales_names | other_names
+    for name in sales_names - other_names:
+        assert len(from_cube['criteria_scores'][name]) == 3
+    for name in other_names - sales_names:
+        assert len(from_cube['criteria_scores'][name]) == 2
+
+    with app.app_context():
+        assert score_cube.check_score_cube()['consistent']
+
+def test_cube_matches_sql_after_build_and_updates(app, cube_client):
+    client, departments = cube_client
+    criteria = departments[SALES_DEPARTMENT_ID]
+    employee_ids = [create_employee(client, f'M{number:03d}') for number in range(5)]
+    evaluation_ids = create_evaluations(client, employee_ids, criteria, years=(2023, 2024), months=range(1, 7))
+    # تقييم بدرجات ناقصة وغير صحيحة
+    response = client.put(f'/api/evaluations/{evaluation_ids[0]}', json={
+        'scores': [{'criteria_id': criterion['id'], 'score': 2.75} for criterion in criteria[:3]]
+    })
+    assert response.status_code == 200
+
+    with app.app_context():
+        score_cube.build_score_cube()
+        assert score_cube.check_score_cube()['consistent']
+    for employee_id in employee_ids:
+        assert _chart_data(client, employee_id, **{'from': '2023-04', 'to': '2024-02'}) == \
+            _sql_chart_data(app, client, employee_id, **{'from': '2023-04', 'to': '2024-02'})
+
+def test_check_detects_cube_drift(app, cube_client):
+    client, departments = cube_client
+    employee_id = create_employee(client, 'D001')
+    create_evaluations(client, [employee_id], departments[SALES_DEPARTMENT_ID], months=range(1, 3))
+
+    with app.app_context():
+        assert score_cube.check_score_cube() == {
+            'consistent': True, 'checked': 1, 'mismatched_employee_ids': [], 'mismatched_count': 0
+        }
+        score_cube._cube.employees[employee_id].scores[0, 0] += 1
+        result = score_cube.check_score_cube()
+    assert result['consistent'] is False
+    assert result['mismatched_employee_ids'] == [employee_id]
+
+def test_chart_cache_rejects_payload_built_before_cube_refresh(app, cube_client, monkeypatch):
+    client, departments = cube_client
+    criteria = departments[SALES_DEPARTMENT_ID]
+    employee_id = create_employee(client, 'R001')
+    evaluation_ids = create_evaluations(client, [employee_id], criteria, months=(1,))
+    before = _chart_data(client, employee_id, year=2024)
+
+    # طلب chart-data يصل بعد حذف مدخلات الذاكرة وقبل تحديث شريحة المكعب
+    refresh_employees = score_cube.refresh_employees
+    stale = []
+    def refresh_after_concurrent_read(employee_ids):
+        response = app.test_client().get(f'/api/employees/{employee_id}/evaluations/chart-data?year=2024')
+        stale.append(response.get_json())
+        refresh_employees(employee_ids)
+    monkeypatch.setattr(score_cube, 'refresh_employees', refresh_after_concurrent_read)
+    # فهرس الترتيب يحذف مدخلات الإدارة أيضاً، ويُعطل هنا ليُختبر تحديث المكعب وحده
+    monkeypatch.setattr(percentile_index, 'invalidate_department_years', lambda department_years: 0)
+
+    response = client.put(f'/api/evaluations/{evaluation_ids[0]}', json={
+        'scores': [{'criteria_id': criterion['id'], 'score': 1} for criterion in criteria]
+    })
+    assert response.status_code == 200
+    assert stale == [before]
+
+    after = _chart_data(client, employee_id, year=2024)
+    assert after['average_scores'] == [1]
+    assert after == _sql_chart_data(app, client, employee_id, year=2024)
+
+def _public_share_data(client, token):
+    response = client.get(f'/api/share/public-data/{token}')
+    assert response.status_code == 200
+    return response.get_json()
+
+def _leaderboard(client, **params):
+    response = client.get('/api/leaderboard', query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+def test_summaries_and_leaderboard_match_sql(app, cube_client):
+    client, departments = cube_client
+    criteria = departments[SALES_DEPARTMENT_ID]
+    other_department = next(department_id for department_id in departments if department_id != SALES_DEPARTMENT_ID)
+    employee_ids = [create_employee(client, f'L{number:03d}') for number in range(6)]
+    employee_ids += [create_employee(client, f'L{number:03d}', other_department) for number in range(6, 9)]
+    create_evaluations(client, employee_ids[:6], criteria, months=range(1, 5))
+    create_evaluations(client, employee_ids[6:8], departments[other_department], months=range(1, 3))
+    evaluation_ids = create_evaluations(client, [employee_ids[0]], criteria, years=(2023,), months=(12,))
+    # درجات ناقصة لمعيار واحد
+    response = client.put(f'/api/evaluations/{evaluation_ids[0]}', json={
+        'scores': [{'criteria_id': criterion['id'], 'score': 2.5} for criterion in criteria[1:]]
+    })
+    assert response.status_code == 200
+    token = client.post('/api/share/public').get_json()['share_token']
+
+    from_cube = _public_share_data(client, token)
+    cube = score_cube._cube
+    reset_in_memory_caches()
+    from_sql = _public_share_data(client, token)
+    assert from_cube == from_sql
+    assert [employee['evaluation_count'] for employee in from_cube['employees']] == [5] + [4] * 5 + [2, 2, 0]
+
+    queries = [
+        {'scope': 'department', 'year': 2024},
+        {'scope': 'all', 'year': 2024, 'month': 2, 'k': 2},
+        {'scope': 'all', 'year': 2023},
+        {'scope': 'department', 'year': 2024, 'k': 1, 'department_id': SALES_DEPARTMENT_ID},
+        {'scope': 'all', 'year': 2024, 'criteria_id': criteria[0]['id'], 'k': 3},
+        {'scope': 'department', 'year': 2023, 'month': 12, 'criteria_id': criteria[0]['id']},
+    ]
+    expected = [_leaderboard(client, **params) for params in queries]
+    score_cube._cube = cube
+    assert [_leaderboard(client, **params) for params in queries] == expected
+    assert expected[0]['leaderboards'][0]['top']
+    assert expected[5]['leaderboards'] == []
+
+def test_summaries_and_leaderboard_do_not_query_the_database(app, cube_client):
+    client, departments = cube_client
+    employee_ids = [create_employee(client, f'Q{number:03d}') for number in range(3)]
+    create_evaluations(client, employee_ids, departments[SALES_DEPARTMENT_ID], months=range(1, 3))
+
+    from src.routes.share import build_public_share_payload
+    from src.services.leaderboard import compute_leaderboard
+    with count_queries(app) as statements, app.app_context():
+        payload = build_public_share_payload()
+        board = compute_leaderboard('all', 2024, k=2)
+    assert statements == []
+    assert b'Q000' in payload
+    assert [entry['employee_id'] for entry in board['leaderboards'][0]['top']]
+
+def test_public_share_cache_rejects_payload_built_before_cube_refresh(app, cube_client, monkeypatch):
+    client, departments = cube_client
+    criteria = departments[SALES_DEPARTMENT_ID]
+    employee_id = create_employee(client, 'P001')
+    evaluation_ids = create_evaluations(client, [employee_id], criteria, months=(1,))
+    token = client.post('/api/share/public').get_json()['share_token']
+    before = _public_share_data(client, token)
+
+    # طلب المشاركة العامة يصل بعد حذف الاستجابة المخزنة وقبل تحديث شريحة المكعب
+    refresh_employees = score_cube.refresh_employees
+    stale = []
+    def refresh_after_concurrent_read(employee_ids):
+        stale.append(_public_share_data(app.test_client(), token))
+        refresh_employees(employee_ids)
+    monkeypatch.setattr(score_cube, 'refresh_employees', refresh_after_concurrent_read)
+
+    response = client.put(f'/api/evaluations/{evaluation_ids[0]}', json={
+        'scores': [{'criteria_id': criterion['id'], 'score': 1} for criterion in criteria]
+    })
+    assert response.status_code == 200
+    assert stale == [before]
+    assert _public_share_data(client, token)['employees'][0]['overall_average'] == 1
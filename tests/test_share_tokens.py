@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta
+import pytest
+from src.models.user import db
+from src.models.share_token import ShareToken
+from src.services import share_tokens
+from tests.helpers import init_departments, create_employee
+
+@pytest.fixture
+def employee_id(client):
+    init_departments(client)
+    return create_employee(client, 'S001')
+
+def _create_employee_token(client, employee_id, **data):
+    response = client.post(f'/api/share/employee/{employee_id}', json=data)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['share_token']
+
+def _create_public_token(client, **data):
+    response = client.post('/api/share/public', json=data)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['share_token']
+
+def _travel(monkeypatch, days):
+    """تقديم الوقت الذي تراه خدمة الرموز"""
+    now = datetime.utcnow() + timedelta(days=days)
+
+    class ShiftedDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return now
+
+    monkeypatch.setattr(share_tokens, 'datetime', ShiftedDatetime)
+
+def test_token_resolves_to_its_employee(client, employee_id):
+    token = _create_employee_token(client, employee_id)
+    response = client.get(f'/api/share/employee-data/{token}')
+    assert response.status_code == 200
+    assert response.get_json()['employee']['employee_number'] == 'S001'
+    assert client.get(f'/share/view/{token}').status_code == 200
+
+def test_unknown_token_is_rejected(client, employee_id):
+    _create_employee_token(client, employee_id)
+    assert client.get('/api/share/employee-data/unknown').status_code == 404
+    assert client.get('/api/share/public-data/unknown').status_code == 404
+    assert client.get('/share/view/unknown').status_code == 404
+
+def test_token_stores_only_its_hash(app, client, employee_id):
+    token = _create_employee_token(client, employee_id)
+    with app.app_context():
+        assert db.session.query(ShareToken.token_hash).scalar() == share_tokens.hash_share_token(token)
+
+def test_wrong_scope_is_rejected(client, employee_id):
+    employee_token = _create_employee_token(client, employee_id)
+    public_token = _create_public_token(client)
+    assert client.get(f'/api/share/public-data/{employee_token}').status_code == 404
+    assert client.get(f'/api/share/employee-data/{public_token}').status_code == 404
+    assert client.get(f'/share/public/{employee_token}').status_code == 404
+    assert client.get(f'/share/public/{public_token}').status_code == 200
+
+def test_legacy_url_requires_matching_employee_id(client, employee_id):
+    other_employee_id = create_employee(client, 'S002')
+    token = _create_employee_token(client, employee_id)
+    assert client.get(f'/api/share/employee-data/{token}/{employee_id}').status_code == 200
+    assert client.get(f'/api/share/employee-data/{token}/{other_employee_id}').status_code == 404
+
+def test_expired_token_is_rejected_from_cache(client, employee_id, monkeypatch):
+    token = _create_employee_token(client, employee_id, expires_in_days=1)
+    assert client.get(f'/api/share/employee-data/{token}').status_code == 200
+    assert share_tokens.hash_share_token(token) in share_tokens._entries
+
+    _travel(monkeypatch, 2)
+    assert client.get(f'/api/share/employee-data/{token}').status_code == 404
+    assert share_tokens.hash_share_token(token) not in share_tokens._entries
+
+def test_expired_token_is_rejected_from_database(app, client, employee_id, monkeypatch):
+    app.config.update(SHARE_TOKEN_SWEEP_INTERVAL=3600)
+    token = _create_employee_token(client, employee_id, expires_in_days=1)
+    assert not share_tokens._entries
+
+    # التنظيف الدوري لم يحن بعد فيُقرأ الرمز المنتهي من الجدول
+    _travel(monkeypatch, 2)
+    assert client.get(f'/api/share/employee-data/{token}').status_code == 404
+    with app.app_context():
+        assert ShareToken.query.count() == 1
+
+@pytest.mark.parametrize('expires_in_days', [0, -1, 366, '7', 1.5, True])
+def test_invalid_expires_in_days_is_rejected(app, client, employee_id, expires_in_days):
+    response = client.post(f'/api/share/employee/{employee_id}', json={'expires_in_days': expires_in_days})
+    assert response.status_code == 400
+    response = client.post('/api/share/public', json={'expires_in_days': expires_in_days})
+    assert response.status_code == 400
+    with app.app_context():
+        assert ShareToken.query.count() == 0
+
+def test_expires_in_days_sets_expiry(client, employee_id):
+    before = datetime.utcnow()
+    response = client.post(f'/api/share/employee/{employee_id}', json={'expires_in_days': 7})
+    expires_at = datetime.fromisoformat(response.get_json()['expires_at'])
+    assert before + timedelta(days=7) <= expires_at <= datetime.utcnow() + timedelta(days=7)
+
+    response = client.post('/api/share/public')
+    expires_at = datetime.fromisoformat(response.get_json()['expires_at'])
+    assert expires_at >= before + timedelta(days=share_tokens.DEFAULT_SHARE_TOKEN_TTL_DAYS)
+
+def test_sweep_deletes_expired_rows_and_cache_entries(app, client, employee_id, monkeypatch):
+    short_token = _create_employee_token(client, employee_id, expires_in_days=1)
+    long_token = _create_employee_token(client, employee_id, expires_in_days=30)
+    for token in (short_token, long_token):
+        assert client.get(f'/api/share/employee-data/{token}').status_code == 200
+
+    _travel(monkeypatch, 2)
+    with app.app_context():
+        assert share_tokens.sweep_expired_share_tokens(force=True) == 1
+        assert [token_hash for (token_hash,) in db.session.query(ShareToken.token_hash)] == \
+            [share_tokens.hash_share_token(long_token)]
+    assert list(share_tokens._entries) == [share_tokens.hash_share_token(long_token)]
+
+def test_sweep_runs_at_most_once_per_interval(app, client, employee_id, monkeypatch):
+    app.config.update(SHARE_TOKEN_SWEEP_INTERVAL=3600)
+    _create_employee_token(client, employee_id, expires_in_days=1)
+    _travel(monkeypatch, 2)
+    with app.app_context():
+        assert share_tokens.sweep_expired_share_tokens() == 0
+        assert ShareToken.query.count() == 1
+        assert share_tokens.sweep_expired_share_tokens(force=True) == 1
+
+def test_cache_stays_within_max_entries(app, client, employee_id):
+    app.config.update(SHARE_TOKEN_CACHE_MAX_ENTRIES=2)
+    tokens = [_create_employee_token(client, employee_id) for _ in range(3)]
+    for token in tokens:
+        assert client.get(f'/api/share/employee-data/{token}').status_code == 200
+    assert list(share_tokens._entries) == [share_tokens.hash_share_token(token) for token in tokens[1:]]
+
+    # الرمز الأقدم يُقرأ من الجدول ويطرد الأقل استخداماً
+    assert client.get(f'/api/share/employee-data/{tokens[1]}').status_code == 200
+    assert client.get(f'/api/share/employee-data/{tokens[0]}').status_code == 200
+    assert list(share_tokens._entries) == [share_tokens.hash_share_token(token) for token in (tokens[1], tokens[0])]
+
+def test_deleting_employee_removes_its_tokens(app, client, employee_id):
+    other_employee_id = create_employee(client, 'S002')
+    token = _create_employee_token(client, employee_id)
+    other_token = _create_employee_token(client, other_employee_id)
+    assert client.get(f'/api/share/employee-data/{token}').status_code == 200
+
+    assert client.delete(f'/api/employees/{employee_id}').status_code == 200
+    assert share_tokens.hash_share_token(token) not in share_tokens._entries
+    assert client.get(f'/api/share/employee-data/{token}').status_code == 404
+    assert client.get(f'/api/share/employee-data/{other_token}').status_code == 200
+    with app.app_context():
+        assert db.session.query(ShareToken.employee_id).all() == [(other_employee_id,)]
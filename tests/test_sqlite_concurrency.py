@@ -0,0 +1,133 @@
+import threading
+import time
+from src.models.user import db
+from src.models.sqlite_tuning import read_sqlite_pragmas
+from src.routes import evaluation as evaluation_routes
+from tests.helpers import SALES_DEPARTMENT_ID, init_departments, create_employee, create_evaluations
+
+WRITE_SECONDS = 1.5
+
+def _run_threads(targets):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    assert not any(thread.is_alive() for thread in threads)
+
+def test_file_database_uses_configured_pragmas(file_app):
+    with file_app.app_context(), db.engine.connect() as conn:
+        pragmas = read_sqlite_pragmas(conn)
+    assert str(pragmas['journal_mode']).lower() == 'wal'
+    assert pragmas['busy_timeout'] == 5000
+    assert pragmas['synchronous'] == 1  # NORMAL
+
+def test_reads_continue_during_sustained_writes(file_app):
+    client = file_app.test_client()
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    employee_ids = [create_employee(client, f'C{number:03d}') for number in range(4)]
+    evaluation_ids = create_evaluations(client, employee_ids, criteria, months=range(1, 4))
+
+    deadline = time.monotonic() + WRITE_SECONDS
+    lock = threading.Lock()
+    writes = []
+    reads = []
+    failures = []
+
+    def writer(worker):
+        writer_client = file_app.test_client()
+        round_number = 0
+        while time.monotonic() < deadline:
+            round_number += 1
+            evaluation_id = evaluation_ids[(worker + round_number) % len(evaluation_ids)]
+            response = writer_client.put(f'/api/evaluations/{evaluation_id}', json={
+                'scores': [
+                    {'criteria_id': criterion['id'], 'score': (round_number + criterion['id']) % 5 + 1}
+                    for criterion in criteria
+                ]
+            })
+            with lock:
+                (writes if response.status_code == 200 else failures).append(response.get_json())
+
+    def reader(worker):
+        reader_client = file_app.test_client()
+        while time.monotonic() < deadline:
+            employee_id = employee_ids[worker % len(employee_ids)]
+            response = reader_client.get(f'/api/employees/{employee_id}/evaluations')
+            with lock:
+                if response.status_code == 200 and len(response.get_json()) == 3:
+                    reads.append(employee_id)
+                else:
+                    failures.append(response.get_json())
+
+    _run_threads(
+        [lambda worker=worker: writer(worker) for worker in range(2)] +
+        [lambda worker=worker: reader(worker) for worker in range(4)]
+    )
+
+    assert not failures, failures[:3]
+    assert writes and reads
+
+def _put_scores(client, evaluation_id, criteria, score):
+    response = client.put(f'/api/evaluations/{evaluation_id}', json={
+        'scores': [{'criteria_id': criterion['id'], 'score': score} for criterion in criteria]
+    })
+    return response.status_code, response.get_json()
+
+def test_reads_complete_while_write_transaction_is_open(file_app, monkeypatch):
+    client = file_app.test_client()
+    criteria = init_departments(client)[SALES_DEPARTMENT_ID]
+    employee_ids = [create_employee(client, f'W{number:03d}') for number in range(2)]
+    evaluation_ids = create_evaluations(client, employee_ids, criteria, months=range(1, 4))
+    before = client.get(f'/api/employees/{employee_ids[0]}/evaluations').get_json()
+
+    # الكاتب يتوقف بعد كتابة الدرجات وقبل الحفظ فتبقى معاملة الكتابة مفتوحة
+    write_open = threading.Event()
+    release = threading.Event()
+    refresh_employee_stats = evaluation_routes.refresh_employee_stats
+
+    def hold_write_transaction(ids):
+        if threading.current_thread().name == 'held':
+            write_open.set()
+            assert release.wait(timeout=30)
+        refresh_employee_stats(ids)
+    monkeypatch.setattr(evaluation_routes, 'refresh_employee_stats', hold_write_transaction)
+
+    results = {}
+
+    def write(evaluation_id, score):
+        results[threading.current_thread().name] = _put_scores(file_app.test_client(), evaluation_id, criteria, score)
+
+    held = threading.Thread(target=write, name='held', args=(evaluation_ids[0], 5))
+    # كاتب ثانٍ ينتظر القفل بـ busy_timeout بدلاً من "database is locked"
+    queued = threading.Thread(target=write, name='queued', args=(evaluation_ids[3], 1))
+    held.start()
+    try:
+        assert write_open.wait(timeout=10)
+        queued.start()
+        reader_client = file_app.test_client()
+        reads = [
+            reader_client.get(f'/api/employees/{employee_id}/evaluations')
+            for employee_id in employee_ids
+        ] + [
+            reader_client.get(f'/api/employees/{employee_id}/evaluations/chart-data', query_string={'year': 2024})
+            for employee_id in employee_ids
+        ]
+        # انتهت القراءات والكاتب ما زال ينتظر داخل معاملته
+        assert held.is_alive() and not release.is_set()
+    finally:
+        release.set()
+        held.join(timeout=30)
+        queued.join(timeout=30)
+    assert not held.is_alive() and not queued.is_alive()
+
+    assert [response.status_code for response in reads] == [200] * len(reads)
+    # القراء يرون آخر حالة محفوظة لا الكتابة غير المحفوظة
+    assert reads[0].get_json() == before
+    assert [status for status, _ in results.values()] == [200, 200]
+    assert not any('locked' in str(body) for _, body in results.values())
+
+    after = client.get(f'/api/employees/{employee_ids[0]}/evaluations').get_json()
+    assert {evaluation['id']: evaluation['average_score'] for evaluation in after}[evaluation_ids[0]] == 5
+    after = client.get(f'/api/employees/{employee_ids[1]}/evaluations').get_json()
+    assert {evaluation['id']: evaluation['average_score'] for evaluation in after}[evaluation_ids[3]] == 1